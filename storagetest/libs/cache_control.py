@@ -0,0 +1,114 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : cache_control.py
+@Time  : 2020/12/4 15:20
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import stat
+import time
+import fcntl
+import unittest
+
+from storagetest.libs import utils
+from storagetest.libs.log import log
+
+"""
+Cache control
+==============
+Cold cache between test steps, scoped to the files/devices under test:
+    fadvise:  fdatasync + posix_fadvise(DONTNEED) per file/device
+    flushbuf: ioctl(BLKFLSBUF) per block device(flush + invalidate its buffer
+              cache), fadvise for the other paths
+    direct:   nothing to drop, the I/O is O_DIRECT only
+    global:   sync; echo 3 > /proc/sys/vm/drop_caches, the whole machine's
+              page/dentry/inode caches(the old behavior)
+    none:     keep the caches
+"""
+
+logger = log.get_logger()
+
+CACHE_MODES = ('fadvise', 'flushbuf', 'direct', 'global', 'none')
+BLKFLSBUF = 0x1261  # ioctl: flush buffer cache
+
+
+def fadvise_dontneed(path):
+    """write back and drop the page cache of a file/block device"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fdatasync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def flush_block_device(path):
+    """ioctl(BLKFLSBUF) the block device, return False if path is not a block device"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if not stat.S_ISBLK(os.fstat(fd).st_mode):
+            return False
+        fcntl.ioctl(fd, BLKFLSBUF, 0)
+    finally:
+        os.close(fd)
+    return True
+
+
+class CacheControl(object):
+    """Drop the caches of the paths under test by mode"""
+
+    def __init__(self, mode='fadvise'):
+        """
+        :param mode: see CACHE_MODES
+        """
+        if mode not in CACHE_MODES:
+            raise Exception("Not support cache mode: {0}, choices: {1}".format(mode, CACHE_MODES))
+        self.mode = mode
+
+    @property
+    def direct(self):
+        """the I/O should be O_DIRECT"""
+        return self.mode == 'direct'
+
+    def drop(self, *paths):
+        """
+        drop the caches of the paths(files / block devices) by mode
+        :param paths:
+        :return: elapsed seconds
+        """
+        start = time.time()
+        if self.mode == 'global':
+            logger.info('>> sync and clean drop_caches')
+            utils.run_cmd("sync; echo 3 > /proc/sys/vm/drop_caches", 0)
+        elif self.mode in ('fadvise', 'flushbuf'):
+            for path in paths:
+                if self.mode == 'flushbuf' and flush_block_device(path):
+                    continue
+                fadvise_dontneed(path)
+        elapsed = time.time() - start
+        logger.debug('>> drop cache({0}): {1}, {2:.3f}(seconds)'.format(self.mode, ', '.join(paths), elapsed))
+        return elapsed
+
+
+class UnitTestCase(unittest.TestCase):
+    """cache control test case"""
+
+    def test_drop(self):
+        import tempfile
+        file_path = os.path.join(tempfile.mkdtemp(dir='/var/tmp'), 'cache.dat')
+        with open(file_path, 'wb') as f:
+            f.write(os.urandom(1024 * 1024))
+        for mode in ('fadvise', 'flushbuf', 'direct', 'none'):
+            self.assertGreaterEqual(CacheControl(mode).drop(file_path), 0)
+        self.assertFalse(flush_block_device(file_path))
+        self.assertTrue(CacheControl('direct').direct)
+        self.assertRaises(Exception, CacheControl, 'all')
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : heatmap.py
+@Time  : 2020/12/8 10:12
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import unittest
+from xml.sax.saxutils import escape
+
+"""
+Heatmap render
+===============
+Render a rows x columns matrix of numbers, colored per row(each row is one
+metric, scaled to its own min/max):
+    text_heatmap: one shade char per cell, for the log
+    svg_heatmap:  an SVG file, green(good) -> red(bad), the value in the cell
+                  tooltip, no plotting library needed
+bad_high: a row where the high values are bad(latency), else low is bad(MB/s).
+"""
+
+SHADES = ' .:-=+*#%@'
+
+
+def _scale(row, bad_high=True):
+    """return the row values scaled to 0(good) - 1(bad), None kept"""
+    values = [v for v in row if v is not None]
+    if not values:
+        return [None] * len(row)
+    lo, hi = min(values), max(values)
+    span = hi - lo
+    scaled = []
+    for v in row:
+        if v is None:
+            scaled.append(None)
+        elif not span:
+            scaled.append(0.0)
+        else:
+            scaled.append((v - lo) / span if bad_high else (hi - v) / span)
+    return scaled
+
+
+def text_heatmap(row_names, matrix, bad_high=None):
+    """
+    :param row_names: name of each row
+    :param matrix: [[value, ...]] rows of values, None: no data
+    :param bad_high: [bool] per row, default all True
+    :return: str, a line per row: name |shades| min - max
+    """
+    bad_high = bad_high or [True] * len(matrix)
+    width = max(len(str(name)) for name in row_names) if row_names else 0
+    lines = []
+    for name, row, high in zip(row_names, matrix, bad_high):
+        cells = ''.join('?' if s is None else SHADES[min(int(s * len(SHADES)), len(SHADES) - 1)]
+                        for s in _scale(row, high))
+        values = [v for v in row if v is not None]
+        lines.append('{0:<{1}} |{2}| {3:.3f} - {4:.3f}{5}'.format(
+            name, width, cells, min(values) if values else 0, max(values) if values else 0,
+            '' if high else ' (low is bad)'))
+    return '\n'.join(lines)
+
+
+def _color(s):
+    """0 -> green, 0.5 -> yellow, 1 -> red"""
+    if s is None:
+        return '#cccccc'
+    red = int(255 * min(s * 2, 1))
+    green = int(255 * min((1 - s) * 2, 1))
+    return '#{0:02x}{1:02x}40'.format(red, green)
+
+
+def svg_heatmap(file_path, row_names, col_names, matrix, bad_high=None, title='', cell_w=14, cell_h=24):
+    """
+    write the matrix as an SVG heatmap
+    :param file_path: .svg
+    :param row_names: name of each row
+    :param col_names: name of each column, shown in the tooltips(and as labels if few)
+    :param matrix: [[value, ...]] rows of values, None: no data
+    :param bad_high: [bool] per row, default all True
+    :param title:
+    :return: file_path
+    """
+    bad_high = bad_high or [True] * len(matrix)
+    label_w = 8 * max([len(str(name)) for name in row_names] + [4]) + 10
+    top = 40
+    show_cols = len(col_names) <= 32
+    if show_cols:
+        cell_w = max(cell_w, 7 * max(len(str(name)) for name in col_names) + 6) if col_names else cell_w
+    width = label_w + cell_w * len(col_names) + 10
+    height = top + cell_h * len(row_names) + (20 if show_cols else 10)
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" font-family="monospace" '
+             'font-size="11">'.format(width, height),
+             '<text x="4" y="16" font-size="13">{0}</text>'.format(escape(title))]
+    for r, (name, row, high) in enumerate(zip(row_names, matrix, bad_high)):
+        y = top + r * cell_h
+        parts.append('<text x="4" y="{0}">{1}</text>'.format(y + cell_h * 2 // 3, escape(str(name))))
+        for c, (value, s) in enumerate(zip(row, _scale(row, high))):
+            parts.append('<rect x="{0}" y="{1}" width="{2}" height="{3}" fill="{4}"><title>{5} {6}: {7}</title>'
+                         '</rect>'.format(label_w + c * cell_w, y, cell_w - 1, cell_h - 1, _color(s),
+                                          escape(str(name)), escape(str(col_names[c])),
+                                          'n/a' if value is None else '{0:.3f}'.format(value)))
+    if show_cols:
+        y = top + cell_h * len(row_names) + 14
+        for c, name in enumerate(col_names):
+            parts.append('<text x="{0}" y="{1}">{2}</text>'.format(label_w + c * cell_w + 2, y, escape(str(name))))
+    parts.append('</svg>')
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    with open(file_path, 'w') as f:
+        f.write('\n'.join(parts))
+    return file_path
+
+
+class UnitTestCase(unittest.TestCase):
+    """heatmap test case"""
+
+    def test_heatmap(self):
+        import tempfile
+        matrix = [[1, 2, 3, 10], [100, 100, 50, None]]
+        text = text_heatmap(['p99(ms)', 'MB/s'], matrix, [True, False])
+        self.assertEqual(text.split('\n')[0], 'p99(ms) | .:@| 1.000 - 10.000')
+        self.assertEqual(text.split('\n')[1], 'MB/s    |  @?| 50.000 - 100.000 (low is bad)')
+        file_path = svg_heatmap(os.path.join(tempfile.mkdtemp(), 'heatmap.svg'), ['p99(ms)', 'MB/s'],
+                                ['r0', 'r1', 'r2', 'r3'], matrix, [True, False], title='test')
+        with open(file_path) as f:
+            svg = f.read()
+        self.assertEqual(svg.count('<rect'), 8)
+        self.assertIn('#ff0040', svg)
+        self.assertIn('#00ff40', svg)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
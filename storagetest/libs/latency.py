@@ -0,0 +1,165 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : latency.py
+@Time  : 2020/11/30 10:05
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import time
+import threading
+import unittest
+from array import array
+from prettytable import PrettyTable
+
+"""
+Latency statistics
+===================
+Thread safe collector of per-op latencies(seconds), report ops/s and the
+latency percentiles.
+"""
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyStats(object):
+    """Collect op latencies, report ops/s and percentiles"""
+
+    def __init__(self, name='op'):
+        self.name = name
+        self.samples = array('d')
+        self.errors = 0
+        self.start_time = None
+        self.end_time = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.start_time = time.time()
+        return self
+
+    def stop(self):
+        self.end_time = time.time()
+        return self
+
+    def add(self, latency):
+        with self._lock:
+            self.samples.append(latency)
+
+    def extend(self, latencies):
+        with self._lock:
+            self.samples.extend(latencies)
+
+    def add_error(self, n=1):
+        with self._lock:
+            self.errors += n
+
+    def merge(self, other):
+        """merge other LatencyStats samples/errors into self"""
+        with self._lock:
+            self.samples.extend(other.samples)
+            self.errors += other.errors
+
+    @property
+    def count(self):
+        return len(self.samples)
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return sum(self.samples)
+        return (self.end_time or time.time()) - self.start_time
+
+    @property
+    def rate(self):
+        """ops per second"""
+        elapsed = self.elapsed
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def percentile(self, p, sorted_samples=None):
+        """latency(seconds) at percentile p(0-100), nearest rank"""
+        sorted_samples = sorted_samples or sorted(self.samples)
+        if not sorted_samples:
+            return 0.0
+        rank = int(round(p / 100.0 * (len(sorted_samples) - 1)))
+        return sorted_samples[min(max(rank, 0), len(sorted_samples) - 1)]
+
+    def summary(self, percentiles=PERCENTILES):
+        """return dict: count, errors, elapsed, rate, avg, max, p<N> (latency in ms)"""
+        sorted_samples = sorted(self.samples)
+        count = len(sorted_samples)
+        result = {
+            'count': count,
+            'errors': self.errors,
+            'elapsed': self.elapsed,
+            'rate': self.rate,
+            'avg': sum(sorted_samples) / count * 1000 if count else 0.0,
+            'max': sorted_samples[-1] * 1000 if count else 0.0,
+        }
+        for p in percentiles:
+            result['p{0:g}'.format(p)] = self.percentile(p, sorted_samples) * 1000
+        return result
+
+    def histogram(self):
+        """
+        log2 latency histogram
+        :return: [(bucket upper bound in us, count)], buckets: <=1us, <=2us, <=4us, ...
+        """
+        counts = {}
+        for latency in self.samples:
+            bound = 1
+            while bound < latency * 1000000:
+                bound <<= 1
+            counts[bound] = counts.get(bound, 0) + 1
+        return sorted(counts.items())
+
+    def __str__(self):
+        s = self.summary()
+        return "{0}: {1} ops, {2} errors, {3:.3f}(seconds), {4:.1f} {0}/s, avg {5:.3f}ms, " \
+               "p50 {6:.3f}ms, p90 {7:.3f}ms, p99 {8:.3f}ms, p99.9 {9:.3f}ms, max {10:.3f}ms".format(
+                self.name, s['count'], s['errors'], s['elapsed'], s['rate'], s['avg'],
+                s['p50'], s['p90'], s['p99'], s['p99.9'], s['max'])
+
+
+def stats_table(stats_list, percentiles=PERCENTILES):
+    """return a PrettyTable of LatencyStats list"""
+    p_names = ['p{0:g}'.format(p) for p in percentiles]
+    table = PrettyTable(['Op', 'Count', 'Errors', 'Time(s)', 'Ops/s', 'Avg(ms)'] + p_names + ['Max(ms)'])
+    for stats in stats_list:
+        s = stats.summary(percentiles)
+        table.add_row([stats.name, s['count'], s['errors'], round(s['elapsed'], 3), round(s['rate'], 1),
+                       round(s['avg'], 3)] + [round(s[p], 3) for p in p_names] + [round(s['max'], 3)])
+    return table
+
+
+def histogram_table(stats_list):
+    """return a PrettyTable of the log2 latency histograms of LatencyStats list"""
+    histograms = [dict(stats.histogram()) for stats in stats_list]
+    table = PrettyTable(['<=us'] + [stats.name for stats in stats_list])
+    for bound in sorted(set(b for h in histograms for b in h)):
+        table.add_row([bound] + [h.get(bound, 0) for h in histograms])
+    return table
+
+
+class UnitTestCase(unittest.TestCase):
+    """latency stats test case"""
+
+    def test_percentile(self):
+        stats = LatencyStats('mkdir')
+        stats.extend([x / 1000.0 for x in range(1, 101)])
+        s = stats.summary()
+        self.assertEqual(s['count'], 100)
+        self.assertAlmostEqual(s['p50'], 51, places=6)
+        self.assertAlmostEqual(s['max'], 100, places=6)
+        self.assertAlmostEqual(s['p99'], 99, places=6)
+        self.assertTrue(str(stats).startswith('mkdir: 100 ops'))
+        histogram = dict(stats.histogram())
+        self.assertEqual(histogram[1024], 1)
+        self.assertEqual(histogram[131072], 35)
+        self.assertEqual(sum(histogram.values()), 100)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,243 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : copy_backends.py
+@Time  : 2020/12/4 10:12
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import mmap
+import stat
+import time
+import fcntl
+import unittest
+from collections import namedtuple
+from prettytable import PrettyTable
+
+from storagetest.libs.log import log
+
+"""
+In-process copy backends
+=========================
+Copy count blocks of bs bytes from if_path(skip blocks) to of_path(seek
+blocks) with the dd semantics, in process:
+    rw:              buffered os.pread / os.pwrite(O_DIRECT output with
+                     oflag_direct, as dd oflag=direct)
+    direct:          O_DIRECT on both sides, page aligned mmap buffer
+    sendfile:        os.sendfile
+    splice:          os.splice through a pipe(sized to bs)
+    copy_file_range: os.copy_file_range(in kernel, reflink/server side copy on some file systems)
+Each copy reports bytes, elapsed, throughput and user/sys CPU time, so the
+zero-copy paths can be compared on a file system or block device.
+"""
+
+logger = log.get_logger()
+
+BACKENDS = ('rw', 'direct', 'sendfile', 'splice', 'copy_file_range')
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+
+CopyResult = namedtuple('CopyResult', ['backend', 'bytes', 'elapsed', 'user', 'sys'])
+
+
+def backends_available():
+    """return the copy backends supported by this python/platform"""
+    support = {
+        'rw': True,
+        'direct': hasattr(os, 'O_DIRECT'),
+        'sendfile': hasattr(os, 'sendfile'),
+        'splice': hasattr(os, 'splice'),
+        'copy_file_range': hasattr(os, 'copy_file_range'),
+    }
+    return [backend for backend in BACKENDS if support[backend]]
+
+
+def _copy_rw(in_fd, out_fd, in_off, out_off, length, bs):
+    buf = bytearray(bs)
+    view = memoryview(buf)
+    done = 0
+    while done < length:
+        n = os.preadv(in_fd, [view[:min(bs, length - done)]], in_off + done)
+        if not n:
+            break
+        _pwrite_all(out_fd, view[:n], out_off + done)
+        done += n
+    return done
+
+
+def _pwrite_all(fd, view, offset):
+    done = 0
+    while done < len(view):
+        done += os.pwrite(fd, view[done:], offset + done)
+    return done
+
+
+def _copy_direct(in_fd, out_fd, in_off, out_off, length, bs, out_path):
+    """O_DIRECT copy, the unaligned tail written by a buffered fd(as dd does)"""
+    with mmap.mmap(-1, max(-(-bs // 4096) * 4096, 4096)) as buf:
+        view = memoryview(buf)
+        done = 0
+        try:
+            while done < length:
+                want = min(bs, length - done)
+                n = os.preadv(in_fd, [view[:want]], in_off + done)
+                if not n:
+                    break
+                if n % 512 == 0:
+                    _pwrite_all(out_fd, view[:n], out_off + done)
+                else:
+                    tail_fd = os.open(out_path, os.O_WRONLY)
+                    try:
+                        _pwrite_all(tail_fd, view[:n], out_off + done)
+                    finally:
+                        os.close(tail_fd)
+                done += n
+                if n < want:
+                    break
+        finally:
+            view.release()
+    return done
+
+
+def _copy_sendfile(in_fd, out_fd, in_off, out_off, length, bs):
+    os.lseek(out_fd, out_off, os.SEEK_SET)
+    done = 0
+    while done < length:
+        n = os.sendfile(out_fd, in_fd, in_off + done, min(bs, length - done))
+        if not n:
+            break
+        done += n
+    return done
+
+
+def _copy_splice(in_fd, out_fd, in_off, out_off, length, bs):
+    r_fd, w_fd = os.pipe()
+    try:
+        try:
+            pipe_size = fcntl.fcntl(w_fd, F_SETPIPE_SZ, bs)
+        except OSError:
+            pipe_size = 65536  # over /proc/sys/fs/pipe-max-size
+        done = 0
+        while done < length:
+            n = os.splice(in_fd, w_fd, min(pipe_size, bs, length - done), offset_src=in_off + done)
+            if not n:
+                break
+            moved = 0
+            while moved < n:
+                moved += os.splice(r_fd, out_fd, n - moved, offset_dst=out_off + done + moved)
+            done += n
+    finally:
+        os.close(r_fd)
+        os.close(w_fd)
+    return done
+
+
+def _copy_file_range(in_fd, out_fd, in_off, out_off, length, bs):
+    done = 0
+    while done < length:
+        n = os.copy_file_range(in_fd, out_fd, min(bs, length - done), in_off + done, out_off + done)
+        if not n:
+            break
+        done += n
+    return done
+
+
+def copy_blocks(if_path, of_path, bs, count, skip=0, seek=0, backend='rw', fsync=True, oflag_direct=False):
+    """
+    copy with the dd semantics: count blocks of bs bytes, input from block skip, output at block seek,
+    a regular output file is truncated at seek * bs(dd without conv=notrunc)
+    :param if_path:
+    :param of_path:
+    :param bs: block size, bytes
+    :param count: blocks, copy less at the end of the input
+    :param skip: input offset, blocks
+    :param seek: output offset, blocks
+    :param backend: see BACKENDS
+    :param fsync: fdatasync the output, timed
+    :param oflag_direct: rw backend: O_DIRECT output only(dd oflag=direct), the input stays buffered
+    :return: CopyResult
+    """
+    if backend not in BACKENDS:
+        raise Exception("Not support copy backend: {0}, choices: {1}".format(backend, BACKENDS))
+    if backend not in backends_available():
+        raise Exception("Copy backend {0} not supported on this platform".format(backend))
+    skip, seek = int(skip or 0), int(seek or 0)
+    out_direct = backend == 'direct' or (backend == 'rw' and oflag_direct)
+    if out_direct and bs % 512:
+        raise Exception("Copy backend {0} O_DIRECT output requires bs aligned to 512, got {1}".format(backend, bs))
+    in_fd = os.open(if_path, os.O_RDONLY | (os.O_DIRECT if backend == 'direct' else 0))
+    try:
+        out_fd = os.open(of_path, os.O_WRONLY | os.O_CREAT | (os.O_DIRECT if out_direct else 0), 0o644)
+    except Exception:
+        os.close(in_fd)
+        raise
+    try:
+        if stat.S_ISREG(os.fstat(out_fd).st_mode):
+            os.ftruncate(out_fd, seek * bs)
+        args = (in_fd, out_fd, skip * bs, seek * bs, bs * count, bs)
+        t_start, c_start = time.perf_counter(), os.times()
+        if out_direct:  # the page aligned buffer
+            copied = _copy_direct(*args, out_path=of_path)
+        elif backend == 'rw':
+            copied = _copy_rw(*args)
+        elif backend == 'sendfile':
+            copied = _copy_sendfile(*args)
+        elif backend == 'splice':
+            copied = _copy_splice(*args)
+        else:
+            copied = _copy_file_range(*args)
+        if fsync:
+            os.fdatasync(out_fd)
+        c_end = os.times()
+        result = CopyResult(backend, copied, time.perf_counter() - t_start,
+                            c_end.user - c_start.user, c_end.system - c_start.system)
+    finally:
+        os.close(in_fd)
+        os.close(out_fd)
+    logger.debug("{0}: {1} -> {2}, {3} bytes, {4:.3f}(seconds)".format(
+        backend, if_path, of_path, result.bytes, result.elapsed))
+    return result
+
+
+def results_table(results):
+    """return a PrettyTable of CopyResult list"""
+    table = PrettyTable(['Backend', 'Bytes', 'Time(s)', 'MB/s', 'User(s)', 'Sys(s)', 'CPU/GB(s)'])
+    for r in results:
+        gb = r.bytes / 1024 / 1024 / 1024
+        table.add_row([r.backend, r.bytes, round(r.elapsed, 3), round(r.bytes / 1024 / 1024 / max(r.elapsed, 1e-9), 2),
+                       round(r.user, 3), round(r.sys, 3), round((r.user + r.sys) / gb, 3) if gb else 0])
+    return table
+
+
+class UnitTestCase(unittest.TestCase):
+    """copy backends test case"""
+
+    def test_copy_blocks(self):
+        import tempfile
+        tmp_dir = tempfile.mkdtemp(dir='/var/tmp')
+        if_path = os.path.join(tmp_dir, 'in.dat')
+        data = os.urandom(1024 * 1024 + 1000)
+        with open(if_path, 'wb') as f:
+            f.write(data)
+        for backend in backends_available():
+            of_path = os.path.join(tmp_dir, 'out.' + backend)
+            with open(of_path, 'wb') as f:
+                f.write(b'x' * 3 * 65536)
+            result = copy_blocks(if_path, of_path, 65536, 20, skip=2, seek=1, backend=backend)
+            self.assertEqual(result.bytes, 65536 * 14 + 1000, backend)
+            with open(of_path, 'rb') as f:
+                out = f.read()
+            self.assertEqual(out, b'x' * 65536 + data[2*65536:], backend)
+        if hasattr(os, 'O_DIRECT'):
+            result = copy_blocks(if_path, of_path, 65536, 20, backend='rw', oflag_direct=True)
+            self.assertEqual(result.bytes, len(data))
+            with open(of_path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+        self.assertRaises(Exception, copy_blocks, if_path, of_path, 4096, 1, backend='mmap')
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
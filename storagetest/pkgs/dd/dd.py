@@ -8,14 +8,20 @@
 """
 
 import os
+import time
 import datetime
 import copy
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from prettytable import PrettyTable
 
 from storagetest.libs.log import log
 from storagetest.libs import utils
-from storagetest.libs import retry
+from storagetest.pkgs.fileops import FileOps
+from storagetest.pkgs.fileops.checksum import Checksum, new_hasher, drop_file_cache
+from storagetest.pkgs.fileops.block_stamp import StampVerifier, bad_blocks_table
+from storagetest.pkgs.dd.copy_backends import BACKENDS, CopyResult, backends_available, copy_blocks, \
+    results_table
 
 
 logger = log.get_logger()
@@ -26,13 +32,17 @@ class DD(object):
     """run IO with dd
     Copy a file, converting and formatting according to the operands.
     """
-    def __init__(self, targets=""):
+    def __init__(self, targets="", pattern=None, stamper=None, backend='dd'):
         super(DD, self).__init__()
         self.target_dirs = targets if isinstance(targets, list) else [targets]
+        self.pattern = pattern  # BlockPattern for the original files, None: random text lines
+        self.stamper = stamper  # BlockStamper: stamped original files, verified in place(no .r file)
+        self.stamp_seqs = {}  # {w_file: stamp seq}
+        self.backend = backend  # dd: the dd command, else an in-process copy backend, see copy_backends
         self.run_cmd = utils.run_cmd
 
     def dd_exec(self, if_path, of_path, bs, count, skip=None,
-                seek=None, oflag=None, timeout=1800):
+                seek=None, oflag=None, timeout=1800, iflag=None, conv=None, tries=30):
         """
         dd read write
         :param if_path: read path
@@ -41,69 +51,160 @@ class DD(object):
         :param count:
         :param skip: read offset
         :param seek: write offset
-        :param oflag: eg: direct
+        :param oflag: eg: direct, in-process: O_DIRECT output of the rw backend, the others ignore it
         :param timeout: run_cmd timeout second
+        :param iflag: eg: direct(dd command only)
+        :param conv: eg: fdatasync(dd command only)
+        :param tries: dd command tries(retry every 20s)
         :return:
         """
 
+        if self.backend != 'dd':
+            oflag_direct = bool(oflag and 'direct' in oflag)
+            return 0, self.copy(if_path, of_path, bs, count, skip, seek, self.backend, oflag_direct)
+
         dd_cmd = "dd if={0} of={1} bs={2} count={3}".format(
             if_path, of_path, bs, count)
+        if iflag:
+            dd_cmd += " iflag={0}".format(iflag)
         if oflag:
             dd_cmd += " oflag={0}".format(oflag)
+        if conv:
+            dd_cmd += " conv={0}".format(conv)
         if skip:
             dd_cmd += " skip={0}".format(skip)
         if seek:
             dd_cmd += " seek={0}".format(seek)
 
-        rc, output = self.run_cmd(dd_cmd, 'ignore', tries=30, delay=20, timeout=timeout)
+        rc, output = self.run_cmd(dd_cmd, 'ignore', tries=tries, delay=20, timeout=timeout)
 
         return rc, output
 
-    @retry(tries=5, delay=3)
-    def ssh_md5sum(self, f_name):
+    @staticmethod
+    def copy(if_path, of_path, bs, count, skip=None, seek=None, backend='rw', oflag_direct=False):
         """
-        get md5sum on POSIX by cmd: md5sum file_name
-        :param f_name:file full path
-        :return:
+        copy in process with the dd semantics, see copy_backends.copy_blocks
+        :param bs: bytes or size string, eg: 4k
+        :param oflag_direct: rw backend O_DIRECT output, see copy_backends.copy_blocks
+        :return: CopyResult
         """
+        result = copy_blocks(if_path, of_path, utils.strsize_to_byte(bs), int(count), skip, seek, backend,
+                             oflag_direct=oflag_direct)
+        logger.info("{0}: {1} -> {2}, {3} bytes, {4:.3f}(seconds), user {5:.3f}s, sys {6:.3f}s".format(
+            backend, if_path, of_path, result.bytes, result.elapsed, result.user, result.sys))
+        return result
 
-        md5sum_cmd = "md5sum {0}".format(f_name)
-        rc, output = self.run_cmd(md5sum_cmd, 0, tries=3)
-        return output.strip('\n').split(' ')[0].split('\\')[-1]
+    def compare_backends(self, if_path, of_path, bs, count, skip=None, seek=None, backends=None):
+        """
+        copy the same range with each backend(the input page cache dropped before each), report throughput
+        and CPU time per backend
+        the dd command rows match the in-process ones: dd buffered like rw/sendfile/splice, dd-direct
+        (iflag/oflag=direct) like direct, both fdatasync the output as copy_blocks does
+        :param backends: list of BACKENDS + 'dd' / 'dd-direct', None: all available
+        :return: CopyResult list
+        """
+        if not backends:
+            backends = backends_available() + ['dd']
+            if 'direct' in backends:
+                backends.append('dd-direct')
+        results = []
+        for backend in backends:
+            with open(if_path, 'rb') as f:
+                drop_file_cache(f.fileno())
+            if backend in ('dd', 'dd-direct'):
+                flag = 'direct' if backend == 'dd-direct' else None
+                t_start, c_start = time.perf_counter(), os.times()
+                rc, output = DD(backend='dd').dd_exec(if_path, of_path, bs, count, skip, seek, oflag=flag,
+                                                      iflag=flag, conv='fdatasync', tries=1)
+                c_end = os.times()
+                if rc != 0:
+                    logger.warning("{0}: not supported by {1} -> {2}: {3}".format(backend, if_path, of_path,
+                                                                                  output.strip()))
+                    continue
+                size = utils.strsize_to_byte(bs) * int(count)
+                results.append(CopyResult(backend, min(size, os.path.getsize(if_path)), time.perf_counter() - t_start,
+                                          c_end.children_user - c_start.children_user,
+                                          c_end.children_system - c_start.children_system))
+                continue
+            if backend not in BACKENDS:
+                raise Exception("Not support copy backend: {0}".format(backend))
+            try:
+                results.append(self.copy(if_path, of_path, bs, count, skip, seek, backend))
+            except OSError as e:
+                logger.warning("{0}: not supported by {1} -> {2}: {3}".format(backend, if_path, of_path, e))
+        logger.info("Copy backends {0} -> {1}, bs={2}, count={3}:\n{4}".format(
+            if_path, of_path, bs, count, results_table(results)))
+        return results
+
+    def create_stamp_file(self, file_path, file_size):
+        """
+        create an original file of stamped blocks(stamp offset: file offset)
+        :return: (md5, seq)
+        """
+        seq = len(self.stamp_seqs) + 1
+        hasher = new_hasher('md5')
+        with open(file_path, 'wb') as f:
+            self.stamper.write(f, utils.strsize_to_byte(file_size), seq, hasher=hasher)
+            f.flush()
+            os.fsync(f.fileno())
+        return hasher.hexdigest(), seq
+
+    def verify_stamp(self, file_path, seq=None):
+        """verify the stamped blocks of the written file in place"""
+        verifier = StampVerifier(self.stamper.block_size)
+        bad_blocks = verifier.verify_file(file_path, seq=seq, writer_id=self.stamper.writer_id, direct=True)
+        if bad_blocks:
+            logger.error("> {0} bad blocks:\n{1}".format(file_path, bad_blocks_table(bad_blocks)))
+            raise Exception('{0}: {1} bad blocks, first: {2}'.format(file_path, len(bad_blocks), bad_blocks[0]))
+        logger.info("> {0}: stamps verified, seq={1}".format(file_path, seq))
+        return True
 
-    @staticmethod
-    def verify_md5(w_file_md5_dict, r_file_md5_dict):
+    def verify_files(self, expect_file_md5_dict, size=None, direct=True):
         """
-        verify 2 file_md5_dict match
-        :param w_file_md5_dict:
-        :param r_file_md5_dict:
+        verify the written files: read each one straight into an in-process hasher(no .r copy written back
+        to the target), all the files(one per target dir) concurrently
+        :param expect_file_md5_dict: {w_file: md5}
+        :param size: expected file size(bytes), None: not checked
+        :param direct: read with O_DIRECT, else drop the page cache before/after read
         :return:
         """
-        sort_r_file_md5_dict = utils.sort_dict(r_file_md5_dict)
+        w_files = sorted(expect_file_md5_dict)
+        if not w_files:
+            return True
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=len(w_files)) as pool:
+            if self.stamper is not None:
+                list(pool.map(lambda w_file: self.verify_stamp(w_file, self.stamp_seqs.get(w_file)), w_files))
+                return True
+            checksum = Checksum('md5', direct=direct, drop_cache=not direct)
+            r_md5_list = list(pool.map(checksum.hash_file_data, w_files))
+        elapsed = time.time() - start
+        total_size = sum(os.path.getsize(w_file) for w_file in w_files)
+        logger.info("> Verify {0} file(s), {1} bytes, {2:.3f}(seconds), {3:.2f}MB/s".format(
+            len(w_files), total_size, elapsed, total_size / 1024 / 1024 / max(elapsed, 1e-9)))
+
         table = PrettyTable(['File Name', 'Expected', 'Actually'])
         table_err = copy.deepcopy(table)
-        for r_file, r_md5 in sort_r_file_md5_dict:
-            w_file = r_file.rstrip('.r') + '.w'
-            w_md5 = w_file_md5_dict[w_file]
+        for w_file, r_md5 in zip(w_files, r_md5_list):
+            w_md5 = expect_file_md5_dict[w_file]
+            if size is not None and os.path.getsize(w_file) != size:
+                r_md5 = '{0}(size {1} != {2})'.format(r_md5, os.path.getsize(w_file), size)
             if r_md5 != w_md5:
-                table_err.add_row([r_file, w_md5, r_md5])
-            table.add_row([r_file, w_md5, r_md5])
+                table_err.add_row([w_file, w_md5, r_md5])
+            table.add_row([w_file, w_md5, r_md5])
         logger.info("> Files md5 compare:\n" + str(table))
         if len(table_err._rows) > 0:
             logger.error("> Files md5 compare:\n" + str(table_err))
             raise Exception('Files md5 mismatch!')
         return True
 
-    def dd_write_read(self, file_size='4k', bs='4k', rename=True):
+    def dd_write_read(self, file_size='4k', bs='4k', rename=True, direct=True):
         f_size = utils.strsize_to_byte(file_size)
         bs_size = utils.strsize_to_byte(bs)
         count = f_size // bs_size
 
         file_md5_dict = defaultdict(str)
         for target in self.target_dirs:
-            dd_w_file_md5_dict = defaultdict(str)
-            dd_r_file_md5_dict = defaultdict(str)
-
             dd_f_name_prefix = os.path.basename(target)
             if rename:
                 str_time = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
@@ -111,44 +212,30 @@ class DD(object):
             else:
                 dd_f_name = '{0}.dat'.format(dd_f_name_prefix)
             w_file = os.path.join(target + "/", dd_f_name + '.w')
-            r_file = os.path.join(target + "/", dd_f_name + '.r')
             original_file = os.path.join('/tmp/', dd_f_name)
 
-            original_md5 = utils.create_file(original_file, file_size, line_size=128, mode='w+')
+            if self.stamper is not None:
+                original_md5, self.stamp_seqs[w_file] = self.create_stamp_file(original_file, file_size)
+            else:
+                original_md5 = FileOps().create_file(original_file, file_size, line_size=128, mode='w+',
+                                                     pattern=self.pattern)
             file_md5_dict[w_file] = original_md5
 
             # write into bd
             self.dd_exec(original_file, w_file, bs, count, oflag='direct')
-            dd_w_file_md5_dict[w_file] = original_md5
-
-            # read from bd
-            self.dd_exec(w_file, r_file, bs, count, oflag='direct')
-            r_md5 = self.ssh_md5sum(r_file)
-            dd_r_file_md5_dict[r_file] = r_md5
 
-            # Verify w/r file md5sum
-            self.verify_md5(dd_w_file_md5_dict, dd_r_file_md5_dict)
+        # read from bd and verify, all targets concurrently
+        self.verify_files(file_md5_dict, count * bs_size, direct)
 
         return file_md5_dict
 
-    def dd_read(self, expect_file_md5_dict, file_size='4k', bs='4k'):
-        f_size = util.strsize_to_byte(file_size)
-        bs_size = util.strsize_to_byte(bs)
+    def dd_read(self, expect_file_md5_dict, file_size='4k', bs='4k', direct=True):
+        f_size = utils.strsize_to_byte(file_size)
+        bs_size = utils.strsize_to_byte(bs)
         count = f_size // bs_size
-        file_md5_dict = defaultdict(str)
-
-        for w_file, w_md5 in expect_file_md5_dict.items():
-            r_file = w_file.rstrip('.w') + '.r'
-            # read from bd
-            self.dd_exec(w_file, r_file, bs, count, oflag='direct')
-
-            r_md5 = self.ssh_md5sum(r_file)
-            file_md5_dict[r_file] = r_md5
 
-            # Verify w/r file md5sum
-            self.verify_md5(expect_file_md5_dict, file_md5_dict)
-
-        return True
+        # read from bd and verify, all targets concurrently
+        return self.verify_files(expect_file_md5_dict, count * bs_size, direct)
 
     @staticmethod
     def remove_filesystem():
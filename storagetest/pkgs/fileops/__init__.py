@@ -8,7 +8,19 @@
 """
 
 from .file_ops import *
-__all__ = ['Consistency', 'FileOps', 'LocalFileOps', 'GlobalMetaFileOps']
+from .pattern import BlockPattern, PatternVerifier
+from .block_stamp import BlockStamper, StampVerifier
+from .checksum import Checksum
+from .csum_index import ChecksumIndex
+from .merkle import MerkleTree, compare_trees
+from .registry import FileRegistry
+from .tree_build import TreeBuilder
+from .tree_delete import TreeDeleter
+from .tree_walk import TreeWalker
+__all__ = ['Consistency', 'FileOps', 'LocalFileOps', 'GlobalMetaFileOps', 'BlockPattern', 'PatternVerifier',
+           'Checksum', 'ChecksumIndex', 'MerkleTree', 'compare_trees',
+           'FileRegistry', 'TreeBuilder', 'TreeDeleter',
+           'TreeWalker', 'BlockStamper', 'StampVerifier']
 
 """FileOps contain the various methods for various file operations"""
 
@@ -0,0 +1,309 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : block_stamp.py
+@Time  : 2020/12/3 15:06
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import mmap
+import errno
+import zlib
+import time
+import socket
+import struct
+import hashlib
+import datetime
+import unittest
+from prettytable import PrettyTable
+
+from storagetest.pkgs.fileops.pattern import BadBlock
+
+"""
+Self-describing stamped blocks
+===============================
+Every block(sector) carries a header describing the write which put it there:
+    | magic, block_size, offset, seq, timestamp(ns), writer_id, crc32 (44 bytes) | payload |
+offset is the device(or file) byte offset of the block, crc32 covers the
+header fields and the payload. A reader verifies any range in place, no
+reference file: torn(crc), misdirected(offset), stale(seq) and foreign
+(writer_id) blocks are told apart.
+The payload of a block is a slice of a random pool picked by (offset, seq),
+the same write re-stamps the same bytes, so adjacent unaligned writes of one
+seq compose into valid blocks.
+"""
+
+STAMP_MAGIC = b'STWB'
+_HEAD = struct.Struct('<4sIQQQQ')  # magic, block_size, offset, seq, timestamp, writer_id
+HEADER = struct.Struct('<4sIQQQQI')  # _HEAD + crc32
+HEADER_SIZE = HEADER.size
+_U64 = 0xFFFFFFFFFFFFFFFF
+
+
+def default_writer_id():
+    """64-bit writer id of this host + process"""
+    key = '{0}:{1}'.format(socket.gethostname(), os.getpid()).encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+def align_range(offset, length, block_size):
+    """return the block aligned (offset, length) covering [offset, offset+length)"""
+    start = offset - offset % block_size
+    end = -(-(offset + length) // block_size) * block_size
+    return start, end - start
+
+
+def ns_to_str(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp / 1e9).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+class BlockStamper(object):
+    """Fill buffers with stamped blocks for device offsets"""
+
+    def __init__(self, block_size=4096, writer_id=None, pool_size=1024*1024):
+        """
+        :param block_size: stamp unit, eg: 512(sector) / 4096
+        :param writer_id: 64-bit, None: by hostname and pid
+        :param pool_size: random payload pool size
+        """
+        if block_size <= HEADER_SIZE:
+            raise Exception("block_size must be larger than {0}".format(HEADER_SIZE))
+        self.block_size = block_size
+        self.writer_id = (default_writer_id() if writer_id is None else writer_id) & _U64
+        self.pool_size = pool_size
+        self.pool = memoryview(os.urandom(pool_size + block_size))
+
+    def _payload_start(self, blk_offset, seq):
+        mix = (blk_offset * 0x9E3779B97F4A7C15 + seq * 0xC2B2AE3D27D4EB4F) & _U64
+        return (mix ^ (mix >> 29)) % self.pool_size
+
+    def _put_blocks(self, view, offset, seq, timestamp):
+        """stamp the block aligned view as device range [offset, offset+len(view))"""
+        bs = self.block_size
+        payload_size = bs - HEADER_SIZE
+        for pos in range(0, len(view), bs):
+            blk_offset = offset + pos
+            start = self._payload_start(blk_offset, seq)
+            payload = self.pool[start:start+payload_size]
+            view[pos+HEADER_SIZE:pos+bs] = payload
+            head = _HEAD.pack(STAMP_MAGIC, bs, blk_offset, seq, timestamp, self.writer_id)
+            HEADER.pack_into(view, pos, STAMP_MAGIC, bs, blk_offset, seq, timestamp, self.writer_id,
+                             zlib.crc32(payload, zlib.crc32(head)))
+
+    def fill(self, buf, offset, seq, timestamp=None):
+        """
+        fill buf with the stamped content of device range [offset, offset+len(buf))
+        an unaligned range gets the matching slice of the covering blocks(its edge blocks are torn until
+        the rest of them written by the same seq/timestamp)
+        :param buf: writable buffer
+        :param offset: device byte offset
+        :param seq: write sequence number
+        :param timestamp: ns, None: now. use the same one for all the writes of one seq
+        :return: timestamp
+        """
+        timestamp = time.time_ns() if timestamp is None else timestamp
+        view = memoryview(buf)
+        start, length = align_range(offset, len(view), self.block_size)
+        if start == offset and length == len(view):
+            self._put_blocks(view, offset, seq, timestamp)
+        else:
+            image = bytearray(length)
+            self._put_blocks(memoryview(image), start, seq, timestamp)
+            view[:] = image[offset-start:offset-start+len(view)]
+        return timestamp
+
+    def write(self, f, size, seq, offset=0, hasher=None, chunk_size=1024*1024):
+        """
+        write size bytes of stamped content into a binary file object, the stamp offset is the file offset
+        :param hasher: hashlib object updated with the written data
+        :return: timestamp
+        """
+        timestamp = time.time_ns()
+        chunk_size = max(chunk_size // self.block_size, 1) * self.block_size
+        chunk = bytearray(chunk_size)
+        end = offset + size
+        while offset < end:
+            view = memoryview(chunk)[:min(chunk_size, end - offset)]
+            self.fill(view, offset, seq, timestamp)
+            f.write(view)
+            if hasher is not None:
+                hasher.update(view)
+            offset += len(view)
+        return timestamp
+
+
+class StampVerifier(object):
+    """Verify stamped blocks in place"""
+
+    def __init__(self, block_size=4096, chunk_size=1024*1024):
+        self.block_size = block_size
+        self.chunk_size = max(chunk_size // block_size, 1) * block_size
+
+    def _bad_reason(self, block, blk_offset, seq, writer_id):
+        if not block.tobytes().strip(b'\x00'):
+            return 'zeroed'
+        magic, bs, s_offset, s_seq, s_time, s_writer, crc = HEADER.unpack_from(block, 0)
+        if magic != STAMP_MAGIC or bs != self.block_size:
+            return 'no stamp'
+        when = ns_to_str(s_time)
+        if zlib.crc32(block[HEADER_SIZE:], zlib.crc32(block[:_HEAD.size])) != crc:
+            return 'torn(seq={0}, {1})'.format(s_seq, when)
+        if s_offset != blk_offset:
+            return 'misdirected(offset={0}, seq={1}, {2})'.format(s_offset, s_seq, when)
+        if writer_id is not None and s_writer != writer_id:
+            return 'foreign(writer_id={0}, seq={1}, {2})'.format(s_writer, s_seq, when)
+        if seq is not None and s_seq != seq:
+            return '{0}(seq={1}, expected {2}, {3})'.format('stale' if s_seq < seq else 'future', s_seq, seq, when)
+        return None
+
+    def check(self, data, offset, seq=None, writer_id=None):
+        """
+        verify the blocks in data, read from the block aligned device offset
+        :param data: bytes-like, a trailing partial block is ignored
+        :param offset: device byte offset of data
+        :param seq: expected write sequence number, None: any
+        :param writer_id: expected writer id, None: any
+        :return: BadBlock list
+        """
+        if offset % self.block_size:
+            raise Exception("offset {0} is not aligned to block size {1}".format(offset, self.block_size))
+        bs = self.block_size
+        view = memoryview(data)
+        bad_blocks = []
+        for pos in range(0, len(view) - bs + 1, bs):
+            block = view[pos:pos+bs]
+            reason = self._bad_reason(block, offset + pos, seq, writer_id)
+            if reason:
+                bad_blocks.append(BadBlock(offset + pos, reason))
+        return bad_blocks
+
+    def verify_file(self, file_path, offset=0, length=None, seq=None, writer_id=None, direct=False):
+        """
+        read a range of a file/device and verify the stamps, the range is rounded out to whole blocks
+        a partial block at the end of the file is not a stamped block, not verified
+        :param file_path:
+        :param offset:
+        :param length: None: to the end
+        :param seq: expected write sequence number, None: any
+        :param writer_id: expected writer id, None: any
+        :param direct: read with O_DIRECT(buffered if not supported)
+        :return: BadBlock list
+        """
+        fd = None
+        if direct and hasattr(os, 'O_DIRECT'):
+            try:
+                fd = os.open(file_path, os.O_RDONLY | os.O_DIRECT)
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+        direct = fd is not None
+        if fd is None:
+            fd = os.open(file_path, os.O_RDONLY)
+        buf = mmap.mmap(-1, self.chunk_size)
+        view = memoryview(buf)
+        bad_blocks = []
+        try:
+            f_size = os.lseek(fd, 0, os.SEEK_END)
+            if length is None:
+                length = max(f_size - offset, 0)
+            range_end = offset + length
+            offset, length = align_range(offset, length, self.block_size)
+            end = offset + length
+            if end > f_size >= range_end:
+                # the range ends in the partial tail block of the file
+                end = max(f_size - f_size % self.block_size, offset)
+            while offset < end:
+                try:
+                    n = os.preadv(fd, [view[:min(self.chunk_size, end - offset)]], offset)
+                except OSError as e:
+                    if not direct or e.errno != errno.EINVAL:
+                        raise
+                    # O_DIRECT open but not readable(eg: fuse), fall back to buffered reads
+                    os.close(fd)
+                    fd = os.open(file_path, os.O_RDONLY)
+                    direct = False
+                    continue
+                if n < self.block_size:
+                    bad_blocks.append(BadBlock(offset, 'short read(eof), missing {0} bytes'.format(end - offset)))
+                    break
+                n -= n % self.block_size
+                bad_blocks.extend(self.check(view[:n], offset, seq, writer_id))
+                offset += n
+        finally:
+            view.release()
+            buf.close()
+            os.close(fd)
+        return bad_blocks
+
+
+def bad_blocks_table(bad_blocks, limit=50):
+    """return a PrettyTable of the BadBlock list(first limit rows)"""
+    table = PrettyTable(['Offset', 'Reason'])
+    table.align['Reason'] = 'l'
+    for bad_block in bad_blocks[:limit]:
+        table.add_row([bad_block.offset, bad_block.reason])
+    if len(bad_blocks) > limit:
+        table.add_row(['...', '{0} more'.format(len(bad_blocks) - limit)])
+    return table
+
+
+class UnitTestCase(unittest.TestCase):
+    """block stamp test case"""
+
+    def test_stamp_verify(self):
+        import tempfile
+        stamper = BlockStamper(block_size=512, writer_id=7)
+        verifier = StampVerifier(block_size=512, chunk_size=2048)
+        file_path = os.path.join(tempfile.mkdtemp(), 'stamp.dat')
+        with open(file_path, 'wb') as f:
+            stamper.write(f, 8192, seq=1, chunk_size=2048)
+        self.assertEqual(verifier.verify_file(file_path, seq=1, writer_id=7), [])
+
+        # unaligned adjacent writes of one seq compose into valid blocks
+        timestamp = time.time_ns()
+        with open(file_path, 'r+b') as f:
+            for offset, length in ((1000, 777), (1777, 1295)):
+                buf = bytearray(length)
+                stamper.fill(buf, offset, 2, timestamp)
+                f.seek(offset)
+                f.write(buf)
+        self.assertEqual([b.offset for b in verifier.verify_file(file_path, 1024, 2048, seq=2)], [])
+        bad_blocks = verifier.verify_file(file_path, 512, 3072, seq=2)
+        self.assertEqual([b.offset for b in bad_blocks], [512, 3072])
+        self.assertTrue(bad_blocks[0].reason.startswith('torn'))
+
+        with open(file_path, 'r+b') as f:
+            f.seek(4096)
+            f.write(b'\x00' * 512)
+            f.seek(5120)
+            block = bytearray(512)
+            stamper.fill(block, 0, 1)
+            f.write(block)
+        reasons = [b.reason.split('(')[0] for b in verifier.verify_file(file_path, 3584, 2560, seq=1)]
+        self.assertEqual(reasons, ['zeroed', 'misdirected'])
+        reasons = [b.reason.split('(')[0] for b in verifier.verify_file(file_path, 1024, 512, seq=3, writer_id=8)]
+        self.assertEqual(reasons, ['foreign'])
+        self.assertTrue(verifier.verify_file(file_path, 1024, 512, seq=3)[0].reason.startswith('stale'))
+        self.assertEqual(align_range(1000, 100, 512), (512, 1024))
+
+    def test_partial_tail(self):
+        import tempfile
+        stamper = BlockStamper(block_size=512, writer_id=7)
+        verifier = StampVerifier(block_size=512, chunk_size=2048)
+        file_path = os.path.join(tempfile.mkdtemp(), 'stamp.dat')
+        with open(file_path, 'wb') as f:
+            stamper.write(f, 4196, seq=1)  # 8 blocks + 100 bytes
+        self.assertEqual(verifier.verify_file(file_path, seq=1), [])
+        self.assertEqual(verifier.verify_file(file_path, 3584, 612, seq=1), [])
+        self.assertEqual(verifier.verify_file(file_path, seq=1, direct=True), [])
+        bad_blocks = verifier.verify_file(file_path, 3584, 1024, seq=1)  # past the end of the file
+        self.assertEqual([b.offset for b in bad_blocks], [4096])
+        self.assertTrue(bad_blocks[0].reason.startswith('short read'))
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
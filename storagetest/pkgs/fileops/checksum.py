@@ -0,0 +1,315 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : checksum.py
+@Time  : 2020/11/24 9:35
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import mmap
+import zlib
+import errno
+import hashlib
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from storagetest.libs.log import log
+
+try:
+    import crc32c
+except ImportError:
+    crc32c = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+"""
+Checksum engine
+================
+Bounded-size chunked (or mmap) reads, selectable algorithm and a batch API
+hashing a list of files across a process pool.
+Algorithms: md5, sha1, sha224, sha256, blake2b, crc32,
+            crc32c(pip install crc32c), xxh64/xxh3_64/xxh128(pip install xxhash)
+"""
+
+logger = log.get_logger()
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class _Crc32(object):
+    """hashlib like wrapper of zlib.crc32"""
+    name = 'crc32'
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return '{0:08x}'.format(self.value)
+
+
+class _Crc32c(_Crc32):
+    """hashlib like wrapper of crc32c.crc32c"""
+    name = 'crc32c'
+
+    def update(self, data):
+        self.value = crc32c.crc32c(data, self.value)
+
+
+def algorithms_available():
+    """return the supported algorithm names on this host"""
+    algos = ['md5', 'sha1', 'sha224', 'sha256', 'blake2b', 'crc32']
+    if crc32c is not None:
+        algos.append('crc32c')
+    if xxhash is not None:
+        algos.extend(['xxh64', 'xxh3_64', 'xxh128'])
+    return algos
+
+
+def new_hasher(algo='md5'):
+    """return a new hasher object(update/hexdigest) for the algorithm"""
+    algo = algo.lower()
+    if algo == 'crc32':
+        return _Crc32()
+    if algo == 'crc32c':
+        if crc32c is None:
+            raise Exception("crc32c not installed.(pip install crc32c)")
+        return _Crc32c()
+    if algo.startswith('xxh'):
+        if xxhash is None:
+            raise Exception("xxhash not installed.(pip install xxhash)")
+        return getattr(xxhash, algo)()
+    return hashlib.new(algo)
+
+
+def hash_stream(hasher, f, length=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    update hasher with the data read from a binary file object
+    :param hasher:
+    :param f: file object opened with 'rb'
+    :param length: max bytes to read, None: to the end of file
+    :param chunk_size:
+    :return: bytes read
+    """
+    buf = bytearray(chunk_size if length is None else max(min(chunk_size, length), 1))
+    view = memoryview(buf)
+    total = 0
+    while length is None or total < length:
+        n = f.readinto(buf if length is None or length - total >= len(buf) else view[:length-total])
+        if not n:
+            break
+        hasher.update(view[:n])
+        total += n
+    return total
+
+
+def hash_fd_direct(hasher, fd, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    update hasher with the data of an O_DIRECT opened fd, read into a page aligned(mmap) buffer
+    :param hasher:
+    :param fd: opened with O_DIRECT
+    :param chunk_size: rounded up to 4096
+    :return: bytes read
+    """
+    chunk_size = max(-(-chunk_size // 4096) * 4096, 4096)
+    with mmap.mmap(-1, chunk_size) as buf:
+        view = memoryview(buf)
+        total = 0
+        try:
+            while True:
+                n = os.preadv(fd, [view], total)
+                if not n:
+                    break
+                hasher.update(view[:n])
+                total += n
+                if n < chunk_size:
+                    break
+        finally:
+            view.release()
+    return total
+
+
+def drop_file_cache(fd):
+    """drop the clean page cache of the opened file, no-op if not supported"""
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _hash_file_worker(args):
+    """process pool entry, args: (checksum, file_path)"""
+    checksum, file_path = args
+    return file_path, checksum.hash_file_data(file_path)
+
+
+class Checksum(object):
+    """Chunked, multi-core file checksum engine"""
+
+    def __init__(self, algo='md5', chunk_size=DEFAULT_CHUNK_SIZE, use_mmap=False, workers=None,
+                 drop_cache=False, index=None, direct=False):
+        """
+        :param algo: see algorithms_available()
+        :param chunk_size: max bytes read into memory per read
+        :param use_mmap: hash by mmap the file instead of read into a buffer
+        :param workers: process number for hash_files, None: os.cpu_count()
+        :param drop_cache: drop the file page cache before/after read, read from the storage
+        :param index: ChecksumIndex, skip the files not changed since last hashed
+        :param direct: read with O_DIRECT(bypass the page cache), buffered if not supported
+        """
+        new_hasher(algo)  # check the algorithm
+        self.algo = algo
+        self.chunk_size = chunk_size
+        self.use_mmap = use_mmap
+        self.workers = workers or os.cpu_count() or 1
+        self.drop_cache = drop_cache
+        self.index = index
+        self.direct = direct and hasattr(os, 'O_DIRECT')
+
+    def hash_file(self, file_path):
+        """
+        returns the checksum of the file, the index(if any) is looked up and updated
+        :param file_path: file full path
+        :return:(string) hexadecimal digest
+        """
+        if self.index is None:
+            return self.hash_file_data(file_path)
+        return self.hash_files([file_path])[file_path]
+
+    def hash_file_data(self, file_path):
+        """
+        read and hash the file data
+        :param file_path: file full path
+        :return:(string) hexadecimal digest
+        """
+        logger.debug('Get {0}: {1}'.format(self.algo, file_path))
+        if self.direct:
+            digest = self._hash_file_direct(file_path)
+            if digest is not None:
+                return digest
+        hasher = new_hasher(self.algo)
+        with open(file_path, 'rb') as f:
+            f_size = os.fstat(f.fileno()).st_size
+            if self.drop_cache:
+                drop_file_cache(f.fileno())
+            if self.use_mmap and f_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    view = memoryview(mm)
+                    for pos in range(0, f_size, self.chunk_size):
+                        hasher.update(view[pos:pos+self.chunk_size])
+                    view.release()
+            else:
+                hash_stream(hasher, f, chunk_size=min(self.chunk_size, max(f_size, 1)))
+            if self.drop_cache:
+                drop_file_cache(f.fileno())
+        return hasher.hexdigest()
+
+    def _hash_file_direct(self, file_path):
+        """hash the file read with O_DIRECT, None if O_DIRECT not supported by the file system"""
+        try:
+            fd = os.open(file_path, os.O_RDONLY | os.O_DIRECT)
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            return None
+        hasher = new_hasher(self.algo)
+        try:
+            hash_fd_direct(hasher, fd, self.chunk_size)
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            return None
+        finally:
+            os.close(fd)
+        return hasher.hexdigest()
+
+    def hash_files(self, file_paths):
+        """
+        hash a list of files across a process pool
+        :param file_paths:
+        :return:(dict) {file_path: hexdigest}
+        """
+        file_paths = list(file_paths)
+        if self.index is None:
+            return dict(self._hash_iter(file_paths))
+
+        results = {}
+        todo = {}  # {file_path: stat before hashing}
+        for file_path in file_paths:
+            st = os.stat(file_path)
+            digest = self.index.lookup(file_path, self.algo, st)
+            if digest is None:
+                todo[file_path] = st
+            else:
+                results[file_path] = digest
+        logger.debug('{0} file(s) unchanged, {1} file(s) to hash'.format(len(results), len(todo)))
+        try:
+            for file_path, digest in self._hash_iter(list(todo)):
+                results[file_path] = digest
+                self.index.add(file_path, self.algo, digest, todo[file_path])
+        finally:
+            self.index.commit()
+        return results
+
+    def _hash_iter(self, file_paths):
+        """yield (file_path, digest), hashed across a process pool"""
+        workers = min(self.workers, len(file_paths))
+        if workers <= 1:
+            for file_path in file_paths:
+                yield file_path, self.hash_file_data(file_path)
+            return
+
+        chunksize = max(len(file_paths) // (workers * 4), 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(_hash_file_worker, [(self, p) for p in file_paths], chunksize=chunksize):
+                yield result
+
+
+class UnitTestCase(unittest.TestCase):
+    """checksum test case"""
+
+    def test_hash_files(self):
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        file_paths = []
+        for idx in range(8):
+            file_path = os.path.join(tmp_dir, 'file_{0}'.format(idx))
+            with open(file_path, 'wb') as f:
+                f.write(os.urandom(idx * 1000))
+            file_paths.append(file_path)
+        for algo in algorithms_available():
+            expected = Checksum(algo, chunk_size=512, workers=1).hash_files(file_paths)
+            self.assertEqual(Checksum(algo, chunk_size=512, workers=4).hash_files(file_paths), expected)
+            self.assertEqual(Checksum(algo, chunk_size=512, use_mmap=True).hash_file(file_paths[-1]),
+                             expected[file_paths[-1]])
+            self.assertEqual(Checksum(algo, chunk_size=512, direct=True).hash_file(file_paths[-1]),
+                             expected[file_paths[-1]])
+        with open(file_paths[-1], 'rb') as f:
+            self.assertEqual(Checksum('md5').hash_file(file_paths[-1]), hashlib.md5(f.read()).hexdigest())
+
+    def test_hash_files_index(self):
+        import tempfile
+        from storagetest.pkgs.fileops.csum_index import ChecksumIndex
+        tmp_dir = tempfile.mkdtemp()
+        file_paths = []
+        for idx in range(4):
+            file_path = os.path.join(tmp_dir, 'file_{0}'.format(idx))
+            with open(file_path, 'wb') as f:
+                f.write(os.urandom(1000))
+            file_paths.append(file_path)
+        index = ChecksumIndex(os.path.join(tmp_dir, 'csum.db'))
+        expected = Checksum('md5', workers=2, index=index).hash_files(file_paths)
+        self.assertEqual(Checksum('md5', workers=2).hash_files(file_paths), expected)
+        checksum = Checksum('md5', index=index)
+        checksum.hash_file_data = None  # all hit in the index, never read
+        self.assertEqual(checksum.hash_files(file_paths), expected)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : csum_index.py
+@Time  : 2020/11/25 14:06
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import sqlite3
+import threading
+import unittest
+
+from storagetest.libs.log import log
+
+"""
+Persistent incremental checksum index
+======================================
+SQLite(WAL mode) table: (path, algo) -> (inode, size, mtime_ns, digest)
+A file whose (inode, size, mtime_ns) is unchanged since it was last hashed
+is not read again, unless force=True.
+NOTE:
+- it trusts the file metadata, use force=True for a full data integrity pass
+- keep the db file on a local disk when test on NFS/SMB/s3fs mounts
+"""
+
+logger = log.get_logger()
+
+
+class ChecksumIndex(object):
+    """Persistent checksum index keyed by inode, size and mtime"""
+
+    def __init__(self, db_path, force=False, commit_every=1000):
+        """
+        :param db_path: sqlite db file path
+        :param force: ignore the recorded digests(force rehash), still record the new ones
+        :param commit_every: commit after N digests added, so a broken run resumes from there
+        """
+        self.db_path = db_path
+        self.force = force
+        self.commit_every = commit_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._conn()  # create the table
+
+    @classmethod
+    def next_to(cls, test_path, **kwargs):
+        """create the index db next to the test path: <parent>/.<name>.csum.db"""
+        test_path = os.path.abspath(test_path)
+        db_name = '.{0}.csum.db'.format(os.path.basename(test_path))
+        return cls(os.path.join(os.path.dirname(test_path), db_name), **kwargs)
+
+    @classmethod
+    def from_option(cls, db_path, test_path, force=False):
+        """
+        the index of the --csum_index option
+        :param db_path: None: no index, 'auto': next to the test path(see next_to), else the db file path
+        :param test_path:
+        :param force: see __init__
+        :return: ChecksumIndex or None
+        """
+        if not db_path:
+            return None
+        if db_path == 'auto':
+            return cls.next_to(test_path, force=force)
+        return cls(db_path, force=force)
+
+    def __getstate__(self):
+        # sqlite connections are not picklable(process pool)
+        return {'db_path': self.db_path, 'force': self.force, 'commit_every': self.commit_every}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _conn(self):
+        """one connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=60)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS csum ('
+                         'path TEXT NOT NULL, algo TEXT NOT NULL, inode INTEGER, size INTEGER, '
+                         'mtime_ns INTEGER, digest TEXT, PRIMARY KEY (path, algo))')
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, file_path, algo, st=None):
+        """
+        return the recorded digest if the file not changed, else None
+        :param file_path:
+        :param algo:
+        :param st: os.stat_result of the file, None: stat it now
+        :return:
+        """
+        if self.force:
+            return None
+        st = st or os.stat(file_path)
+        row = self._conn().execute(
+            'SELECT inode, size, mtime_ns, digest FROM csum WHERE path=? AND algo=?',
+            (os.path.abspath(file_path), algo)).fetchone()
+        if row and tuple(row[:3]) == (st.st_ino, st.st_size, st.st_mtime_ns):
+            return row[3]
+        return None
+
+    def add(self, file_path, algo, digest, st):
+        """
+        record the digest(with the stat taken before hashing)
+        :param file_path:
+        :param algo:
+        :param digest:
+        :param st: os.stat_result taken before the file was hashed
+        :return:
+        """
+        with self._lock:
+            self._pending.append((os.path.abspath(file_path), algo, st.st_ino, st.st_size, st.st_mtime_ns, digest))
+            if len(self._pending) >= self.commit_every:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        conn = self._conn()
+        conn.executemany('INSERT OR REPLACE INTO csum VALUES (?, ?, ?, ?, ?, ?)', self._pending)
+        conn.commit()
+        self._pending = []
+
+    def commit(self):
+        with self._lock:
+            self._flush()
+
+    def forget(self, path_prefix):
+        """drop the records under path_prefix"""
+        path_prefix = os.path.abspath(path_prefix)
+        conn = self._conn()
+        conn.execute('DELETE FROM csum WHERE path=? OR substr(path, 1, ?)=?',
+                     (path_prefix, len(path_prefix) + 1, path_prefix + os.sep))
+        conn.commit()
+
+    def close(self):
+        self.commit()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class UnitTestCase(unittest.TestCase):
+    """checksum index test case"""
+
+    def test_index(self):
+        import time
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        file_path = os.path.join(tmp_dir, 'file_1')
+        with open(file_path, 'wb') as f:
+            f.write(b'123')
+        index = ChecksumIndex(os.path.join(tmp_dir, 'csum.db'), commit_every=1)
+        index.add(file_path, 'md5', 'abc', os.stat(file_path))
+        self.assertEqual(ChecksumIndex(index.db_path).lookup(file_path, 'md5'), 'abc')
+        self.assertIsNone(ChecksumIndex(index.db_path, force=True).lookup(file_path, 'md5'))
+        time.sleep(0.01)
+        with open(file_path, 'ab') as f:
+            f.write(b'4')
+        self.assertIsNone(index.lookup(file_path, 'md5'))
+        self.assertIsNone(ChecksumIndex.from_option(None, tmp_dir))
+        self.assertEqual(ChecksumIndex.from_option('auto', tmp_dir, force=True).db_path,
+                         os.path.join(os.path.dirname(tmp_dir), '.{0}.csum.db'.format(os.path.basename(tmp_dir))))
+        index.forget(tmp_dir)
+        self.assertIsNone(index.lookup(file_path, 'md5'))
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -10,17 +10,23 @@
 import time
 import sys
 import os
-import shutil
-import hashlib
 import string
 import random
 import itertools
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from prettytable import PrettyTable
 
 from storagetest.libs import utils, log
 from storagetest.libs.schedule import enter_phase
 from storagetest.libs.exceptions import NoSuchDir
+from storagetest.pkgs.fileops.pattern import BlockPattern, PatternVerifier, parse_stamp, STAMP_SIZE
+from storagetest.pkgs.fileops.checksum import Checksum, new_hasher, hash_stream
+from storagetest.pkgs.fileops.merkle import compare_trees, diff_table
+from storagetest.pkgs.fileops.registry import FileRegistry
+from storagetest.pkgs.fileops.tree_build import TreeBuilder
+from storagetest.pkgs.fileops.tree_delete import TreeDeleter
+from storagetest.pkgs.fileops.tree_walk import TreeWalker
 
 logger = log.get_logger()
 
@@ -28,9 +34,18 @@ logger = log.get_logger()
 class Consistency(object):
     """Test the file consistency"""
 
-    def __init__(self, top_path):
+    def __init__(self, top_path, csum_index=None, io_workers=16, hash_workers=None):
+        """
+        :param top_path:
+        :param csum_index: ChecksumIndex for compare
+        :param io_workers: threads to create/stat files, the latency bound ops on NFS/SMB/s3fs
+        :param hash_workers: processes to hash files, None: os.cpu_count()
+        """
         self.top_path = top_path
         self.local_path = '/tmp/consistency_local'
+        self.csum_index = csum_index
+        self.io_workers = io_workers
+        self.hash_workers = hash_workers
         self.help = """
 Storage-Consistency-Test:
     A python script for test.sh the file consistency between 2 path(or cloud). 
@@ -61,6 +76,9 @@ Storage-Consistency-Test:
     compare files on test.sh server B, all files update failure
     #python cst.py compare test01 /mnt/s3/test01 10
     compare 10 file(s), equal: 0.0% time:0.741319894791(seconds)
+    
+    compare 2 whole trees, report the missing/extra/differing entries
+    #python cst.py compare_tree test01 /mnt/s3/test01
         """
 
     def verify(self):
@@ -68,47 +86,110 @@ Storage-Consistency-Test:
             raise NoSuchDir(self.top_path)
 
     @staticmethod
-    def create(test_path, f_num, f_size):
+    def log_rate(phase, f_num, total_bytes, during):
+        """log the files/s and MB/s of a phase"""
+        during = max(during, 1e-9)
+        logger.info("{0}: {1} file(s), {2:.2f} MB, time: {3:.3f}(seconds), {4:.1f} files/s, {5:.2f} MB/s".format(
+            phase, f_num, total_bytes / 1048576.0, during, f_num / during, total_bytes / 1048576.0 / during))
+
+    @staticmethod
+    def _create_one(test_path, idx, f_size, pattern=None):
+        """create test_<idx>.txt, return the bytes written"""
+        with open(test_path + "/test_" + str(idx) + ".txt", "wb") as f:
+            if pattern is not None:
+                return pattern.write(f, idx, int(f_size) * 1024)
+            data = "".join([str(idx) + " " + str(line) + " line\n"
+                            for line in range(0, 105 * int(f_size))]).encode()
+            f.write(data)
+            return len(data)
+
+    @classmethod
+    def _create_files(cls, test_path, f_num, f_size, pattern=None, workers=1):
+        """create test_<idx>.txt files, return the total bytes written"""
         utils.mkdir_path(test_path)
+        if workers > 1 and f_num > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return sum(pool.map(lambda idx: cls._create_one(test_path, idx, f_size, pattern), range(0, f_num)))
+        return sum(cls._create_one(test_path, idx, f_size, pattern) for idx in range(0, f_num))
+
+    @classmethod
+    def create(cls, test_path, f_num, f_size, pattern=None, workers=1):
+        """
+        create f_num files named test_<idx>.txt
+        :param test_path:
+        :param f_num:
+        :param f_size: size(k)
+        :param pattern: BlockPattern, write the block pattern(file_id=idx) instead of text lines
+        :param workers: threads to create files concurrently
+        :return:
+        """
         start = time.time()
-        for idx in range(0, int(f_num)):
-            f = open(test_path + "/test_" + str(idx) + ".txt", "w")
-            for line in range(0, 105 * int(f_size)):
-                f.write(str(idx) + " " + str(line) + " line\n")
-            f.close()
-        end = time.time()
-        during = end - start
-        logger.info("{0}: create {1} file(s), time: {2}(seconds)".format(
-            test_path, f_num, during))
+        total_bytes = cls._create_files(test_path, int(f_num), f_size, pattern, workers)
+        cls.log_rate("{0}: create".format(test_path), int(f_num), total_bytes, time.time() - start)
         return True
 
-    @staticmethod
-    def compare(path_1, path_2, f_num):
-        start = time.time()
-        equal_num = 0
-        for idx in range(0, int(f_num)):
-            f_path_1 = open(path_1 + "/test_" + str(idx) + ".txt", "r")
-            data_path_1 = f_path_1.read()
+    @classmethod
+    def compare(cls, path_1, path_2, f_num, algo='sha224', workers=None, index=None, io_workers=1):
+        """
+        compare test_<idx>.txt files between path_1 and path_2,
+        all the files are hashed(binary stream) in one batch across a process pool
+        :param path_1:
+        :param path_2: path or path list, each compared with path_1
+        :param f_num:
+        :param algo: checksum algorithm, see checksum.algorithms_available()
+        :param workers: hash processes, None: os.cpu_count()
+        :param index: ChecksumIndex, skip hashing the files not changed
+        :param io_workers: threads to stat the files
+        :return:
+        """
+        f_num = int(f_num)
+        paths_2 = path_2 if isinstance(path_2, list) else [path_2]
+        f_names = ["test_" + str(idx) + ".txt" for idx in range(0, f_num)]
+        file_paths = [path + "/" + f_name for path in [path_1] + paths_2 for f_name in f_names]
 
-            filename = path_2 + "/test_" + str(idx) + ".txt"
-            try:
-                f_path_2 = open(filename, "r")
-                data_path_2 = f_path_2.read()
-                if hashlib.sha224(data_path_1.encode()).hexdigest() == hashlib.sha224(data_path_2.encode()).hexdigest():
-                    equal_num += 1
-            except IOError as e:
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=max(io_workers, 1)) as pool:
+            f_sizes = list(pool.map(lambda x: os.path.getsize(x) if os.path.isfile(x) else None, file_paths))
+        for filename, f_size in zip(file_paths, f_sizes):
+            if f_size is None:
                 logger.error(filename + ":file not exist")
-                raise e
-        end = time.time()
-        during = end - start
-        equal_rate = float(equal_num) / int(f_num) * 100
-        logger.info("Compare path1:{0}; path2: {1}".format(path_1, path_2))
-        if equal_num < f_num:
-            logger.error("Compared {0} file(s), equal: {1}% time: {2}(seconds)".format(
-                f_num, equal_rate, during))
+                raise IOError("No such file: {0}".format(filename))
+        csum = Checksum(algo, workers=workers, index=index).hash_files(file_paths)
+        cls.log_rate("Compare hash({0})".format(algo), len(file_paths), sum(f_sizes), time.time() - start)
+
+        failed = False
+        for path in paths_2:
+            equal_num = 0
+            for f_name in f_names:
+                if csum[path_1 + "/" + f_name] == csum[path + "/" + f_name]:
+                    equal_num += 1
+            equal_rate = float(equal_num) / f_num * 100 if f_num else 100.0
+            logger.info("Compare path1:{0}; path2: {1}".format(path_1, path))
+            if equal_num < f_num:
+                logger.error("Compared {0} file(s), equal: {1}%".format(f_num, equal_rate))
+                failed = True
+            else:
+                logger.info("Compared {0} file(s), equal: {1}%".format(f_num, equal_rate))
+        if failed:
+            raise Exception("Consistency Test FAIL")
+        return True
+
+    def compare_tree(self, path_1, path_2, algo='sha1'):
+        """
+        compare 2 arbitrary directory trees by Merkle hashes
+        :param path_1: reference tree, eg: local
+        :param path_2: tree under test, eg: a FUSE or cloud mount
+        :param algo: checksum algorithm, see checksum.algorithms_available()
+        :return:
+        """
+        start = time.time()
+        tree_diff = compare_trees(path_1, path_2, algo, workers=self.hash_workers, index=self.csum_index)
+        logger.info("Compare tree path1:{0}; path2: {1}, time: {2:.3f}(seconds)".format(
+            path_1, path_2, time.time() - start))
+        if any(tree_diff):
+            logger.error("missing: {0}, extra: {1}, differing: {2}\n{3}".format(
+                len(tree_diff.missing), len(tree_diff.extra), len(tree_diff.differing), diff_table(tree_diff)))
             raise Exception("Consistency Test FAIL")
-        logger.info("Compared {0} file(s), equal: {1}% time: {2}(seconds)".format(
-            f_num, equal_rate, during))
         return True
 
     def test(self):
@@ -141,14 +222,21 @@ Storage-Consistency-Test:
                     num = sys.argv[4]
                 self.compare(path, path2, num)
                 exit(0)
+            elif cmd == "compare_tree":
+                if len(sys.argv) < 4:
+                    print("need two paths for compare_tree.")
+                    exit(1)
+                self.compare_tree(path, sys.argv[3])
+                exit(0)
 
     def sanity(self):
         self.verify()
         test_path = os.path.join(self.top_path, "consistency")
         try:
-            self.create(self.local_path, 500, 1)
-            self.create(test_path, 500, 1)
-            self.compare(self.local_path, test_path, 500)
+            self.create(self.local_path, 500, 1, workers=self.io_workers)
+            self.create(test_path, 500, 1, workers=self.io_workers)
+            self.compare(self.local_path, test_path, 500, workers=self.hash_workers, index=self.csum_index,
+                         io_workers=self.io_workers)
             return True
         except Exception as e:
             raise e
@@ -157,11 +245,16 @@ Storage-Consistency-Test:
         self.verify()
         test_top_path = os.path.join(self.top_path, "consistency")
         try:
-            self.create(self.local_path, 1000, 1)
-            for x in range(0, 100):
-                test_path = os.path.join(test_top_path, 'dir{0}'.format(x))
-                self.create(test_path, 1000, 1)
-                self.compare(self.local_path, test_path, 1000)
+            self.create(self.local_path, 1000, 1, workers=self.io_workers)
+            test_paths = [os.path.join(test_top_path, 'dir{0}'.format(x)) for x in range(0, 100)]
+            # concurrent across the dirs, each dir created by one thread
+            start = time.time()
+            with ThreadPoolExecutor(max_workers=max(self.io_workers, 1)) as pool:
+                total_bytes = sum(pool.map(lambda x: self._create_files(x, 1000, 1), test_paths))
+            self.log_rate("{0}: create".format(test_top_path), 1000 * len(test_paths), total_bytes,
+                          time.time() - start)
+            self.compare(self.local_path, test_paths, 1000, workers=self.hash_workers, index=self.csum_index,
+                         io_workers=self.io_workers)
             return True
         except Exception as e:
             raise e
@@ -170,8 +263,15 @@ Storage-Consistency-Test:
 class FileOps(object):
     """The various file operations"""
 
-    def __init__(self):
-        pass
+    _zero_md5 = {}  # {size: md5 of size zero bytes}
+
+    def __init__(self, read_verify=False, dir_workers=8):
+        """
+        :param read_verify: read back(page cache dropped) and verify the md5 after a file created
+        :param dir_workers: threads to create dirs
+        """
+        self.read_verify = read_verify
+        self.dir_workers = dir_workers
 
     # ==== file ops ====
     @staticmethod
@@ -183,7 +283,9 @@ class FileOps(object):
     @staticmethod
     def random_bytes(n):
         """returns a byte array of random bytes"""
-        return bytearray(random.getrandbits(8) for _ in range(n))
+        if n <= 0:
+            return bytearray()
+        return bytearray(random.getrandbits(8 * n).to_bytes(n, 'little'))
 
     @staticmethod
     def random_string(str_len=16):
@@ -204,29 +306,26 @@ class FileOps(object):
         return ''.join(random.sample(base_string * multiple, str_len))
 
     @staticmethod
-    def hash_md5(file_path):
+    def hash_md5(file_path, index=None):
         """
         returns the hash md5 of the opened file
         :param file_path: file full path
+        :param index: ChecksumIndex, return the recorded md5 if the file not changed
         :return:(string) md5_value 32-bit hexadecimal string.
         """
-        logger.debug('Get MD5: {0}'.format(file_path))
         try:
-            h_md5 = hashlib.md5()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(), b""):
-                    h_md5.update(chunk)
-            return h_md5.hexdigest()
+            return Checksum('md5', index=index).hash_file(file_path)
         except Exception as e:
             raise Exception(e)
 
-    def create_file(self, file_path, total_size='4k', line_size=128, mode='w+'):
+    def create_file(self, file_path, total_size='4k', line_size=128, mode='w+', pattern=None):
         """
         create original file, each line with line_number, and specified line size
         :param file_path:
         :param total_size:
         :param line_size:
         :param mode: w+ / a+
+        :param pattern: BlockPattern, write the block pattern instead of random lines(line_size ignored)
         :return:
         """
 
@@ -238,22 +337,82 @@ class FileOps(object):
                 raise Exception(e)
 
         size = utils.strsize_to_byte(total_size)
+        if pattern is not None:
+            return self._create_pattern_file(file_path, size, mode, pattern)
         line_count = size // line_size
         unaligned_size = size % line_size
 
-        with open(file_path, mode) as f:
+        # compute md5 while writing, no read back
+        hasher = new_hasher('md5')
+        with open(file_path, 'ab' if 'a' in mode else 'wb') as f:
             logger.debug("write file: {0}".format(file_path))
+            if 'a' in mode:
+                self._hash_existing(hasher, file_path, os.fstat(f.fileno()).st_size)
             for line_num in range(0, line_count):
                 random_sting = self.random_string(line_size - 2 - len(str(line_num))) + '\n'
-                f.write('{line_num}:{random_s}'.format(line_num=line_num, random_s=random_sting))
+                line = '{line_num}:{random_s}'.format(line_num=line_num, random_s=random_sting).encode()
+                f.write(line)
+                hasher.update(line)
             if unaligned_size > 0:
-                f.write(self.random_string(unaligned_size))
+                data = self.random_string(unaligned_size).encode()
+                f.write(data)
+                hasher.update(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        file_md5 = hasher.hexdigest()
+        if self.read_verify:
+            self.read_back_verify(file_path, file_md5)
+        return file_md5
+
+    def _create_pattern_file(self, file_path, size, mode, pattern):
+        """write/append size bytes of BlockPattern(file_id by file path) data"""
+        b_mode = 'ab' if 'a' in mode else 'wb'
+        file_id = pattern.file_id(file_path)
+        prefix_is_pattern = False
+        if b_mode == 'ab' and os.path.isfile(file_path):
+            # keep the file_id of the existing content, the file may be renamed
+            with open(file_path, 'rb') as f:
+                stamp = parse_stamp(f.read(STAMP_SIZE))
+            if stamp and (stamp.seed, stamp.block_size) == (pattern.seed, pattern.block_size):
+                file_id = stamp.file_id
+                prefix_is_pattern = True
+
+        hasher = new_hasher('md5')
+        with open(file_path, b_mode) as f:
+            logger.debug("write pattern file: {0}".format(file_path))
+            offset = os.fstat(f.fileno()).st_size if b_mode == 'ab' else 0
+            if offset and prefix_is_pattern:
+                for chunk in pattern.iter_chunks(file_id, offset):
+                    hasher.update(chunk)
+            elif offset:
+                self._hash_existing(hasher, file_path, offset)
+            for chunk in pattern.iter_chunks(file_id, size, offset):
+                f.write(chunk)
+                hasher.update(chunk)
             f.flush()
             os.fsync(f.fileno())
 
-        file_md5 = self.hash_md5(file_path)
+        file_md5 = hasher.hexdigest()
+        if self.read_verify:
+            self.read_back_verify(file_path, file_md5)
         return file_md5
 
+    @staticmethod
+    def _hash_existing(hasher, file_path, length):
+        """update hasher with the existing content before append"""
+        with open(file_path, 'rb') as f:
+            hash_stream(hasher, f, length)
+
+    @staticmethod
+    def read_back_verify(file_path, expected_md5):
+        """read the file back with page cache dropped, check the md5"""
+        actual_md5 = Checksum('md5', drop_cache=True).hash_file(file_path)
+        if actual_md5 != expected_md5:
+            raise Exception("Read back md5 mismatch: {0}, expected:{1}, actual:{2}".format(
+                file_path, expected_md5, actual_md5))
+        return True
+
     def modify_file(self, file_path):
         return self.create_file(file_path, '4k', 128, mode='a+')
 
@@ -262,9 +421,22 @@ class FileOps(object):
         size_b = utils.strsize_to_byte(size)
         with open(file_path, "wb") as out:
             out.truncate(size_b)
-        file_md5 = self.hash_md5(file_path)
+        file_md5 = self.zero_md5(size_b)
+        if self.read_verify:
+            self.read_back_verify(file_path, file_md5)
         return file_md5
 
+    @classmethod
+    def zero_md5(cls, size):
+        """md5 of size zero bytes, computed in memory"""
+        if size not in cls._zero_md5:
+            hasher = new_hasher('md5')
+            zeros = bytes(min(size, 4 * 1024 * 1024))
+            for pos in range(0, size, len(zeros) or 1):
+                hasher.update(zeros[:size-pos])
+            cls._zero_md5[size] = hasher.hexdigest()
+        return cls._zero_md5[size]
+
     @staticmethod
     def rename_file(file_path, suffix="_new"):
         """return new_file_path"""
@@ -292,13 +464,7 @@ class FileOps(object):
     def create_dirs(self, parent_path, dirs_num, name_prefix="Dir"):
         """method to create number of dirs and return dir_names list"""
         logger.info("Create {0} dirs under path: {1}".format(dirs_num, parent_path))
-        dir_path_list = []
-        for x in range(dirs_num):
-            dir_name = "{0}_{1}".format(name_prefix, x)
-            dir_path = os.path.join(parent_path, dir_name)
-            utils.mkdir_path(dir_path)
-            dir_path_list.append(dir_path)
-        return dir_path_list
+        return self.create_tree(parent_path, [dirs_num], name_prefix + "_{idx}")[0]
 
     def create_sub_dirs(self, parent_path, dirs_num):
         """Created subdir inside the parent_dir"""
@@ -306,16 +472,20 @@ class FileOps(object):
 
     def create_nested_dirs(self, parent_path, level):
         logger.info("Create nested dirs under path: {0}, level={1}".format(parent_path, level))
-        tmp = [[parent_path]]  # temp list storing the TopLevel dir
-        nested_dir_path = []
-        for i in range(level):
-            tmp.append(["Nested_" + str(i)])
-        for item in itertools.product(*tmp):
-            dir_path = os.path.join(parent_path, *item)
-            utils.mkdir_path(dir_path)
-            tmp.append(dir_path)
-            nested_dir_path.append(os.path.join(*item))
-        return nested_dir_path
+        if level <= 0:
+            return [parent_path]
+        return self.create_tree(parent_path, [1] * level, "Nested_{level}")[-1]
+
+    def create_tree(self, top_path, shape, names="Dir_{idx}", depth=None):
+        """
+        create a dir tree by shape with dir_workers threads
+        :param top_path:
+        :param shape: fan-out per level, eg: [10, 5] / "10x5", see tree_build.parse_shape()
+        :param names: dir name format of each level, fields: {idx}, {level}
+        :param depth: levels when shape is an int fan-out
+        :return: list of the dir paths per level
+        """
+        return TreeBuilder(self.dir_workers, names).build(top_path, shape, depth)
 
     @staticmethod
     def rename_dirs(dir_path_list, suffix="_new"):
@@ -332,25 +502,20 @@ class FileOps(object):
                 raise Exception("{0} does not exist".format(dir_path))
         return new_dir_path_list
 
-    @staticmethod
-    def remove_dir(dir_path):
-        """rm dir tree"""
+    def remove_dir(self, dir_path):
+        """rm dir tree by dir_workers threads, raise if any entry failed to delete"""
         if os.path.isdir(dir_path):
-            shutil.rmtree(dir_path, ignore_errors=True)
+            TreeDeleter(self.dir_workers).rmtree(dir_path)
         else:
             raise Exception("{0} does not exist".format(dir_path))
 
-    @staticmethod
-    def list_dirs(dir_path_list):
-        """list the dirs"""
-        for dir_path in dir_path_list:
-            if os.path.isdir(dir_path):
-                for dirname, dirnames, filenames in os.walk(dir_path):
-                    # print(dirname)
-                    pass
-            else:
-                raise Exception("Error: {0} does not exist".format(dir_path))
+    def list_dirs(self, dir_path_list, stat=False):
+        """list the dirs by dir_workers threads, report entries/s, readdir latency and depth histogram"""
+        walker = TreeWalker(self.dir_workers, stat=stat).walk(*dir_path_list).report()
+        if walker.errors:
+            raise Exception("Error: list {0} entries failed, first: {1}".format(len(walker.errors), walker.errors[0]))
         logger.info("PASS: All the directories created exist")
+        return walker
 
     # ==== acls/attributes ops ====
     @staticmethod
@@ -401,16 +566,32 @@ class FileOps(object):
 class LocalFileOps(FileOps):
     """The various of file operations on local File System mount path"""
 
-    def __init__(self, top_path):
-        super(LocalFileOps, self).__init__()
+    def __init__(self, top_path, pattern=None, verify_mode='md5', workers=None, read_verify=False,
+                 csum_index=None, dir_workers=8):
+        """
+        :param top_path:
+        :param pattern: BlockPattern or None(random text lines)
+        :param verify_mode: md5: compare with the md5 recorded at creation;
+                            pattern: regenerate-and-compare the BlockPattern files, no md5 kept for them
+        :param workers: processes for md5 check, None: os.cpu_count()
+        :param read_verify: read back(cache dropped) and verify each file after created
+        :param csum_index: ChecksumIndex, md5 check skips the files not changed since last checked
+        :param dir_workers: threads to create dirs
+        """
+        super(LocalFileOps, self).__init__(read_verify, dir_workers)
         self.top_path = top_path
+        self.verify_mode = verify_mode
+        self.workers = workers
+        self.csum_index = csum_index
+        if verify_mode == 'pattern' and pattern is None:
+            pattern = BlockPattern(seed=random.getrandbits(32))
+        self.pattern = pattern
         self.phase_list = []  # PrettyTable(['Step', 'Result', 'Comments'])
 
         self.Dirs = []  # dir path list after creation
         self.SubDirs = []  # sub dirs inside a parent_dir
         self.NestedDirs = []  # nested dir inside a parent_dir
-        self.Files = []  # files inside a dir provided
-        self.Md5Csum = {}  # dict with filename as the key to hold md5 checksum, {"f_name":"md5"}
+        self.registry = FileRegistry()  # files inside the dirs: path, size and md5(None for pattern files)
 
     def verify(self):
         if not os.path.isdir(self.top_path):
@@ -423,19 +604,45 @@ class LocalFileOps(FileOps):
             yield file_name
 
     @enter_phase()
-    def test_check_files_md5(self):
-        """Check files md5 match in dict Md5Csum"""
+    def test_check_files_md5(self, batch_size=100000):
+        """Check files md5 match the md5 recorded in the registry"""
         table_err = PrettyTable(['File', 'Expected', 'Actual'])
-        for file_path, expected_md5 in self.Md5Csum.items():
-            actual_md5 = self.hash_md5(file_path)
-            if actual_md5 != expected_md5:
-                table_err.add_row([file_path, expected_md5, actual_md5])
-                continue
+        checksum = Checksum('md5', workers=self.workers, index=self.csum_index)
+        fids = [fid for fid in self.registry.fids() if self.registry.md5(fid) is not None]
+        for pos in range(0, len(fids), batch_size):
+            batch = {self.registry.path(fid): fid for fid in fids[pos:pos+batch_size]}
+            for file_path, actual_md5 in checksum.hash_files(batch.keys()).items():
+                expected_md5 = self.registry.md5(batch[file_path])
+                if actual_md5 != expected_md5:
+                    table_err.add_row([file_path, expected_md5, actual_md5])
         if len(table_err._rows) > 0:
-            logger.error("Md5sum Check:\n".format(table_err))
+            logger.error("Md5sum Check:\n{0}".format(table_err))
             raise Exception("FAILED: File md5 NOT matched!")
         return True
 
+    @enter_phase()
+    def test_check_files_pattern(self, samples=0):
+        """Check files by regenerate-and-compare the block pattern"""
+        verifier = PatternVerifier()
+        table_err = PrettyTable(['File', 'Offset', 'Reason'])
+        for fid in self.registry.fids():
+            if self.registry.md5(fid) is not None:  # not a pattern file, checked by md5
+                continue
+            file_path = self.registry.path(fid)
+            for bad_block in verifier.verify_file(file_path, samples=samples,
+                                                  expected_size=self.registry.size[fid]):
+                table_err.add_row([file_path, bad_block.offset, bad_block.reason])
+        if len(table_err._rows) > 0:
+            logger.error("Pattern Check:\n{0}".format(table_err))
+            raise Exception("FAILED: File pattern NOT matched!")
+        return True
+
+    def check_files(self):
+        """Check files by verify_mode"""
+        if self.verify_mode == 'pattern':
+            self.test_check_files_pattern()
+        return self.test_check_files_md5()
+
     @enter_phase()
     def test_create_dirs(self, test_path, dirs_num):
         """Create dirs"""
@@ -445,9 +652,11 @@ class LocalFileOps(FileOps):
     @enter_phase()
     def test_list_dirs(self):
         """List dirs, sub dirs, nested dirs"""
-        self.list_dirs(self.Dirs)
-        self.list_dirs(self.SubDirs)
-        self.list_dirs(self.NestedDirs)
+        # the sub dirs and nested dirs are inside the dirs, walk(and stat) all once
+        for dir_path in self.SubDirs + self.NestedDirs:
+            if not os.path.isdir(dir_path):
+                raise Exception("Error: {0} does not exist".format(dir_path))
+        self.list_dirs(self.Dirs, stat=True)
         return True
 
     @enter_phase()
@@ -457,6 +666,19 @@ class LocalFileOps(FileOps):
             self.SubDirs.extend(self.create_sub_dirs(the_dir, sub_dirs_num))
         return True
 
+    @enter_phase()
+    def test_create_tree(self, test_path, shape, depth=None):
+        """Create a dir tree by shape(mkdir benchmark)"""
+        levels = self.create_tree(test_path, shape, "Tree_{level}_{idx}", depth)
+        logger.info("Created {0} dirs".format(sum(len(level) for level in levels)))
+        return True
+
+    @enter_phase()
+    def test_delete_tree(self, test_path):
+        """Delete a dir tree by parallel unlink/rmdir(delete storm)"""
+        self.remove_dir(test_path)
+        return True
+
     @enter_phase()
     def test_create_nested_dirs(self, nested_level):
         """Create nested dirs"""
@@ -468,62 +690,62 @@ class LocalFileOps(FileOps):
     def test_create_files(self, files_num, file_size):
         """Create files inside all dirs"""
         logger.info("Create {0} files under all dirs(size:{1})".format(files_num, file_size))
+        size = utils.strsize_to_byte(file_size)
         for the_dir in self.Dirs + self.SubDirs + self.NestedDirs:
             for f_name in self.file_name_generator(files_num):
                 file_path = os.path.join(the_dir, f_name)
-                md5 = self.create_file(file_path, file_size, 128, 'w+')
-                self.Md5Csum[file_path] = md5
-                self.Files.append(file_path)
+                md5 = self.create_file(file_path, file_size, 128, 'w+', pattern=self.pattern)
+                self.registry.add(file_path, size, md5 if self.verify_mode != 'pattern' else None)
         return True
 
     @enter_phase()
     def test_create_large_files(self, files_num, file_size):
         """Create files inside dirs"""
         logger.info("Create {0} large size files under all dirs(size:{1})".format(files_num, file_size))
+        size = utils.strsize_to_byte(file_size)
         for the_dir in self.Dirs:  # + self.SubDirs + self.NestedDirs
             for f_name in self.large_file_name_generator(files_num):
                 file_path = os.path.join(the_dir, f_name)
                 md5 = self.create_large_size_file(file_path, file_size)
-                self.Md5Csum[file_path] = md5
-                self.Files.append(file_path)
+                self.registry.add(file_path, size, md5)
         return True
 
     @enter_phase()
     def test_modify_files(self):
         """Modify files by write a+"""
         logger.info("Modify files by write a+(extend size:1k)")
-        for file_path in self.Files:
-            md5 = self.create_file(file_path, "1K", 128, 'a+')
-            self.Md5Csum[file_path] = md5
+        for fid in self.registry.fids():
+            md5 = self.create_file(self.registry.path(fid), "1K", 128, 'a+', pattern=self.pattern)
+            self.registry.set_size(fid, self.registry.size[fid] + 1024)
+            if self.verify_mode != 'pattern' or self.registry.md5(fid) is not None:
+                self.registry.set_md5(fid, md5)
         return True
 
     @enter_phase()
     def test_rename_files(self):
         """Rename files"""
         logger.info("Rename files with suffix: _new")
-        renamed_files = []
-        renamed_md5csum = {}
-        for file_path in self.Files:
-            new_file_path = self.rename_file(file_path, suffix="_new")
-            renamed_md5csum[new_file_path] = self.Md5Csum[file_path]
-            renamed_files.append(new_file_path)
-        self.Files = renamed_files
-        self.Md5Csum = renamed_md5csum
+        for fid in self.registry.fids():
+            self.registry.rename(fid, self.rename_file(self.registry.path(fid), suffix="_new"))
         return True
 
     @enter_phase()
     def test_delete_files(self):
         """Delete some of files(The latest 5 files)"""
-        for file_path in self.Files[-5:]:
-            self.delete_files(file_path)
+        for fid in list(itertools.islice(self.registry.fids(reverse=True), 5)):
+            self.delete_files(self.registry.path(fid))
+            self.registry.delete(fid)
         return True
 
     @enter_phase()
     def test_rename_dirs(self):
         """Rename dirs, sub dirs, nested dirs"""
-        self.NestedDirs = self.rename_dirs(self.NestedDirs, suffix="_new")
-        self.SubDirs = self.rename_dirs(self.SubDirs, suffix="_new")
-        self.Dirs = self.rename_dirs(self.Dirs, suffix="_new")
+        for attr in ('NestedDirs', 'SubDirs', 'Dirs'):
+            dir_paths = getattr(self, attr)
+            new_dir_paths = self.rename_dirs(dir_paths, suffix="_new")
+            for dir_path, new_dir_path in zip(dir_paths, new_dir_paths):
+                self.registry.rename_dir(dir_path, new_dir_path)
+            setattr(self, attr, new_dir_paths)
         return True
 
     @enter_phase()
@@ -531,6 +753,7 @@ class LocalFileOps(FileOps):
         """Delete some of dirs(rmtree the latest 3 dirs)"""
         for dir_path in self.Dirs[-3:]:
             self.remove_dir(dir_path)
+            self.registry.remove_dir(dir_path)
         return True
 
     def run(self, test_path, dirs_num=10, nested_level=10, files_num=100, file_size='1K'):
@@ -555,13 +778,13 @@ class LocalFileOps(FileOps):
             self.test_list_dirs()
 
             # Modify files
-            self.test_check_files_md5()
+            self.check_files()
             self.test_modify_files()
 
             # Rename files
-            self.test_check_files_md5()
+            self.check_files()
             self.test_rename_files()
-            self.test_check_files_md5()
+            self.check_files()
 
             # Delete some of files
             self.test_delete_files()
@@ -589,7 +812,9 @@ class LocalFileOps(FileOps):
     def stress(self):
         self.verify()
         test_path = os.path.join(self.top_path, "LocalFileOps")
-        return self.run(test_path, 10, 10, 100, "4k")
+        self.run(test_path, 10, 10, 100, "4k")
+        self.test_create_tree(os.path.join(test_path, "tree"), "10x10x10")
+        return self.test_delete_tree(os.path.join(test_path, "tree"))
 
 
 class GlobalMetaFileOps(FileOps):
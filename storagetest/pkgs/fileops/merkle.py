@@ -0,0 +1,271 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : merkle.py
+@Time  : 2020/11/26 10:21
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import stat
+import unittest
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from prettytable import PrettyTable
+
+from storagetest.libs.log import log
+from storagetest.pkgs.fileops.checksum import Checksum, new_hasher
+from storagetest.pkgs.fileops.tree_walk import TreeWalker
+
+"""
+Merkle tree directory comparison
+=================================
+Every directory gets a hash over its sorted entries:
+    file:    ('f', name, size, content digest)
+    symlink: ('l', name, link target)
+    special: ('s', name, type, rdev), fifo/socket/device, never opened
+    dir:     ('d', name, sub dir hash)
+Two trees are compared from the root down, only the sub dirs whose hash
+differ are descended, so the identical subtrees cost one hash compare.
+Content digests are computed in one batch across a process pool and can be
+cached in a ChecksumIndex, a rerun only rereads the changed files.
+"""
+
+logger = log.get_logger()
+
+# files: {name: (size, digest) | (None, link target) | (special type, rdev)}, dirs: [name]
+DirNode = namedtuple('DirNode', ['digest', 'files', 'dirs'])
+TreeDiff = namedtuple('TreeDiff', ['missing', 'extra', 'differing'])  # relative path lists
+
+
+class MerkleTree(object):
+    """Per-directory Merkle hashes of a directory tree"""
+
+    def __init__(self, root, algo='sha1', workers=None, index=None, scan_workers=8):
+        """
+        :param root: top path of the tree
+        :param algo: content checksum algorithm, see checksum.algorithms_available()
+        :param workers: hash processes, None: os.cpu_count()
+        :param index: ChecksumIndex, cache the content digests
+        :param scan_workers: threads to walk the tree
+        """
+        self.root = os.path.abspath(root)
+        self.algo = algo
+        self.workers = workers
+        self.index = index
+        self.scan_workers = scan_workers
+        self.nodes = {}  # {relative dir path('' is root): DirNode}
+        self.file_count = 0
+        self.total_bytes = 0
+
+    @property
+    def digest(self):
+        return self.nodes[''].digest if '' in self.nodes else None
+
+    @staticmethod
+    def special_type(st):
+        """(type, rdev) of a non regular file stat"""
+        if stat.S_ISCHR(st.st_mode) or stat.S_ISBLK(st.st_mode):
+            kind = 'chr' if stat.S_ISCHR(st.st_mode) else 'blk'
+            return kind, '{0}:{1}'.format(os.major(st.st_rdev), os.minor(st.st_rdev))
+        if stat.S_ISFIFO(st.st_mode):
+            return 'fifo', ''
+        if stat.S_ISSOCK(st.st_mode):
+            return 'sock', ''
+        return 'unknown', '{0:o}'.format(stat.S_IFMT(st.st_mode))
+
+    def _scan(self):
+        """walk the tree, return {rel_dir: (files{name: size}, links{name: target}, specials{name: (type, rdev)},
+        dirs[name])}"""
+        entries = {}
+
+        def on_dir(dir_path, depth, dir_entries):
+            files, links, specials, dirs = {}, {}, {}, []
+            for entry in dir_entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.is_symlink():
+                    links[entry.name] = os.readlink(entry.path)
+                else:
+                    st = entry.stat(follow_symlinks=False)
+                    if stat.S_ISREG(st.st_mode):
+                        files[entry.name] = st.st_size
+                    else:  # fifo/socket/device: a read blocks or hits the device
+                        specials[entry.name] = self.special_type(st)
+            rel_dir = os.path.relpath(dir_path, self.root) if depth else ''
+            entries[rel_dir] = (files, links, specials, sorted(dirs))
+
+        walker = TreeWalker(self.scan_workers, callback=on_dir).walk(self.root)
+        if walker.errors:
+            raise Exception("Scan {0} failed: {1}".format(*walker.errors[0]))
+        return entries
+
+    def build(self):
+        """build the hash of every directory, return the root digest"""
+        if not os.path.isdir(self.root):
+            raise Exception("No such dir: {0}".format(self.root))
+        entries = self._scan()
+        file_paths = [os.path.join(self.root, rel_dir, name)
+                      for rel_dir, (files, _, _, _) in entries.items() for name in files]
+        csum = Checksum(self.algo, workers=self.workers, index=self.index).hash_files(file_paths)
+
+        self.nodes = {}
+        self.file_count = len(file_paths)
+        self.total_bytes = 0
+        # children before parents: the deeper path sorted first
+        for rel_dir in sorted(entries, key=lambda x: x.count(os.sep) + (1 if x else 0), reverse=True):
+            files, links, specials, dirs = entries[rel_dir]
+            hasher = new_hasher(self.algo)
+            node_files = {}
+            for name in sorted(files):
+                digest = csum[os.path.join(self.root, rel_dir, name)]
+                node_files[name] = (files[name], digest)
+                self.total_bytes += files[name]
+                hasher.update('f\0{0}\0{1}\0{2}\n'.format(
+                    name, files[name], digest).encode('utf-8', 'surrogateescape'))
+            for name in sorted(links):
+                node_files[name] = (None, links[name])
+                hasher.update('l\0{0}\0{1}\n'.format(name, links[name]).encode('utf-8', 'surrogateescape'))
+            for name in sorted(specials):
+                node_files[name] = specials[name]
+                hasher.update('s\0{0}\0{1}\0{2}\n'.format(name, *specials[name]).encode('utf-8', 'surrogateescape'))
+            for name in dirs:
+                sub_digest = self.nodes[os.path.join(rel_dir, name)].digest
+                hasher.update('d\0{0}\0{1}\n'.format(name, sub_digest).encode('utf-8', 'surrogateescape'))
+            self.nodes[rel_dir] = DirNode(hasher.hexdigest(), node_files, dirs)
+        return self.digest
+
+    def _subtree(self, rel_dir):
+        """all the entries(relative path) under rel_dir, rel_dir included"""
+        paths = [rel_dir]
+        node = self.nodes[rel_dir]
+        paths.extend(os.path.join(rel_dir, name) for name in sorted(node.files))
+        for name in node.dirs:
+            paths.extend(self._subtree(os.path.join(rel_dir, name)))
+        return paths
+
+    def diff(self, other):
+        """
+        compare with other tree(self is the reference)
+        :param other: MerkleTree, built
+        :return: TreeDiff, missing: not in other; extra: only in other; differing: content/type changed
+        """
+        missing, extra, differing = [], [], []
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            node, other_node = self.nodes[rel_dir], other.nodes[rel_dir]
+            if node.digest == other_node.digest:
+                continue
+            for name in sorted(set(node.files) | set(other_node.files)):
+                path = os.path.join(rel_dir, name)
+                if name not in other_node.files:
+                    if name not in other_node.dirs:
+                        missing.append(path)
+                elif name not in node.files:
+                    if name not in node.dirs:
+                        extra.append(path)
+                elif node.files[name] != other_node.files[name]:
+                    differing.append(path)
+            for name in sorted(set(node.dirs) | set(other_node.dirs)):
+                path = os.path.join(rel_dir, name)
+                if name not in other_node.dirs:
+                    if name in other_node.files:
+                        differing.append(path)
+                        missing.extend(self._subtree(path)[1:])
+                    else:
+                        missing.extend(self._subtree(path))
+                elif name not in node.dirs:
+                    if name in node.files:
+                        differing.append(path)
+                        extra.extend(other._subtree(path)[1:])
+                    else:
+                        extra.extend(other._subtree(path))
+                else:
+                    stack.append(path)
+        return TreeDiff(sorted(missing), sorted(extra), sorted(differing))
+
+
+def compare_trees(path_1, path_2, algo='sha1', workers=None, index=None):
+    """
+    build the 2 trees concurrently and diff them
+    :param path_1: reference tree
+    :param path_2: tree under test
+    :param algo:
+    :param workers: hash processes per tree
+    :param index: ChecksumIndex
+    :return: TreeDiff
+    """
+    trees = [MerkleTree(path, algo, workers, index) for path in (path_1, path_2)]
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        list(pool.map(lambda t: t.build(), trees))
+    for tree in trees:
+        logger.info("{0}: {1} dir(s), {2} file(s), {3} bytes, root {4}: {5}".format(
+            tree.root, len(tree.nodes), tree.file_count, tree.total_bytes, algo, tree.digest))
+    return trees[0].diff(trees[1])
+
+
+def diff_table(tree_diff, max_rows=100):
+    """return a PrettyTable of the TreeDiff"""
+    table = PrettyTable(['Status', 'Path'])
+    table.align['Path'] = 'l'
+    rows = [('missing', p) for p in tree_diff.missing] + [('extra', p) for p in tree_diff.extra] + \
+           [('differing', p) for p in tree_diff.differing]
+    for row in rows[:max_rows]:
+        table.add_row(row)
+    if len(rows) > max_rows:
+        table.add_row(['...', '{0} more'.format(len(rows) - max_rows)])
+    return table
+
+
+class UnitTestCase(unittest.TestCase):
+    """merkle tree test case"""
+
+    def test_diff(self):
+        import shutil
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        path_1 = os.path.join(tmp_dir, 'a')
+        for rel_dir in ('d1/d11', 'd2', 'd3'):
+            os.makedirs(os.path.join(path_1, rel_dir))
+        for rel_path in ('f1', 'd1/f2', 'd1/d11/f3', 'd2/f4'):
+            with open(os.path.join(path_1, rel_path), 'w') as f:
+                f.write(rel_path)
+        path_2 = os.path.join(tmp_dir, 'b')
+        shutil.copytree(path_1, path_2, symlinks=True)
+        diff = compare_trees(path_1, path_2, workers=1)
+        self.assertEqual(diff, TreeDiff([], [], []))
+
+        with open(os.path.join(path_2, 'd1/d11/f3'), 'w') as f:
+            f.write('changed')
+        os.remove(os.path.join(path_2, 'd2/f4'))
+        shutil.rmtree(os.path.join(path_2, 'd3'))
+        with open(os.path.join(path_2, 'd3'), 'w') as f:
+            f.write('d3 is a file now')
+        with open(os.path.join(path_2, 'f5'), 'w') as f:
+            f.write('extra')
+        diff = compare_trees(path_1, path_2, workers=2)
+        self.assertEqual(diff.missing, ['d2/f4'])
+        self.assertEqual(diff.extra, ['f5'])
+        self.assertEqual(diff.differing, ['d1/d11/f3', 'd3'])
+
+    def test_special_files(self):
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        for name in ('a', 'b'):
+            os.makedirs(os.path.join(tmp_dir, name))
+            os.mkfifo(os.path.join(tmp_dir, name, 'fifo'))  # a read would block forever
+        self.assertEqual(compare_trees(os.path.join(tmp_dir, 'a'), os.path.join(tmp_dir, 'b'), workers=1),
+                         TreeDiff([], [], []))
+        os.remove(os.path.join(tmp_dir, 'b', 'fifo'))
+        with open(os.path.join(tmp_dir, 'b', 'fifo'), 'w') as f:
+            f.write('a file now')
+        diff = compare_trees(os.path.join(tmp_dir, 'a'), os.path.join(tmp_dir, 'b'), workers=1)
+        self.assertEqual(diff.differing, ['fifo'])
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,331 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : pattern.py
+@Time  : 2020/11/23 10:12
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import struct
+import random
+import hashlib
+import unittest
+from collections import namedtuple
+
+"""
+Block pattern data generator
+=============================
+The content of every block is a pure function of (seed, file_id, offset):
+    | stamp(32 bytes): magic, block_size, seed, file_id, block offset | payload |
+The payload is a slice of a per-seed random pool, so a block is built by
+memory copies only, no per-byte python work.
+"""
+
+PATTERN_MAGIC = b'STPB'
+STAMP = struct.Struct('<4sIQQQ')  # magic, block_size, seed, file_id, offset
+STAMP_SIZE = STAMP.size
+_U64 = 0xFFFFFFFFFFFFFFFF
+
+Stamp = namedtuple('Stamp', ['block_size', 'seed', 'file_id', 'offset'])
+BadBlock = namedtuple('BadBlock', ['offset', 'reason'])
+
+
+def parse_stamp(data):
+    """parse the stamp in the head of a pattern block, return Stamp or None"""
+    if len(data) < STAMP_SIZE:
+        return None
+    magic, block_size, seed, file_id, offset = STAMP.unpack_from(data, 0)
+    if magic != PATTERN_MAGIC:
+        return None
+    return Stamp(block_size, seed, file_id, offset)
+
+
+class BlockPattern(object):
+    """Deterministic, seeded block-pattern data generator"""
+
+    _pools = {}  # {(seed, pool_size + block_size): bytes}
+
+    def __init__(self, seed=0, block_size=4096, pool_size=1024*1024, chunk_size=1024*1024):
+        if block_size <= STAMP_SIZE:
+            raise Exception("block_size must be larger than {0}".format(STAMP_SIZE))
+        self.seed = seed & _U64
+        self.block_size = block_size
+        self.pool_size = pool_size
+        self.chunk_size = max(chunk_size // block_size, 1) * block_size
+        self.pool = memoryview(self._get_pool(self.seed, pool_size + block_size))
+
+    @classmethod
+    def _get_pool(cls, seed, size):
+        key = (seed, size)
+        if key not in cls._pools:
+            shake = hashlib.shake_256(PATTERN_MAGIC + seed.to_bytes(8, 'little'))
+            cls._pools[key] = shake.digest(size)
+        return cls._pools[key]
+
+    @staticmethod
+    def file_id(file_path):
+        """return a stable 64-bit file id for the file path"""
+        digest = hashlib.blake2b(os.fsencode(file_path), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    def _payload_start(self, file_id, block_idx):
+        mix = (file_id * 0x9E3779B97F4A7C15 + block_idx * 0xC2B2AE3D27D4EB4F) & _U64
+        return (mix ^ (mix >> 29)) % self.pool_size
+
+    def _put_block(self, buf, pos, file_id, block_idx):
+        """write the full block No.block_idx into buf[pos:pos+block_size]"""
+        bs = self.block_size
+        STAMP.pack_into(buf, pos, PATTERN_MAGIC, bs, self.seed, file_id, block_idx * bs)
+        start = self._payload_start(file_id, block_idx)
+        buf[pos+STAMP_SIZE:pos+bs] = self.pool[start:start+bs-STAMP_SIZE]
+
+    def block(self, file_id, block_idx):
+        """return the full content of block No.block_idx"""
+        buf = bytearray(self.block_size)
+        self._put_block(buf, 0, file_id & _U64, block_idx)
+        return bytes(buf)
+
+    def fill(self, buf, file_id, offset=0):
+        """
+        fill buf with the pattern content of file_id starting at offset
+        :param buf: writable buffer (bytearray / memoryview)
+        :param file_id:
+        :param offset: byte offset in the file, need not to be block aligned
+        :return: buf
+        """
+        file_id &= _U64
+        bs = self.block_size
+        view = memoryview(buf)
+        length = len(view)
+        pos = 0
+        block_idx, inner = divmod(offset, bs)
+        if inner:
+            n = min(bs - inner, length)
+            view[:n] = self.block(file_id, block_idx)[inner:inner+n]
+            pos = n
+            block_idx += 1
+        while pos + bs <= length:
+            self._put_block(view, pos, file_id, block_idx)
+            pos += bs
+            block_idx += 1
+        if pos < length:
+            view[pos:] = self.block(file_id, block_idx)[:length-pos]
+        return buf
+
+    def read(self, file_id, offset, length):
+        """return the expected bytes of file_id in range [offset, offset+length)"""
+        return bytes(self.fill(bytearray(length), file_id, offset))
+
+    def iter_chunks(self, file_id, size, offset=0):
+        """
+        yield the pattern content chunk by chunk, the chunk buffer is reused,
+        consume (write/hash) it before take the next one.
+        each call has its own buffer, so it is safe to use from threads
+        """
+        chunk = memoryview(bytearray(max(min(self.chunk_size, size), 0)))
+        end = offset + size
+        while offset < end:
+            n = min(self.chunk_size, end - offset)
+            yield self.fill(chunk[:n], file_id, offset)
+            offset += n
+
+    def write(self, f, file_id, size, offset=0):
+        """write size bytes of pattern content into a binary file object"""
+        for chunk in self.iter_chunks(file_id, size, offset):
+            f.write(chunk)
+        return size
+
+    def diagnose(self, file_id, offset, data):
+        """
+        compare data(read from file_id at offset) with the expected content block by block
+        :return: BadBlock list, the reason tells zeroed / misdirected / misplaced / corrupt
+        """
+        bad_blocks = []
+        bs = self.block_size
+        pos = 0
+        while pos < len(data):
+            blk_offset = offset + pos
+            n = min(bs - blk_offset % bs, len(data) - pos)
+            actual = bytes(data[pos:pos+n])
+            if actual != self.read(file_id, blk_offset, n):
+                bad_blocks.append(BadBlock(blk_offset, self._bad_reason(file_id, blk_offset, actual)))
+            pos += n
+        return bad_blocks
+
+    def _bad_reason(self, file_id, blk_offset, actual):
+        if not actual.strip(b'\x00'):
+            return 'zeroed'
+        stamp = parse_stamp(actual) if blk_offset % self.block_size == 0 else None
+        if stamp is None:
+            return 'corrupt'
+        if stamp.seed != self.seed or stamp.file_id != (file_id & _U64):
+            return 'misdirected(seed={0}, file_id={1}, offset={2})'.format(stamp.seed, stamp.file_id, stamp.offset)
+        if stamp.offset != blk_offset:
+            return 'misplaced(offset={0})'.format(stamp.offset)
+        return 'corrupt payload'
+
+
+class PatternVerifier(object):
+    """
+    Stateless regenerate-and-compare verifier for BlockPattern files.
+    The seed/block_size/file_id are parsed from the stamp of block 0, so a
+    file can be verified (fully, by range or by random blocks) from any
+    process or node without stored digests.
+    """
+
+    def __init__(self, chunk_size=1024*1024):
+        self.chunk_size = chunk_size
+        self._patterns = {}
+
+    def _get_pattern(self, seed, block_size):
+        key = (seed, block_size)
+        if key not in self._patterns:
+            self._patterns[key] = BlockPattern(seed, block_size, chunk_size=self.chunk_size)
+        return self._patterns[key]
+
+    def file_header(self, file_path):
+        """return the Stamp of block 0, None if it is not a pattern file"""
+        with open(file_path, 'rb') as f:
+            return parse_stamp(f.read(STAMP_SIZE))
+
+    def verify_range(self, f, pattern, file_id, offset, length):
+        """verify [offset, offset+length) of the opened file, return BadBlock list"""
+        chunk_size = pattern.chunk_size
+        buf = bytearray(chunk_size)
+        expected = bytearray(chunk_size)
+        bad_blocks = []
+        f.seek(offset)
+        end = offset + length
+        while offset < end:
+            n = f.readinto(buf) if end - offset >= chunk_size else f.readinto(memoryview(buf)[:end-offset])
+            if n == 0:
+                bad_blocks.append(BadBlock(offset, 'short read(eof), missing {0} bytes'.format(end - offset)))
+                break
+            pattern.fill(memoryview(expected)[:n], file_id, offset)
+            if (buf != expected) if n == chunk_size else (buf[:n] != expected[:n]):
+                bad_blocks.extend(pattern.diagnose(file_id, offset, memoryview(buf)[:n]))
+            offset += n
+        return bad_blocks
+
+    def verify_file(self, file_path, offset=0, length=None, samples=0, expected_size=None, header=None):
+        """
+        verify a pattern file by regenerating the expected content
+        :param file_path:
+        :param offset: verify start offset
+        :param length: verify length, None: to the end of file
+        :param samples: >0: verify N random blocks instead of the range
+        :param expected_size: check the file size if given
+        :param header: Stamp, required when the file is too small to carry one
+        :return: BadBlock list, empty if all matched
+        """
+        header = header or self.file_header(file_path)
+        if header is None:
+            return [BadBlock(0, 'no pattern stamp')]
+        pattern = self._get_pattern(header.seed, header.block_size)
+        bs = header.block_size
+        bad_blocks = []
+        with open(file_path, 'rb') as f:
+            f_size = os.fstat(f.fileno()).st_size
+            if expected_size is not None and f_size != expected_size:
+                bad_blocks.append(BadBlock(f_size, 'size {0} != expected {1}'.format(f_size, expected_size)))
+            if samples > 0:
+                blocks = (f_size + bs - 1) // bs
+                for idx in random.sample(range(blocks), min(samples, blocks)):
+                    blk_offset = idx * bs
+                    bad_blocks.extend(self.verify_range(
+                        f, pattern, header.file_id, blk_offset, min(bs, f_size - blk_offset)))
+                return bad_blocks
+            if length is None:
+                length = max(f_size - offset, 0)
+            bad_blocks.extend(self.verify_range(f, pattern, header.file_id, offset, length))
+        return bad_blocks
+
+    def verify_tree(self, top_path, samples=0, resume_after=None):
+        """
+        verify all the pattern files under top_path in sorted path order(see sorted_walk)
+        :param top_path:
+        :param samples: >0: verify N random blocks per file
+        :param resume_after: skip files(full path) sorted <= it, to resume a broken run
+        :return: dict {file_path: BadBlock list} of mismatched files
+        """
+        bad_files = {}
+        for file_path in sorted_walk(top_path):
+            if resume_after and file_path <= resume_after:
+                continue
+            if self.file_header(file_path) is None:
+                continue
+            bad_blocks = self.verify_file(file_path, samples=samples)
+            if bad_blocks:
+                bad_files[file_path] = bad_blocks
+        return bad_files
+
+
+def sorted_walk(top_path):
+    """
+    yield the file paths under top_path in the string order of the full paths, so a run can be resumed
+    by a path compare: the entries of a dir sorted by name, a dir as name + '/'(all its files sort there)
+    """
+    entries = []
+    for entry in os.scandir(top_path):
+        is_dir = entry.is_dir(follow_symlinks=False)
+        entries.append((entry.name + '/' if is_dir else entry.name, entry.path, is_dir))
+    for _, path, is_dir in sorted(entries):
+        if is_dir:
+            for file_path in sorted_walk(path):
+                yield file_path
+        else:
+            yield path
+
+
+class UnitTestCase(unittest.TestCase):
+    """block pattern test case"""
+
+    def test_deterministic(self):
+        p1 = BlockPattern(seed=1)
+        p2 = BlockPattern(seed=1)
+        self.assertEqual(p1.read(7, 100, 10000), p2.read(7, 100, 10000))
+        self.assertNotEqual(p1.read(7, 0, 4096), p1.read(8, 0, 4096))
+        self.assertNotEqual(p1.read(7, 0, 4096), BlockPattern(seed=2).read(7, 0, 4096))
+
+    def test_unaligned_fill(self):
+        p = BlockPattern(seed=3, block_size=512, chunk_size=4096)
+        full = p.read(1, 0, 20000)
+        self.assertEqual(p.read(1, 777, 5000), full[777:5777])
+        self.assertEqual(b''.join(bytes(c) for c in p.iter_chunks(1, 9999, 3)), full[3:10002])
+
+    def test_verify_file(self):
+        import tempfile
+        p = BlockPattern(seed=4, block_size=512, chunk_size=2048)
+        file_path = os.path.join(tempfile.mkdtemp(), 'pattern.dat')
+        with open(file_path, 'wb') as f:
+            p.write(f, 11, 10000)
+        verifier = PatternVerifier(chunk_size=2048)
+        self.assertEqual(verifier.verify_file(file_path), [])
+        self.assertEqual(verifier.verify_file(file_path, samples=5), [])
+        with open(file_path, 'r+b') as f:
+            f.seek(1024)
+            f.write(b'\x00' * 512)
+            f.write(p.block(11, 0))
+        bad_blocks = verifier.verify_file(file_path, expected_size=10000)
+        self.assertEqual([b.offset for b in bad_blocks], [1024, 1536])
+        self.assertEqual(bad_blocks[0].reason, 'zeroed')
+        self.assertEqual(bad_blocks[1].reason, 'misplaced(offset=0)')
+
+    def test_sorted_walk(self):
+        import tempfile
+        top_path = tempfile.mkdtemp()
+        for rel_path in ('z.dat', 'a/x.dat', 'a-b.dat', 'a0.dat', 'a/b/y.dat', 'a.dat'):
+            file_path = os.path.join(top_path, rel_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            open(file_path, 'w').close()
+        paths = list(sorted_walk(top_path))
+        self.assertEqual(paths, sorted(paths))
+        self.assertEqual(len(paths), 6)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,289 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : registry.py
+@Time  : 2020/11/27 9:48
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import json
+import mmap
+import unittest
+from array import array
+
+"""
+Compact file registry
+======================
+Keep the state of millions of test files without a python string per file:
+    dir table:  interned dir paths(with all their parent dirs), dir_id -> path
+                (None: removed), and a child index dir_id -> sub dir ids
+    name table: interned file names, name_id -> name
+    columns:    dir_id(uint32), name_id(uint32), size(uint64), digest(16 bytes), flags(uint8)
+A file is addressed by its row number(fid). Rename/delete a file, rename/remove
+a dir only touch the changed rows/dirs(the dir subtree by the child index). The columns are saved as raw binary files
+and can be loaded by mmap.
+"""
+
+DIGEST_SIZE = 16  # md5
+FLAG_DELETED = 0x01
+FLAG_DIGEST = 0x02  # digest column is valid
+
+_COLUMNS = (('dir_id', 'I'), ('name_id', 'I'), ('size', 'Q'), ('flags', 'B'))
+
+
+class FileRegistry(object):
+    """Array-backed registry of the test files: (dir id, name index, size, 16-byte digest)"""
+
+    def __init__(self):
+        self.dirs = []  # dir_id -> dir path, None if removed
+        self._dir_ids = {}
+        self._children = {}  # dir_id -> set of the sub dir ids
+        self.names = []  # name_id -> file name
+        self._name_ids = {}
+        self.dir_id = array('I')
+        self.name_id = array('I')
+        self.size = array('Q')
+        self.flags = array('B')
+        self.digest = bytearray()
+        self.deleted = 0
+        self._mmaps = []
+
+    def __len__(self):
+        """rows number, the deleted files included"""
+        return len(self.flags)
+
+    # ==== interning ====
+    def intern_dir(self, dir_path):
+        dir_id = self._dir_ids.get(dir_path)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(dir_path)
+            self._dir_ids[dir_path] = dir_id
+            self._link(dir_id)
+        return dir_id
+
+    def _link(self, dir_id):
+        """add the dir to the child index of its parent dir(interned if not yet)"""
+        dir_path = self.dirs[dir_id]
+        parent = os.path.dirname(dir_path)
+        if parent and parent != dir_path:
+            self._children.setdefault(self.intern_dir(parent), set()).add(dir_id)
+
+    def _unlink(self, dir_id):
+        parent_id = self._dir_ids.get(os.path.dirname(self.dirs[dir_id]))
+        if parent_id is not None and parent_id != dir_id:
+            self._children.get(parent_id, set()).discard(dir_id)
+
+    def _subtree(self, dir_id):
+        """the dir id and all the sub dir ids under it"""
+        dir_ids = [dir_id]
+        for sub_id in dir_ids:  # grows while iterating, breadth first
+            dir_ids.extend(self._children.get(sub_id, ()))
+        return dir_ids
+
+    def intern_name(self, name):
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self._name_ids[name] = name_id
+        return name_id
+
+    # ==== files ====
+    def _writable(self):
+        """convert the mmap loaded columns to arrays before grow"""
+        if self._mmaps:
+            self.dir_id, self.name_id, self.size, self.flags = [
+                array(typecode, column) for (_, typecode), column in
+                zip(_COLUMNS, (self.dir_id, self.name_id, self.size, self.flags))]
+            self.digest = bytearray(self.digest)
+            self._mmaps = []
+
+    def add(self, file_path, size, md5=None):
+        """
+        add a file
+        :param file_path:
+        :param size: bytes
+        :param md5: hexdigest, None: no digest kept(eg: pattern file)
+        :return: fid
+        """
+        self._writable()
+        dir_path, name = os.path.split(file_path)
+        fid = len(self.flags)
+        self.dir_id.append(self.intern_dir(dir_path))
+        self.name_id.append(self.intern_name(name))
+        self.size.append(size)
+        self.flags.append(0)
+        self.digest.extend(bytes(DIGEST_SIZE))
+        if md5 is not None:
+            self.set_md5(fid, md5)
+        return fid
+
+    def path(self, fid):
+        dir_path = self.dirs[self.dir_id[fid]]
+        return None if dir_path is None else os.path.join(dir_path, self.names[self.name_id[fid]])
+
+    def is_live(self, fid):
+        return not self.flags[fid] & FLAG_DELETED and self.dirs[self.dir_id[fid]] is not None
+
+    def fids(self, reverse=False):
+        """the live fids"""
+        rows = range(len(self.flags) - 1, -1, -1) if reverse else range(len(self.flags))
+        return (fid for fid in rows if self.is_live(fid))
+
+    def md5(self, fid):
+        if not self.flags[fid] & FLAG_DIGEST:
+            return None
+        return bytes(self.digest[fid*DIGEST_SIZE:(fid+1)*DIGEST_SIZE]).hex()
+
+    def set_md5(self, fid, md5):
+        self.digest[fid*DIGEST_SIZE:(fid+1)*DIGEST_SIZE] = bytes.fromhex(md5)
+        self.flags[fid] |= FLAG_DIGEST
+
+    def set_size(self, fid, size):
+        self.size[fid] = size
+
+    def rename(self, fid, new_file_path):
+        """the file renamed(same or another dir)"""
+        dir_path, name = os.path.split(new_file_path)
+        self.dir_id[fid] = self.intern_dir(dir_path)
+        self.name_id[fid] = self.intern_name(name)
+
+    def delete(self, fid):
+        if not self.flags[fid] & FLAG_DELETED:
+            self.flags[fid] |= FLAG_DELETED
+            self.deleted += 1
+
+    # ==== dirs ====
+    def rename_dir(self, dir_path, new_dir_path):
+        """the dir renamed, update it and all the dirs under it"""
+        dir_id = self._dir_ids.get(dir_path)
+        if dir_id is None:  # no file under it
+            return
+        if new_dir_path in self._dir_ids:
+            # the files of both would be under one path, two dir ids
+            raise Exception("Rename dir {0} -> {1}: {1} already registered".format(dir_path, new_dir_path))
+        self._unlink(dir_id)
+        for sub_id in self._subtree(dir_id):
+            path = self.dirs[sub_id]
+            new_path = new_dir_path + path[len(dir_path):]
+            del self._dir_ids[path]
+            self.dirs[sub_id] = new_path
+            self._dir_ids[new_path] = sub_id
+        self._link(dir_id)
+
+    def remove_dir(self, dir_path):
+        """the dir tree removed, the files under it are gone"""
+        dir_id = self._dir_ids.get(dir_path)
+        if dir_id is None:
+            return
+        self._unlink(dir_id)
+        for sub_id in self._subtree(dir_id):
+            del self._dir_ids[self.dirs[sub_id]]
+            self.dirs[sub_id] = None
+            self._children.pop(sub_id, None)
+
+    # ==== persist ====
+    def save(self, path):
+        """save to dir: meta.json and one raw binary file per column"""
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'dirs': self.dirs, 'names': self.names, 'count': len(self.flags),
+                       'deleted': self.deleted, 'digest_size': DIGEST_SIZE}, f)
+        for name, _ in _COLUMNS:
+            with open(os.path.join(path, name + '.bin'), 'wb') as f:
+                f.write(getattr(self, name))
+        with open(os.path.join(path, 'digest.bin'), 'wb') as f:
+            f.write(self.digest)
+
+    @classmethod
+    def load(cls, path, use_mmap=True):
+        """
+        load from the dir saved by save()
+        :param path:
+        :param use_mmap: map the columns copy-on-write instead of read into memory
+        :return:
+        """
+        registry = cls()
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta['digest_size'] != DIGEST_SIZE:
+            raise Exception("Not supported digest size: {0}".format(meta['digest_size']))
+        registry.dirs = meta['dirs']
+        registry._dir_ids = {p: i for i, p in enumerate(registry.dirs) if p is not None}
+        for dir_id in list(registry._dir_ids.values()):
+            registry._link(dir_id)
+        registry.names = meta['names']
+        registry._name_ids = {n: i for i, n in enumerate(registry.names)}
+        registry.deleted = meta['deleted']
+        for name, typecode in _COLUMNS + (('digest', 'B'),):
+            column_path = os.path.join(path, name + '.bin')
+            if use_mmap and meta['count'] > 0:
+                with open(column_path, 'rb') as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+                registry._mmaps.append(mm)
+                column = memoryview(mm).cast(typecode)
+            else:
+                column = array(typecode)
+                with open(column_path, 'rb') as f:
+                    column.frombytes(f.read())
+            if name == 'digest':
+                column = column if use_mmap and meta['count'] > 0 else bytearray(column)
+            setattr(registry, name, column)
+        return registry
+
+
+class UnitTestCase(unittest.TestCase):
+    """file registry test case"""
+
+    def test_registry(self):
+        import tempfile
+        registry = FileRegistry()
+        for x in range(3):
+            for y in range(4):
+                registry.add('/t/Dir_{0}/file_{1}.txt'.format(x, y), 1024, '{0:032x}'.format(x * 10 + y))
+        registry.add('/t/Dir_0/Nested_0/file_0.txt', 2048)
+        self.assertEqual(len(registry), 13)
+        self.assertEqual(len(registry.dirs), 6)  # + '/t', '/'
+        self.assertEqual(len(registry.names), 4)
+        registry.rename(1, '/t/Dir_0/file_1_new.txt')
+        registry.delete(2)
+        registry.rename_dir('/t/Dir_0', '/t/Dir_0_new')
+        registry.remove_dir('/t/Dir_2')
+        self.assertEqual(registry.path(1), '/t/Dir_0_new/file_1_new.txt')
+        self.assertEqual(registry.path(12), '/t/Dir_0_new/Nested_0/file_0.txt')
+        self.assertEqual(len(list(registry.fids())), 8)
+        self.assertIsNone(registry.md5(12))
+        self.assertEqual(registry.md5(5), '{0:032x}'.format(11))
+        self.assertRaises(Exception, registry.rename_dir, '/t/Dir_1', '/t/Dir_0_new/Nested_0')
+        self.assertEqual(registry.path(4), '/t/Dir_1/file_0.txt')
+        registry.rename_dir('/t/Dir_1', '/t/Dir_0_new/Dir_1')  # moved under another dir
+        registry.rename_dir('/t/Dir_0_new', '/t/Dir_0')
+        self.assertEqual(registry.path(4), '/t/Dir_0/Dir_1/file_0.txt')
+        self.assertEqual(registry.path(12), '/t/Dir_0/Nested_0/file_0.txt')
+        registry.remove_dir('/t/Dir_0/Dir_1')
+        self.assertEqual(len(list(registry.fids())), 4)
+        fid = registry.add('/t/Dir_0/Dir_1/file_0.txt', 1)  # the removed dir created again
+        self.assertEqual(registry.path(fid), '/t/Dir_0/Dir_1/file_0.txt')
+        self.assertFalse(registry.is_live(4))
+
+        tmp_dir = tempfile.mkdtemp()
+        registry.save(tmp_dir)
+        for use_mmap in (True, False):
+            loaded = FileRegistry.load(tmp_dir, use_mmap)
+            self.assertEqual([loaded.path(fid) for fid in loaded.fids()],
+                             [registry.path(fid) for fid in registry.fids()])
+            self.assertEqual(loaded.md5(5), registry.md5(5))
+            loaded.set_md5(5, '{0:032x}'.format(99))  # in place update
+            self.assertEqual(loaded.md5(5), '{0:032x}'.format(99))
+            fid = loaded.add('/t/Dir_1/file_9.txt', 1)  # grow
+            self.assertEqual(loaded.path(fid), '/t/Dir_1/file_9.txt')
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
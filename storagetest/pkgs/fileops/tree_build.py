@@ -0,0 +1,183 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : tree_build.py
+@Time  : 2020/11/30 14:32
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import time
+import queue
+import threading
+import unittest
+
+from storagetest.libs.log import log
+from storagetest.libs.latency import LatencyStats
+
+"""
+Concurrent directory tree builder
+==================================
+Shape spec: fan-out per level, eg: [10, 5, 2] or "10x5x2" creates
+10 dirs, 5 sub dirs in each, 2 sub dirs in each of those: 10 + 50 + 100 dirs.
+A worker takes one parent dir, opens it once and mkdir all its children by
+dir_fd, so the long parent path is resolved once per parent instead of per
+mkdir, and no isdir() lookup before mkdir.
+"""
+
+logger = log.get_logger()
+
+_DIR_FD = os.mkdir in os.supports_dir_fd and hasattr(os, 'O_DIRECTORY')
+
+
+def parse_shape(shape, depth=None):
+    """
+    return the fan-out list of a shape spec
+    :param shape: list/tuple of fan-out per level, "AxBxC" string or int fan-out
+    :param depth: levels for the int fan-out
+    :return:
+    """
+    if isinstance(shape, int):
+        return [shape] * (depth or 1)
+    if isinstance(shape, str):
+        shape = shape.lower().split('x')
+    fanout = [int(n) for n in shape]
+    if not fanout or any(n < 0 for n in fanout):
+        raise Exception("Invalid tree shape: {0}".format(shape))
+    return fanout
+
+
+class TreeBuilder(object):
+    """Create a directory tree by shape with a worker pool, report mkdir/s and latency"""
+
+    def __init__(self, workers=8, names="Dir_{idx}", exist_ok=True, keep_paths=True):
+        """
+        :param workers: threads
+        :param names: dir name format of each level, str(all levels) or list, fields: {idx}, {level}
+        :param exist_ok: an existing dir is not an error(not counted in mkdir stats)
+        :param keep_paths: return the created paths, False for huge trees
+        """
+        self.workers = max(workers, 1)
+        self.names = names
+        self.exist_ok = exist_ok
+        self.keep_paths = keep_paths
+        self.stats = LatencyStats('mkdir')
+        self.existed = 0
+        self._lock = threading.Lock()
+
+    def _name(self, level, idx):
+        fmt = self.names[level] if isinstance(self.names, (list, tuple)) else self.names
+        return fmt.format(idx=idx, level=level)
+
+    def _mkdir_children(self, parent_path, level, fanout):
+        """mkdir the children of parent_path, return the child names"""
+        names = [self._name(level, idx) for idx in range(fanout)]
+        latencies = []
+        existed = 0
+        dir_fd = os.open(parent_path, os.O_RDONLY | os.O_DIRECTORY) if _DIR_FD else None
+        try:
+            for name in names:
+                start = time.perf_counter()
+                try:
+                    if dir_fd is None:
+                        os.mkdir(os.path.join(parent_path, name))
+                    else:
+                        os.mkdir(name, dir_fd=dir_fd)
+                    latencies.append(time.perf_counter() - start)
+                except FileExistsError:
+                    if not self.exist_ok:
+                        raise
+                    existed += 1
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+        self.stats.extend(latencies)
+        if existed:
+            with self._lock:
+                self.existed += existed
+        return names
+
+    def build(self, top_path, shape, depth=None):
+        """
+        create the tree under top_path
+        :param top_path: created if not exist
+        :param shape: see parse_shape()
+        :param depth: see parse_shape()
+        :return: list of the created dir paths per level, [[level 0 paths], [level 1 paths], ...]
+        """
+        fanout = parse_shape(shape, depth)
+        os.makedirs(top_path, exist_ok=True)
+        self.stats = LatencyStats('mkdir')
+        self.existed = 0
+        levels = [[] for _ in fanout]
+        errors = []
+        tasks = queue.Queue()
+        tasks.put(((), top_path, 0))
+
+        def worker():
+            while True:
+                task = tasks.get()
+                if task is None:
+                    tasks.task_done()
+                    return
+                key, parent_path, level = task
+                try:
+                    if not errors:
+                        names = self._mkdir_children(parent_path, level, fanout[level])
+                        children = [(key + (idx,), os.path.join(parent_path, name)) for idx, name in enumerate(names)]
+                        if self.keep_paths:
+                            with self._lock:
+                                levels[level].extend(children)
+                        if level + 1 < len(fanout):
+                            for child_key, child_path in children:
+                                tasks.put((child_key, child_path, level + 1))
+                except Exception as e:
+                    logger.error("mkdir under {0}: {1}".format(parent_path, e))
+                    self.stats.add_error()
+                    errors.append(e)
+                finally:
+                    tasks.task_done()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        self.stats.start()
+        for t in threads:
+            t.start()
+        tasks.join()
+        self.stats.stop()
+        for _ in threads:
+            tasks.put(None)
+        for t in threads:
+            t.join()
+
+        logger.info("{0}: build tree {1}, {2} existed\n{3}".format(
+            top_path, 'x'.join(str(n) for n in fanout), self.existed, self.stats))
+        if errors:
+            raise Exception("Build tree {0} failed: {1}".format(top_path, errors[0]))
+        return [[path for _, path in sorted(level)] for level in levels]
+
+
+class UnitTestCase(unittest.TestCase):
+    """tree builder test case"""
+
+    def test_build(self):
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        self.assertEqual(parse_shape("3x2"), [3, 2])
+        self.assertEqual(parse_shape(2, 3), [2, 2, 2])
+        builder = TreeBuilder(workers=4, names=["Dir_{idx}", "Sub_{level}_{idx}"])
+        levels = builder.build(tmp_dir, "12x3")
+        self.assertEqual(len(levels[0]), 12)
+        self.assertEqual(levels[0][:3], [os.path.join(tmp_dir, 'Dir_{0}'.format(x)) for x in (0, 1, 2)])
+        self.assertEqual(levels[1][-1], os.path.join(tmp_dir, 'Dir_11', 'Sub_1_2'))
+        self.assertTrue(all(os.path.isdir(p) for p in levels[0] + levels[1]))
+        self.assertEqual(builder.stats.count, 48)
+        builder.build(tmp_dir, "12x3")
+        self.assertEqual((builder.stats.count, builder.existed), (0, 48))
+        self.assertRaises(Exception, TreeBuilder(exist_ok=False).build, tmp_dir, [1])
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,273 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : tree_delete.py
+@Time  : 2020/12/1 10:17
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import time
+import queue
+import threading
+import unittest
+
+from storagetest.libs.log import log
+from storagetest.libs.latency import LatencyStats, stats_table
+
+"""
+Parallel tree deletion engine
+==============================
+Workers take dirs from a queue, scandir them, unlink the non-dir entries
+(by dir_fd) and queue the sub dirs. A dir is rmdir-ed by the worker which
+finishes its last sub dir, so the deletion runs leaves-first without a
+second walk. Errors are collected and raised(not ignored), the ancestors of
+a failed entry are kept.
+Usable as a cleanup utility or as a "delete storm" benchmark phase.
+"""
+
+logger = log.get_logger()
+
+_DIR_FD = os.unlink in os.supports_dir_fd and hasattr(os, 'O_DIRECTORY')
+
+
+class TreeDeleter(object):
+    """Delete dir trees / files with a worker pool, report unlink/s, rmdir/s and latency"""
+
+    def __init__(self, workers=8, raise_errors=True):
+        """
+        :param workers: threads
+        :param raise_errors: raise an Exception if any entry failed to delete, else only return the errors
+        """
+        self.workers = max(workers, 1)
+        self.raise_errors = raise_errors
+        self.unlink_stats = LatencyStats('unlink')
+        self.rmdir_stats = LatencyStats('rmdir')
+        self.errors = []  # [(path, exception)]
+        self._lock = threading.Lock()
+        self._pending = {}  # {dir_path: [sub dirs not removed yet, parent path, failed]}
+
+    def _reset(self):
+        self.unlink_stats = LatencyStats('unlink')
+        self.rmdir_stats = LatencyStats('rmdir')
+        self.errors = []
+        self._pending = {}
+
+    def _error(self, path, e, stats):
+        logger.error("Delete {0} failed: {1}".format(path, e))
+        stats.add_error()
+        with self._lock:
+            self.errors.append((path, e))
+
+    def _unlink(self, names, dir_path, dir_fd=None):
+        """unlink the files, return True if all deleted"""
+        latencies = []
+        ok = True
+        for name in names:
+            start = time.perf_counter()
+            try:
+                if dir_fd is None:
+                    os.unlink(os.path.join(dir_path, name))
+                else:
+                    os.unlink(name, dir_fd=dir_fd)
+                latencies.append(time.perf_counter() - start)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self._error(os.path.join(dir_path, name), e, self.unlink_stats)
+                ok = False
+        self.unlink_stats.extend(latencies)
+        return ok
+
+    def _rmdir_up(self, dir_path):
+        """rmdir dir_path, then its parents whose sub dirs are all removed"""
+        while dir_path is not None:
+            with self._lock:
+                _, parent, failed = self._pending.pop(dir_path)
+            if not failed:
+                start = time.perf_counter()
+                try:
+                    os.rmdir(dir_path)
+                    self.rmdir_stats.add(time.perf_counter() - start)
+                except OSError as e:
+                    self._error(dir_path, e, self.rmdir_stats)
+                    failed = True
+            if parent is None:
+                return
+            with self._lock:
+                node = self._pending[parent]
+                node[0] -= 1
+                node[2] = node[2] or failed
+                if node[0] > 0:
+                    return
+            dir_path = parent
+
+    def _delete_dir(self, dir_path, tasks):
+        """unlink the files in dir_path, queue the sub dirs"""
+        sub_dirs = []
+        files = []
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        sub_dirs.append(entry.path)
+                    else:
+                        files.append(entry.name)
+        except OSError as e:
+            self._error(dir_path, e, self.rmdir_stats)
+            with self._lock:
+                self._pending[dir_path][2] = True
+            self._rmdir_up(dir_path)
+            return
+
+        dir_fd = os.open(dir_path, os.O_RDONLY | os.O_DIRECTORY) if _DIR_FD and files else None
+        try:
+            ok = self._unlink(files, dir_path, dir_fd)
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+        with self._lock:
+            node = self._pending[dir_path]
+            node[0] = len(sub_dirs)
+            node[2] = not ok
+            for sub_dir in sub_dirs:
+                self._pending[sub_dir] = [0, dir_path, False]
+        for sub_dir in sub_dirs:
+            tasks.put(sub_dir)
+        if not sub_dirs:
+            self._rmdir_up(dir_path)
+
+    def _run(self, tops):
+        """delete the dir trees in tops concurrently"""
+        tasks = queue.Queue()
+        for top in tops:
+            self._pending[top] = [0, None, False]
+            tasks.put(top)
+
+        def worker():
+            while True:
+                dir_path = tasks.get()
+                try:
+                    if dir_path is None:
+                        return
+                    self._delete_dir(dir_path, tasks)
+                except Exception as e:
+                    self._error(dir_path, e, self.rmdir_stats)
+                finally:
+                    tasks.task_done()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        tasks.join()
+        for _ in threads:
+            tasks.put(None)
+        for t in threads:
+            t.join()
+
+    def _finish(self, title):
+        self.unlink_stats.stop()
+        self.rmdir_stats.stop()
+        logger.info("{0}\n{1}".format(title, stats_table([self.unlink_stats, self.rmdir_stats])))
+        if self.errors and self.raise_errors:
+            raise Exception("{0}: {1} entries failed to delete, first: {2} {3}".format(
+                title, len(self.errors), self.errors[0][0], self.errors[0][1]))
+        return self.errors
+
+    def rmtree(self, *paths):
+        """
+        delete the dir trees(or files)
+        :param paths: dir/file paths, not exist path ignored
+        :return: errors list [(path, exception)]
+        """
+        self._reset()
+        self.unlink_stats.start()
+        self.rmdir_stats.start()
+        tops = []
+        files = []
+        for path in paths:
+            if os.path.isdir(path) and not os.path.islink(path):
+                tops.append(path)
+            elif os.path.lexists(path):
+                files.append(path)
+        if files:
+            self.unlink_files(files, _reset=False)
+        self._run(tops)
+        return self._finish("Delete tree: {0}".format(', '.join(paths)))
+
+    def unlink_files(self, file_paths, _reset=True):
+        """
+        delete a list of files concurrently
+        :param file_paths:
+        :return: errors list [(path, exception)]
+        """
+        if _reset:
+            self._reset()
+            self.unlink_stats.start()
+            self.rmdir_stats.start()
+        file_paths = list(file_paths)
+        n = self.workers
+        threads = [threading.Thread(target=self._unlink, args=(file_paths[x::n], '')) for x in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if _reset:
+            return self._finish("Delete {0} file(s)".format(len(file_paths)))
+        return self.errors
+
+    def unlink_prefix(self, dir_path, prefix):
+        """delete the files named prefix* in dir_path(not recursive)"""
+        with os.scandir(dir_path) as it:
+            file_paths = [entry.path for entry in it
+                          if entry.name.startswith(prefix) and not entry.is_dir(follow_symlinks=False)]
+        return self.unlink_files(file_paths)
+
+
+class UnitTestCase(unittest.TestCase):
+    """tree deleter test case"""
+
+    def test_rmtree(self):
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        for x in range(5):
+            for y in range(3):
+                dir_path = os.path.join(tmp_dir, 'top', 'd{0}'.format(x), 's{0}'.format(y))
+                os.makedirs(dir_path)
+                for z in range(4):
+                    open(os.path.join(dir_path, 'f{0}'.format(z)), 'w').close()
+        os.makedirs(os.path.join(tmp_dir, 'top', 'empty'))
+        os.symlink(tmp_dir, os.path.join(tmp_dir, 'top', 'link'))
+        deleter = TreeDeleter(workers=4)
+        self.assertEqual(deleter.rmtree(os.path.join(tmp_dir, 'top')), [])
+        self.assertFalse(os.path.exists(os.path.join(tmp_dir, 'top')))
+        self.assertEqual(deleter.unlink_stats.count, 61)
+        self.assertEqual(deleter.rmdir_stats.count, 22)
+
+        for x in range(6):
+            open(os.path.join(tmp_dir, ('dd_r_' if x % 2 else 'keep_') + str(x)), 'w').close()
+        deleter.unlink_prefix(tmp_dir, 'dd_r_')
+        self.assertEqual(sorted(os.listdir(tmp_dir)), ['keep_0', 'keep_2', 'keep_4'])
+
+    @unittest.skipIf(hasattr(os, 'geteuid') and os.geteuid() == 0, "root ignores the permission")
+    def test_errors(self):
+        import tempfile
+        tmp_dir = tempfile.mkdtemp()
+        dir_path = os.path.join(tmp_dir, 'top', 'ro')
+        os.makedirs(dir_path)
+        open(os.path.join(dir_path, 'f'), 'w').close()
+        os.chmod(dir_path, 0o500)
+        try:
+            self.assertRaises(Exception, TreeDeleter().rmtree, os.path.join(tmp_dir, 'top'))
+            errors = TreeDeleter(raise_errors=False).rmtree(os.path.join(tmp_dir, 'top'))
+            self.assertEqual(len(errors), 1)
+            self.assertTrue(os.path.isdir(dir_path))
+        finally:
+            os.chmod(dir_path, 0o700)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -8,7 +8,13 @@
 """
 
 from .fio_test import *
-__all__ = ['FIO']
+from .fio_result import *
+from .fio_job import *
+from .saturation import *
+from .steady_state import *
+__all__ = ['FIO', 'FioResult', 'JobResult', 'IOStats', 'Latency', 'parse_fio_json', 'load_fio_json', 'percentile',
+           'JobSpec', 'FioJobFile', 'job_matrix', 'batch_jobs', 'SaturationSearch', 'SatPoint', 'SatResult',
+           'SteadyState', 'SSCheck', 'read_fio_log', 'run_until_steady']
 
 """
 Flexible IO Tester
@@ -0,0 +1,211 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : fio_job.py
+@Time  : 2020/12/11 14:05
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import itertools
+import unittest
+from collections import namedtuple, OrderedDict
+
+from storagetest.libs import utils
+
+"""
+fio job file
+=============
+Build .fio job files from a parameter matrix(rw x bs x iodepth x numjobs x
+size x ioengine x direct) instead of a command line per test:
+    - the jobs on the same data(target + size) go into one job file, run by
+      one fio process, each job "stonewall"(after the previous one) and
+      "new_group"(reported alone), max_jobs per file
+    - the data file is laid out once(by the first job) and reused by the
+      others, numjobs > 1 splits it by offset_increment, unless the JobSpec
+      gives its own offset_increment(each job then does the whole size)
+    - a job with its own filename(eg: generate files) lays out its own
+"""
+
+JobSpec = namedtuple('JobSpec', ['name', 'rw', 'bs', 'iodepth', 'numjobs', 'size', 'ioengine', 'direct',
+                                 'filename', 'offset_increment'])
+# filename: None -> the shared data file; offset_increment: None -> split the size by numjobs
+JobSpec.__new__.__defaults__ = (None, None)
+
+MATRIX_KEYS = ('rw', 'bs', 'iodepth', 'numjobs', 'size', 'ioengine', 'direct')
+
+
+def size_name(size):
+    """4096 -> 4k, 1048576 -> 1m, 4000 -> 4000"""
+    for unit in ('t', 'g', 'm', 'k'):
+        scale = 1024 ** ('kmgt'.index(unit) + 1)
+        if size >= scale and size % scale == 0:
+            return '{0}{1}'.format(size // scale, unit)
+    return str(size)
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def job_matrix(rw='randread', bs=4096, iodepth=1, numjobs=1, size='1G', ioengine='libaio', direct=1):
+    """
+    the JobSpec list of every combination, a value or a list per parameter
+    the job name by the varying parameters, eg: randread_4k_qd32
+    :return: [JobSpec]
+    """
+    values = OrderedDict([
+        ('rw', _as_list(rw)),
+        ('bs', [utils.strsize_to_byte(x) for x in _as_list(bs)]),
+        ('iodepth', [int(x) for x in _as_list(iodepth)]),
+        ('numjobs', [int(x) for x in _as_list(numjobs)]),
+        ('size', [utils.strsize_to_byte(x) for x in _as_list(size)]),
+        ('ioengine', _as_list(ioengine)),
+        ('direct', [int(x) for x in _as_list(direct)]),
+    ])
+    labels = {
+        'rw': str, 'bs': size_name, 'iodepth': lambda x: 'qd{0}'.format(x), 'numjobs': lambda x: 'j{0}'.format(x),
+        'size': size_name, 'ioengine': str, 'direct': lambda x: 'direct' if x else 'buffered',
+    }
+    varying = [k for k in MATRIX_KEYS if k == 'rw' or len(values[k]) > 1]
+    specs = []
+    for combo in itertools.product(*values.values()):
+        params = dict(zip(MATRIX_KEYS, combo))
+        name = '_'.join(labels[k](params[k]) for k in varying)
+        specs.append(JobSpec(name=name, **params))
+    return specs
+
+
+class FioJobFile(object):
+    """A .fio job file: [global] + the stonewall/new_group job sections"""
+
+    def __init__(self, filename, size, runtime=None, ramp_time=None, global_options=None):
+        """
+        :param filename: the shared data file / device
+        :param size: the shared data size, bytes
+        :param runtime: time_based runtime per job(eg: 60s), None: size based
+        :param ramp_time: eg: 2s
+        :param global_options: more [global] options, {option: value}(None: option without value)
+        """
+        self.filename = filename
+        self.size = size
+        self.global_options = OrderedDict([('filename', filename), ('size', size), ('randrepeat', 0),
+                                           ('verify', 0), ('group_reporting', 1)])
+        if runtime:
+            self.global_options.update([('time_based', 1), ('runtime', runtime)])
+        if ramp_time:
+            self.global_options['ramp_time'] = ramp_time
+        self.global_options.update(global_options or {})
+        self.jobs = []  # JobSpec list
+
+    def add_job(self, spec):
+        self.jobs.append(spec)
+
+    def job_options(self, spec):
+        options = OrderedDict([('rw', spec.rw), ('bs', spec.bs), ('iodepth', spec.iodepth),
+                               ('numjobs', spec.numjobs), ('ioengine', spec.ioengine), ('direct', spec.direct)])
+        size = spec.size
+        if spec.filename:
+            options['filename'] = spec.filename
+        if size != self.size:
+            options['size'] = size
+        if spec.offset_increment:
+            # size per job, the job ranges may overlap
+            options['offset_increment'] = spec.offset_increment
+        elif spec.numjobs > 1:
+            # split the data, not every clone on the same range
+            options['size'] = size // spec.numjobs // spec.bs * spec.bs
+            options['offset_increment'] = options['size']
+        options['stonewall'] = None
+        options['new_group'] = None
+        return options
+
+    def text(self):
+        lines = ['; generated by storagetest, {0} jobs'.format(len(self.jobs)), '[global]']
+        sections = [self.global_options] + [self.job_options(spec) for spec in self.jobs]
+        for idx, options in enumerate(sections):
+            if idx > 0:
+                lines.extend(['', '[{0}]'.format(self.jobs[idx - 1].name)])
+            for option, value in options.items():
+                lines.append(option if value is None else '{0}={1}'.format(option, value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, file_path):
+        utils.mkdir_path(os.path.dirname(os.path.abspath(file_path)))
+        with open(file_path, 'w') as f:
+            f.write(self.text())
+        return file_path
+
+
+def batch_jobs(specs, target, runtime=None, ramp_time=None, max_jobs=64, global_options=None):
+    """
+    group the JobSpec list into job files, one per data(size) layout, max_jobs per file
+    :param specs: JobSpec list
+    :param target: a dir(data file fio_<size>.data in it) or a device/file path
+    :param runtime: see FioJobFile
+    :param ramp_time: see FioJobFile
+    :param max_jobs: max jobs per job file(per fio process)
+    :param global_options: see FioJobFile
+    :return: [FioJobFile]
+    """
+    groups = OrderedDict()
+    for spec in specs:
+        key = None if spec.filename else spec.size
+        groups.setdefault(key, []).append(spec)
+    job_files = []
+    for size, group in groups.items():
+        if size is None:
+            filename, size = group[0].filename, group[0].size
+        elif os.path.isdir(target):
+            filename = os.path.join(target, 'fio_{0}.data'.format(size_name(size)))
+        else:
+            filename = target
+        for idx in range(0, len(group), max_jobs):
+            job_file = FioJobFile(filename, size, runtime, ramp_time, global_options)
+            for spec in group[idx:idx + max_jobs]:
+                job_file.add_job(spec)
+            job_files.append(job_file)
+    return job_files
+
+
+class UnitTestCase(unittest.TestCase):
+    """fio job file test case"""
+
+    def test_matrix(self):
+        specs = job_matrix(rw=['randread', 'randwrite'], bs=['4K', '128K'], iodepth=[1, 32], size='1G')
+        self.assertEqual(len(specs), 8)
+        self.assertEqual(specs[0].name, 'randread_4k_qd1')
+        self.assertEqual(specs[-1], JobSpec('randwrite_128k_qd32', 'randwrite', 131072, 32, 1, 1024 ** 3,
+                                            'libaio', 1))
+        self.assertEqual(len(set(s.name for s in specs)), 8)
+
+    def test_batch(self):
+        import tempfile
+        tmp_dir = tempfile.mkdtemp(dir='/var/tmp')
+        specs = job_matrix(rw=['randread', 'read'], bs='4K', iodepth=[1, 4, 16], numjobs=[1, 4], size=['1G', '2G'])
+        job_files = batch_jobs(specs, tmp_dir, runtime='10s', ramp_time='2s', max_jobs=10)
+        self.assertEqual([len(j.jobs) for j in job_files], [10, 2, 10, 2])
+        self.assertEqual(job_files[0].filename, os.path.join(tmp_dir, 'fio_1g.data'))
+        text = job_files[0].text()
+        self.assertEqual(text.count('stonewall'), 10)
+        self.assertEqual(text.count('new_group'), 10)
+        self.assertIn('time_based=1\nruntime=10s\nramp_time=2s\n', text)
+        self.assertIn('numjobs=4\nioengine=libaio\ndirect=1\nsize=268435456\noffset_increment=268435456\n', text)
+        path = job_files[2].write(os.path.join(tmp_dir, 'jobs', 'fio_2g.fio'))
+        with open(path) as f:
+            self.assertIn('filename={0}'.format(os.path.join(tmp_dir, 'fio_2g.data')), f.read())
+        own = [spec._replace(filename=os.path.join(tmp_dir, 'f{0}'.format(x))) for x, spec in enumerate(specs[:2])]
+        job_files = batch_jobs(own, tmp_dir)
+        self.assertEqual(len(job_files), 1)
+        self.assertIn('filename={0}'.format(own[1].filename), job_files[0].text())
+        overlap = specs[-1]._replace(offset_increment='500M')
+        text = batch_jobs([overlap], tmp_dir)[0].text()
+        self.assertIn('numjobs=4\nioengine=libaio\ndirect=1\noffset_increment=500M\n', text)
+        self.assertIn('size={0}\n'.format(overlap.size), text)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
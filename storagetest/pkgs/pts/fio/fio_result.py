@@ -0,0 +1,221 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : fio_result.py
+@Time  : 2020/12/10 10:20
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import json
+import unittest
+from collections import namedtuple
+from prettytable import PrettyTable
+
+"""
+fio JSON result
+================
+Parse the fio --output-format=json+ output into typed records:
+    FioResult: fio version, timestamp, global options, jobs, disk util
+    JobResult: per job read/write/trim IOStats, CPU usage, iodepth levels,
+               latency distribution, error
+    IOStats:   io bytes, bandwidth, IOPS, runtime, slat/clat/lat Latency
+    Latency:   min/max/mean/stddev, percentiles and(json+) the full bins, ns
+Missing sections(eg: --gtod_reduce=1, no clat) parse to empty values.
+"""
+
+Latency = namedtuple('Latency', ['min', 'max', 'mean', 'stddev', 'samples', 'percentiles', 'bins'])
+IOStats = namedtuple('IOStats', ['io_bytes', 'bw_bytes', 'iops', 'runtime', 'total_ios', 'short_ios', 'drop_ios',
+                                 'slat', 'clat', 'lat', 'bw_mean', 'iops_mean', 'iops_stddev'])
+JobResult = namedtuple('JobResult', ['jobname', 'groupid', 'error', 'read', 'write', 'trim', 'job_runtime',
+                                     'usr_cpu', 'sys_cpu', 'ctx', 'majf', 'minf', 'iodepth_level', 'latency',
+                                     'options'])
+DiskUtil = namedtuple('DiskUtil', ['name', 'read_ios', 'write_ios', 'read_merges', 'write_merges', 'read_ticks',
+                                   'write_ticks', 'in_queue', 'util'])
+FioResult = namedtuple('FioResult', ['version', 'timestamp', 'global_options', 'jobs', 'disk_util', 'command',
+                                     'json_path'])
+
+EMPTY_LATENCY = Latency(0, 0, 0.0, 0.0, 0, {}, {})
+IO_DIRECTIONS = ('read', 'write', 'trim')
+
+
+def percentile(latency, p):
+    """latency(ns) at percentile p of a Latency, the nearest reported percentile, 0 if none"""
+    if not latency.percentiles:
+        return 0
+    key = min(latency.percentiles, key=lambda x: abs(x - p))
+    return latency.percentiles[key]
+
+
+def _latency(data):
+    if not data:
+        return EMPTY_LATENCY
+    return Latency(
+        min=data.get('min', 0),
+        max=data.get('max', 0),
+        mean=data.get('mean', 0.0),
+        stddev=data.get('stddev', 0.0),
+        samples=data.get('N', 0),
+        percentiles={float(p): ns for p, ns in data.get('percentile', {}).items()},
+        bins={int(ns): count for ns, count in data.get('bins', {}).items()},
+    )
+
+
+def _io_stats(data):
+    data = data or {}
+    return IOStats(
+        io_bytes=data.get('io_bytes', 0),
+        bw_bytes=data.get('bw_bytes', data.get('bw', 0) * 1024),
+        iops=data.get('iops', 0.0),
+        runtime=data.get('runtime', 0),  # ms
+        total_ios=data.get('total_ios', 0),
+        short_ios=data.get('short_ios', 0),
+        drop_ios=data.get('drop_ios', 0),
+        slat=_latency(data.get('slat_ns')),
+        clat=_latency(data.get('clat_ns')),
+        lat=_latency(data.get('lat_ns')),
+        bw_mean=data.get('bw_mean', 0.0) * 1024,  # KiB/s -> bytes/s
+        iops_mean=data.get('iops_mean', 0.0),
+        iops_stddev=data.get('iops_stddev', 0.0),
+    )
+
+
+def _latency_dist(job):
+    """fio latency_ns/us/ms percent buckets, as {upper bound ns(or '>=2000ms'): percent}"""
+    dist = {}
+    for unit, scale in (('latency_ns', 1), ('latency_us', 1000), ('latency_ms', 1000000)):
+        for bound, percent in job.get(unit, {}).items():
+            if bound.startswith('>='):
+                dist['{0}{1}'.format(bound, unit[-2:])] = percent
+            else:
+                dist[int(bound) * scale] = percent
+    return dist
+
+
+def parse_fio_json(text, command='', json_path=''):
+    """
+    parse the fio json/json+ output
+    :param text: fio output, leading non-JSON lines(warnings) skipped
+    :param command: the fio command
+    :param json_path: the output file
+    :return: FioResult
+    """
+    start = text.find('{')
+    if start < 0:
+        raise Exception('No fio json output: {0}'.format(text[:200]))
+    data = json.JSONDecoder().raw_decode(text[start:])[0]
+    jobs = []
+    for job in data.get('jobs', []):
+        jobs.append(JobResult(
+            jobname=job.get('jobname', ''),
+            groupid=job.get('groupid', 0),
+            error=job.get('error', 0),
+            read=_io_stats(job.get('read')),
+            write=_io_stats(job.get('write')),
+            trim=_io_stats(job.get('trim')),
+            job_runtime=job.get('job_runtime', 0),
+            usr_cpu=job.get('usr_cpu', 0.0),
+            sys_cpu=job.get('sys_cpu', 0.0),
+            ctx=job.get('ctx', 0),
+            majf=job.get('majf', 0),
+            minf=job.get('minf', 0),
+            iodepth_level=job.get('iodepth_level', {}),
+            latency=_latency_dist(job),
+            options=job.get('job options', {}),
+        ))
+    disk_util = [DiskUtil(d.get('name', ''), d.get('read_ios', 0), d.get('write_ios', 0), d.get('read_merges', 0),
+                          d.get('write_merges', 0), d.get('read_ticks', 0), d.get('write_ticks', 0),
+                          d.get('in_queue', 0), d.get('util', 0.0)) for d in data.get('disk_util', [])]
+    return FioResult(data.get('fio version', ''), data.get('timestamp', 0), data.get('global options', {}), jobs,
+                     disk_util, command, json_path)
+
+
+def load_fio_json(json_path, command=''):
+    with open(json_path) as f:
+        return parse_fio_json(f.read(), command, json_path)
+
+
+def results_table(results):
+    """return a PrettyTable of FioResult list, a row per job and I/O direction"""
+    table = PrettyTable(['Job', 'RW', 'IOPS', 'MB/s', 'clat avg(ms)', 'p50(ms)', 'p99(ms)', 'p99.9(ms)',
+                         'usr/sys CPU%', 'Util%', 'Error'])
+    table.align['Job'] = 'l'
+    for result in results:
+        util = max([d.util for d in result.disk_util] or [0])
+        for job in result.jobs:
+            for rw in IO_DIRECTIONS:
+                io = getattr(job, rw)
+                if not io.total_ios and not io.io_bytes:
+                    continue
+                table.add_row([job.jobname, rw, round(io.iops, 1), round(io.bw_bytes / 1024 / 1024, 2),
+                               round(io.clat.mean / 1e6, 3), round(percentile(io.clat, 50) / 1e6, 3),
+                               round(percentile(io.clat, 99) / 1e6, 3), round(percentile(io.clat, 99.9) / 1e6, 3),
+                               '{0:.1f}/{1:.1f}'.format(job.usr_cpu, job.sys_cpu), round(util, 1), job.error])
+    return table
+
+
+SAMPLE_JSON = """fio: this platform does not support process shared mutexes, forcing use of threads.
+{
+  "fio version" : "fio-3.16",
+  "timestamp" : 1607566800,
+  "global options" : {"size" : "1G"},
+  "jobs" : [
+    {
+      "jobname" : "read_iops", "groupid" : 0, "error" : 0,
+      "job options" : {"name" : "read_iops", "bs" : "4K", "iodepth" : "64", "rw" : "randread"},
+      "read" : {
+        "io_bytes" : 4194304000, "io_kbytes" : 4096000, "bw_bytes" : 69905066, "bw" : 68266,
+        "iops" : 17066.666667, "runtime" : 60000, "total_ios" : 1024000, "short_ios" : 0, "drop_ios" : 0,
+        "slat_ns" : {"min" : 1000, "max" : 90000, "mean" : 2500.5, "stddev" : 300.1, "N" : 1024000},
+        "clat_ns" : {"min" : 100000, "max" : 9000000, "mean" : 3700000.0, "stddev" : 500000.0, "N" : 1024000,
+                     "percentile" : {"50.000000" : 3620864, "99.000000" : 6062080, "99.900000" : 7503872},
+                     "bins" : {"3620864" : 512000, "6062080" : 500000, "7503872" : 12000}},
+        "lat_ns" : {"min" : 101000, "max" : 9001000, "mean" : 3702500.5, "stddev" : 500010.0, "N" : 1024000},
+        "bw_mean" : 68270.5, "iops_mean" : 17067.6, "iops_stddev" : 120.5
+      },
+      "write" : {"io_bytes" : 0, "bw_bytes" : 0, "iops" : 0.0, "runtime" : 0, "total_ios" : 0},
+      "trim" : {"io_bytes" : 0, "bw_bytes" : 0, "iops" : 0.0, "runtime" : 0, "total_ios" : 0},
+      "job_runtime" : 60001, "usr_cpu" : 3.5, "sys_cpu" : 12.25, "ctx" : 1024500, "majf" : 0, "minf" : 78,
+      "iodepth_level" : {"1" : 0.1, "2" : 0.1, "4" : 0.1, "8" : 0.1, "16" : 0.1, "32" : 0.1, ">=64" : 99.9},
+      "latency_ns" : {"2" : 0.0, "1000" : 0.0},
+      "latency_us" : {"2" : 0.0, "1000" : 0.01},
+      "latency_ms" : {"2" : 0.02, "4" : 60.5, "10" : 39.47, "2000" : 0.0, ">=2000" : 0.0}
+    }
+  ],
+  "disk_util" : [
+    {"name" : "sdb", "read_ios" : 1023500, "write_ios" : 0, "read_merges" : 0, "write_merges" : 0,
+     "read_ticks" : 3780000, "write_ticks" : 0, "in_queue" : 3780100, "util" : 99.95}
+  ]
+}
+"""
+
+
+class UnitTestCase(unittest.TestCase):
+    """fio result test case"""
+
+    def test_parse(self):
+        result = parse_fio_json(SAMPLE_JSON, command='fio --name=read_iops')
+        self.assertEqual((result.version, len(result.jobs)), ('fio-3.16', 1))
+        job = result.jobs[0]
+        self.assertEqual((job.jobname, job.error, job.usr_cpu, job.sys_cpu), ('read_iops', 0, 3.5, 12.25))
+        self.assertAlmostEqual(job.read.iops, 17066.666667)
+        self.assertEqual(job.read.bw_bytes, 69905066)
+        self.assertEqual(percentile(job.read.clat, 99), 6062080)
+        self.assertEqual(percentile(job.read.clat, 99.9), 7503872)
+        self.assertEqual(sum(job.read.clat.bins.values()), 1024000)
+        self.assertEqual(job.read.lat.samples, 1024000)
+        self.assertEqual(job.write.total_ios, 0)
+        self.assertEqual(percentile(job.write.clat, 99), 0)
+        self.assertEqual(job.latency[4000000], 60.5)
+        self.assertEqual(job.latency['>=2000ms'], 0.0)
+        self.assertEqual(result.disk_util[0].util, 99.95)
+        table = results_table([result])
+        self.assertEqual(len(table.rows), 1)
+        self.assertEqual(table.rows[0][5], 3.621)
+        self.assertRaises(Exception, parse_fio_json, 'fio: no such file')
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -13,6 +13,11 @@ import unittest
 from storagetest.libs import utils, log
 from storagetest.libs.exceptions import PlatformError, NoSuchDir, NoSuchBinary
 from storagetest.pkgs.base import PkgBase, TestProfile, to_safe_name
+from storagetest.pkgs.raw.block_device import BlockDevice
+from storagetest.pkgs.pts.fio.fio_result import load_fio_json, results_table
+from storagetest.pkgs.pts.fio.fio_job import JobSpec, job_matrix, batch_jobs
+from storagetest.pkgs.pts.fio.saturation import SaturationSearch
+from storagetest.pkgs.pts.fio.steady_state import run_until_steady
 
 logger = log.get_logger()
 cur_dir = os.path.dirname(os.path.realpath(__file__))
@@ -30,6 +35,8 @@ class FIO(PkgBase):
         super(FIO, self).__init__(top_path)
         self.top_path = top_path
         self.test_path = os.path.join(top_path, "fio")
+        self.results = {}  # {test name: [FioResult per run]}
+        self.steady = {}  # {test name: [SSCheck per run]}
 
     def verify(self):
         if os.name != "posix":
@@ -42,6 +49,54 @@ class FIO(PkgBase):
             logger.error(e)
             raise NoSuchBinary("fio, try install it.(apt-get install -y fio)")
 
+    def run(self, test, steady=None, stop=True, record=True):
+        """
+        run the fio test with --output-format=json+, FAIL if fio rc != 0 or any job error
+        :param test: TestProfile
+        :param steady: SteadyState, check the steady state by the fio iops/bw log, self.steady[test.name]
+        :param stop: stop the test once steady state, False: just flag it
+        :param record: append the result to self.results(the report), False: eg: the saturation search points
+        :return: FioResult, also appended to self.results[test.name] if record
+        """
+        logger.info(test.desc)
+        self.verify()
+        runs = self.results.setdefault(test.name, []) if record else []
+        test_log = os.path.join(self.top_path, '{0}.log'.format(test.name))
+        json_path = os.path.join(self.top_path, '{0}_{1}.json'.format(test.name, len(runs) + 1))
+        test_cmd = "{0} --output-format=json+ --output={1}".format(test.command, json_path)
+        if not os.path.exists(test.test_path):  # a raw device test: the device
+            utils.mkdir_path(test.test_path)
+
+        try:
+            if steady:
+                log_prefix = os.path.splitext(json_path)[0]
+                rc, check = run_until_steady(test_cmd, log_prefix, steady, stop, test_log)
+                self.steady.setdefault(test.name, []).append(check)
+                output = 'see {0}'.format(test_log)
+            else:
+                rc, output = utils.run_cmd(test_cmd, expected_rc='ignore', timeout=72000)
+                with open(test_log, 'a') as f:
+                    f.write('{0}\n{1}\n'.format(test_cmd, output))
+            if not os.path.isfile(json_path):
+                raise Exception("No fio output {0}, rc={1}: {2}".format(json_path, rc, output))
+            result = load_fio_json(json_path, test_cmd)
+            logger.info('{0}\n{1}'.format(test.name, results_table([result])))
+            errors = ['{0}: error {1}'.format(job.jobname, job.error) for job in result.jobs if job.error]
+            if rc != 0 or errors:
+                raise Exception("FAIL: Run {0} on {1}, rc={2}, {3}".format(
+                    test.name, test.test_path, rc, ', '.join(errors) or output))
+            runs.append(result)
+            logger.info("PASS: Run {0} on {1}".format(test.name, test.test_path))
+        except Exception as e:
+            logger.info("FAIL: Run {0} on {1}".format(test.name, test.test_path))
+            raise e
+
+        return result
+
+    def report(self):
+        """return the PrettyTable of all the fio results"""
+        return results_table([result for runs in self.results.values() for result in runs])
+
     def dbench_tcs(self, size="2G"):
         """FYI https://github.com/leeliu/dbench"""
         cmd_list = [
@@ -67,55 +122,123 @@ class FIO(PkgBase):
             tests.append(test)
         return tests
 
-    def seq_write_tcs(self, num=1, size="2G"):
-        cmd_list = [
-            ("Write Sequential Speed", "fio --name=write_seq --filename={0} --bs=1M --iodepth=16 --size={1} --readwrite=write --thread --numjobs=4 --offset_increment=500M --randrepeat=0 --verify=0 --ioengine=libaio --direct=1 --gtod_reduce=1 --ramp_time=2s"),
-        ]
+    def matrix_tcs(self, specs, runtime=None, ramp_time='2s', max_jobs=64, target=None, global_options=None,
+                   name='fio_matrix'):
+        """
+        TestProfile list of the JobSpec list, a .fio job file(one fio process) per data layout
+        :param specs: JobSpec list, see fio_job.job_matrix
+        :param runtime: time_based runtime per job, None: size based
+        :param ramp_time: ramp time per job
+        :param max_jobs: max jobs per fio process
+        :param target: the data dir or device, default self.test_path
+        :param global_options: more [global] options of the job files
+        :param name: test name prefix
+        """
+        target = target or self.test_path
+        utils.mkdir_path(self.test_path)
         tests = []
-        for idx, (desc, cmd) in enumerate(cmd_list*num):
-            test_name = "fio_{0}_{1}".format(idx + 1, to_safe_name(desc))
-            f_pathname = os.path.join(self.test_path, test_name + ".data")
+        for idx, job_file in enumerate(batch_jobs(specs, target, runtime, ramp_time, max_jobs, global_options)):
+            test_name = "{0}_{1}".format(name, idx + 1)
+            job_path = job_file.write(os.path.join(self.top_path, test_name + ".fio"))
             test = TestProfile(
                 name=test_name,
-                desc=desc,
+                desc="{0} jobs on {1}: {2}".format(len(job_file.jobs), job_file.filename,
+                                                  ', '.join(spec.name for spec in job_file.jobs)),
                 test_path=self.test_path,
-                bin_path=bin_path,
-                command=cmd.format(f_pathname, size))
+                command="fio {0}".format(job_path))
             tests.append(test)
         return tests
 
+    def sweep(self, runtime='10s', ramp_time='2s', max_jobs=64, **matrix):
+        """
+        Run a parameter matrix, eg: sweep(rw=['randread', 'randwrite'], bs=['4K', '1M'], iodepth=[1, 8, 32])
+        :param matrix: rw/bs/iodepth/numjobs/size/ioengine/direct, see fio_job.job_matrix
+        """
+        rc = self.run_tests(self.matrix_tcs(job_matrix(**matrix), runtime, ramp_time, max_jobs))
+        logger.info('fio sweep:\n{0}'.format(self.report()))
+        return rc
+
+    def seq_write_tcs(self, num=1, size="2G"):
+        """Write Sequential Speed: num files, one fio process"""
+        specs = []
+        for idx in range(num):
+            f_pathname = os.path.join(self.test_path, "fio_{0}_Write_Sequential_Speed.data".format(idx + 1))
+            spec = JobSpec(name="write_seq_{0}".format(idx + 1), rw="write", bs=1048576, iodepth=16, numjobs=4,
+                           size=utils.strsize_to_byte(size), ioengine="libaio", direct=1, filename=f_pathname,
+                           offset_increment='500M')
+            specs.append(spec)
+        return self.matrix_tcs(specs, global_options={'thread': None, 'gtod_reduce': 1})
+
     def seq_write(self, num=1, size="2G"):
         return self.run_tests(self.seq_write_tcs(num, size))
 
+    @property
+    def size(self):
+        """file size per dbench test: the free space of top_path shared by all the dbench data files, max 10G"""
+        tests = self.dbench_tcs()
+        size = BlockDevice().bench_profile(path=self.top_path, numjobs=len(tests)).size
+        # the sequential tests: 4 jobs from offset_increment=500M, the data file 1500M larger than size
+        extra = 1500 * 1024 * 1024 * sum(1 for test in tests if '--offset_increment=500M' in test.command)
+        return max(size - extra // len(tests) // 1048576 * 1048576, 1048576)
+
     def sanity(self):
         """Run dbench tests"""
-        return self.run_tests(self.dbench_tcs(size="10G"))
+        return self.run_tests(self.dbench_tcs(size=self.size))
 
     def stress(self):
         """Run dbench tests"""
-        return self.run_tests(self.dbench_tcs(size="10G"))
-
-    def google_benchmark(self):
-        """Benchmarking test from google disk"""
-        gbm = GoogleBenchmarking(self.test_path)
-        self.run(gbm.write_throughput)
-        self.run(gbm.read_throughput)
-        self.run(gbm.write_iops)
-        self.run(gbm.read_iops)
+        return self.run_tests(self.dbench_tcs(size=self.size))
+
+    def google_benchmark(self, steady=None):
+        """
+        Benchmarking test from google disk
+        :param steady: SteadyState, run each test up to steady.max_runtime and stop at steady state, None: 60s
+        """
+        gbm = GoogleBenchmarking(self.test_path, steady.max_runtime if steady else '60s')
+        self.run(gbm.write_throughput, steady)
+        self.run(gbm.read_throughput, steady)
+        self.run(gbm.write_iops, steady)
+        self.run(gbm.read_iops, steady)
+        logger.info('Google benchmark:\n{0}'.format(self.report()))
         return True
 
-    def google_raw_benchmark(self):
-        """Benchmarking test from google disk"""
-        gbm_raw = GoogleRawBenchmarking(self.test_path)
-        self.run(gbm_raw.fill_disk)
-        self.run(gbm_raw.write_bandwidth)
-        self.run(gbm_raw.write_iops)
-        self.run(gbm_raw.write_latency)
-        self.run(gbm_raw.read_bandwidth)
-        self.run(gbm_raw.read_iops)
-        self.run(gbm_raw.read_latency)
-        self.run(gbm_raw.seq_read_bandwidth)
-        self.run(gbm_raw.seq_write_bandwidth)
+    def saturation(self, target=None, rw='randread', bs=4096, **kwargs):
+        """
+        iodepth/numjobs saturation search, see saturation.SaturationSearch
+        :param target: device or dir, default self.test_path
+        :return: SatResult
+        """
+        target = target or self.test_path
+        utils.mkdir_path(self.test_path)
+        search = SaturationSearch(self, target, rw, bs, **kwargs)
+        result = search.search()
+        search.report(result)
+        return result
+
+    def google_raw_benchmark(self, search=False, steady=None, device=None):
+        """
+        Benchmarking test from google disk, DESTROYS the device data
+        :param search: iodepth of the IOPS / latency tests by a saturation search(max IOPS / latency point),
+                       instead of the device queue profile
+        :param steady: SteadyState, run each test up to steady.max_runtime and stop at steady state, None: 1m;
+                       fill_disk still fills the whole disk, just flagged if the write never steady
+        :param device: the raw device, default self.test_path
+        """
+        gbm_raw = GoogleRawBenchmarking(device or self.test_path, steady.max_runtime if steady else '1m')
+        self.run(gbm_raw.fill_disk, steady, stop=False)
+        if search:
+            gbm_raw.tune(self.saturation(gbm_raw.device, 'randwrite', gbm_raw.profile.bs_iops, max_numjobs=1))
+        self.run(gbm_raw.write_bandwidth, steady)
+        self.run(gbm_raw.write_iops, steady)
+        self.run(gbm_raw.write_latency, steady)
+        if search:
+            gbm_raw.tune(self.saturation(gbm_raw.device, 'randread', gbm_raw.profile.bs_iops, max_numjobs=1))
+        self.run(gbm_raw.read_bandwidth, steady)
+        self.run(gbm_raw.read_iops, steady)
+        self.run(gbm_raw.read_latency, steady)
+        self.run(gbm_raw.seq_read_bandwidth, steady)
+        self.run(gbm_raw.seq_write_bandwidth, steady)
+        logger.info('Google raw benchmark:\n{0}'.format(self.report()))
         return True
 
 
@@ -124,8 +247,10 @@ class GoogleBenchmarking(object):
     Benchmarking test from google disk
     https://cloud.google.com/compute/docs/disks/benchmarking-pd-performance#existing-disk
     """
-    def __init__(self, test_path):
+    def __init__(self, test_path, runtime='60s'):
         self.test_path = test_path  # eg: /mnt/test
+        self.profile = BlockDevice().bench_profile(path=test_path, numjobs=8)
+        self.args = dict(self.profile._asdict(), test_path=test_path, runtime=runtime)
 
     @property
     def write_throughput(self):
@@ -133,13 +258,13 @@ class GoogleBenchmarking(object):
         Test write throughput by performing sequential writes with multiple parallel streams (8+),
         using an I/O block size of 1 MB and an I/O depth of at least 64
         """
-        cmd = "sudo fio --name=write_throughput --directory={0} --numjobs=8 " \
-              "--size=10G --time_based --runtime=60s --ramp_time=2s " \
-              "--ioengine=libaio --direct=1 --verify=0 --bs=1M --iodepth=64 " \
-              "--rw=write --group_reporting=1".format(self.test_path)
+        cmd = "sudo fio --name=write_throughput --directory={test_path} --numjobs=8 " \
+              "--size={size} --time_based --runtime={runtime} --ramp_time=2s " \
+              "--ioengine=libaio --direct=1 --verify=0 --bs={bs_bw} --iodepth={iodepth_bw} " \
+              "--rw=write --group_reporting=1".format(**self.args)
         test = TestProfile(
             name="write_throughput",
-            desc=self.write_throughput.__doc__,
+            desc=type(self).write_throughput.__doc__,
             test_path=self.test_path,
             command=cmd,
         )
@@ -151,12 +276,12 @@ class GoogleBenchmarking(object):
         Test read throughput by performing sequential writes with multiple parallel streams (8+),
         using an I/O block size of 1 MB and an I/O depth of at least 64
         """
-        cmd = "sudo fio --name=read_throughput --directory={0} --numjobs=8 " \
-              "--size=10G --time_based --runtime=60s --ramp_time=2s --ioengine=libaio " \
-              "--direct=1 --verify=0 --bs=1M --iodepth=64 --rw=read --group_reporting=1".format(self.test_path)
+        cmd = "sudo fio --name=read_throughput --directory={test_path} --numjobs=8 " \
+              "--size={size} --time_based --runtime={runtime} --ramp_time=2s --ioengine=libaio " \
+              "--direct=1 --verify=0 --bs={bs_bw} --iodepth={iodepth_bw} --rw=read --group_reporting=1".format(**self.args)
         test = TestProfile(
             name="read_throughput",
-            desc=self.read_throughput.__doc__,
+            desc=type(self).read_throughput.__doc__,
             test_path=self.test_path,
             command=cmd,
         )
@@ -168,13 +293,13 @@ class GoogleBenchmarking(object):
         Test write IOPS by performing sequential writes,
         using an I/O block size of 4 KB and an I/O depth of at least 64
         """
-        cmd = "sudo fio --name=write_iops --directory={0} --size=10G " \
-              "--time_based --runtime=60s --ramp_time=2s --ioengine=libaio " \
-              "--direct=1 --verify=0 --bs=4K --iodepth=64 --rw=randwrite " \
-              "--group_reporting=1".format(self.test_path)
+        cmd = "sudo fio --name=write_iops --directory={test_path} --size={size} " \
+              "--time_based --runtime={runtime} --ramp_time=2s --ioengine=libaio " \
+              "--direct=1 --verify=0 --bs={bs_iops} --iodepth={iodepth_iops} --rw=randwrite " \
+              "--group_reporting=1".format(**self.args)
         test = TestProfile(
             name="write_iops",
-            desc=self.write_iops.__doc__,
+            desc=type(self).write_iops.__doc__,
             test_path=self.test_path,
             command=cmd,
         )
@@ -185,12 +310,12 @@ class GoogleBenchmarking(object):
         """
         Test read IOPS, using an I/O block size of 4 KB and an I/O depth of at least 64
         """
-        cmd = "sudo fio --name=read_iops --directory={0} --size=10G " \
-              "--time_based --runtime=60s --ramp_time=2s --ioengine=libaio --direct=1 " \
-              "--verify=0 --bs=4K --iodepth=64 --rw=randread --group_reporting=1".format(self.test_path)
+        cmd = "sudo fio --name=read_iops --directory={test_path} --size={size} " \
+              "--time_based --runtime={runtime} --ramp_time=2s --ioengine=libaio --direct=1 " \
+              "--verify=0 --bs={bs_iops} --iodepth={iodepth_iops} --rw=randread --group_reporting=1".format(**self.args)
         test = TestProfile(
             name="read_iops",
-            desc=self.read_iops.__doc__,
+            desc=type(self).read_iops.__doc__,
             test_path=self.test_path,
             command=cmd,
         )
@@ -202,8 +327,16 @@ class GoogleRawBenchmarking(object):
     Benchmarking raw disk performance
     https://cloud.google.com/compute/docs/disks/benchmarking-pd-performance#existing-disk
     """
-    def __init__(self, device):
+    def __init__(self, device, runtime='1m'):
         self.device = device  # eg: /dev/sdb
+        self.profile = BlockDevice().bench_profile(device=device)
+        self.args = dict(self.profile._asdict(), device=device, runtime=runtime,
+                         offset_increment_8=self.profile.size // 8 // 1048576 * 1048576)
+
+    def tune(self, sat_result):
+        """iodepth of the IOPS / latency tests by a SatResult: the max IOPS / latency point"""
+        self.args.update(iodepth_iops=sat_result.max_iops.qd, iodepth_lat=sat_result.latency.qd)
+        logger.info('{0}: iodepth iops {iodepth_iops}, latency {iodepth_lat}'.format(self.device, **self.args))
 
     @property
     def fill_disk(self):
@@ -213,12 +346,12 @@ class GoogleRawBenchmarking(object):
         We recommend filling the disk before running any read latency benchmarks.
         """
         # --filename=/dev/sdb
-        cmd = "sudo fio --name=fill_disk --filename={0} --filesize=2500G " \
+        cmd = "sudo fio --name=fill_disk --filename={device} --filesize={size} " \
               "--ioengine=libaio --direct=1 --verify=0 --randrepeat=0 " \
-              "--bs=128K --iodepth=64 --rw=randwrite".format(self.device)
+              "--bs=128K --iodepth={iodepth_bw} --rw=randwrite".format(**self.args)
         test = TestProfile(
             name="raw_fill_disk",
-            desc=self.fill_disk.__doc__,
+            desc=type(self).fill_disk.__doc__,
             test_path=self.device,
             command=cmd,
         )
@@ -230,12 +363,12 @@ class GoogleRawBenchmarking(object):
         Test write bandwidth by performing sequential writes with multiple parallel streams (8+),
         using 1 MB as the I/O size and having an I/O depth that is greater than or equal to 64.
         """
-        cmd = "sudo fio --name=fill_disk --filename={0} --filesize=2500G " \
+        cmd = "sudo fio --name=fill_disk --filename={device} --filesize={size} " \
               "--ioengine=libaio --direct=1 --verify=0 --randrepeat=0 " \
-              "--bs=128K --iodepth=64 --rw=randwrite".format(self.device)
+              "--bs=128K --iodepth={iodepth_bw} --rw=randwrite".format(**self.args)
         test = TestProfile(
             name="raw_write_bandwidth",
-            desc=self.write_bandwidth.__doc__,
+            desc=type(self).write_bandwidth.__doc__,
             test_path=self.device,
             command=cmd,
         )
@@ -253,12 +386,12 @@ class GoogleRawBenchmarking(object):
         If the I/O size is larger than 4 KB, the VM might reach the bandwidth limit
         before it reaches the IOPS limit.
         """
-        cmd = "sudo fio --name=write_iops_test --filename={0} --filesize=2500G " \
-              "--time_based --ramp_time=2s --runtime=1m --ioengine=libaio --direct=1 " \
-              "--verify=0 --randrepeat=0 --bs=4K --iodepth=256 --rw=randwrite".format(self.device)
+        cmd = "sudo fio --name=write_iops_test --filename={device} --filesize={size} " \
+              "--time_based --ramp_time=2s --runtime={runtime} --ioengine=libaio --direct=1 " \
+              "--verify=0 --randrepeat=0 --bs={bs_iops} --iodepth={iodepth_iops} --rw=randwrite".format(**self.args)
         test = TestProfile(
             name="raw_write_iops",
-            desc=self.write_iops.__doc__,
+            desc=type(self).write_iops.__doc__,
             test_path=self.device,
             command=cmd,
         )
@@ -272,12 +405,12 @@ class GoogleRawBenchmarking(object):
         For example, if the IOPS limit is reached at an I/O depth of 30 and the fio command has double that,
         then the total IOPS remains the same and the reported I/O latency doubles.
         """
-        cmd = "sudo fio --name=write_latency_test --filename={0} --filesize=2500G " \
-              "--time_based --ramp_time=2s --runtime=1m --ioengine=libaio --direct=1 " \
-              "--verify=0 --randrepeat=0 --bs=4K --iodepth=4 --rw=randwrite".format(self.device)
+        cmd = "sudo fio --name=write_latency_test --filename={device} --filesize={size} " \
+              "--time_based --ramp_time=2s --runtime={runtime} --ioengine=libaio --direct=1 " \
+              "--verify=0 --randrepeat=0 --bs={bs_iops} --iodepth={iodepth_lat} --rw=randwrite".format(**self.args)
         test = TestProfile(
             name="raw_write_latency",
-            desc=self.write_latency.__doc__,
+            desc=type(self).write_latency.__doc__,
             test_path=self.device,
             command=cmd,
         )
@@ -289,13 +422,13 @@ class GoogleRawBenchmarking(object):
         Test read bandwidth by performing sequential reads with multiple parallel streams (8+),
         using 1 MB as the I/O size and having an I/O depth that is equal to 64 or greater.
         """
-        cmd = "sudo fio --name=read_bandwidth_test --filename={0} --filesize=2500G " \
-              "--time_based --ramp_time=2s --runtime=1m --ioengine=libaio --direct=1 " \
-              "--verify=0 --randrepeat=0 --bs=1M --iodepth=64 --rw=read --numjobs=8 " \
-              "--offset_increment=100G".format(self.device)
+        cmd = "sudo fio --name=read_bandwidth_test --filename={device} --filesize={size} " \
+              "--time_based --ramp_time=2s --runtime={runtime} --ioengine=libaio --direct=1 " \
+              "--verify=0 --randrepeat=0 --bs={bs_bw} --iodepth={iodepth_bw} --rw=read --numjobs=8 " \
+              "--offset_increment={offset_increment_8}".format(**self.args)
         test = TestProfile(
             name="raw_read_bandwidth",
-            desc=self.read_bandwidth.__doc__,
+            desc=type(self).read_bandwidth.__doc__,
             test_path=self.device,
             command=cmd,
         )
@@ -309,12 +442,12 @@ class GoogleRawBenchmarking(object):
         limit before it reaches the IOPS limit. To achieve the maximum 100k read IOPS,
         specify --iodepth=256 for this test.
         """
-        cmd = "sudo fio --name=read_iops_test  --filename={0} --filesize=2500G " \
-              "--time_based --ramp_time=2s --runtime=1m --ioengine=libaio --direct=1 " \
-              "--verify=0 --randrepeat=0 --bs=4K --iodepth=256 --rw=randread".format(self.device)
+        cmd = "sudo fio --name=read_iops_test  --filename={device} --filesize={size} " \
+              "--time_based --ramp_time=2s --runtime={runtime} --ioengine=libaio --direct=1 " \
+              "--verify=0 --randrepeat=0 --bs={bs_iops} --iodepth={iodepth_iops} --rw=randread".format(**self.args)
         test = TestProfile(
             name="raw_read_iops",
-            desc=self.read_iops.__doc__,
+            desc=type(self).read_iops.__doc__,
             test_path=self.device,
             command=cmd,
         )
@@ -328,12 +461,12 @@ class GoogleRawBenchmarking(object):
         persistent disk reaches its saturation limit, it pushes back on incoming I/Os and this is
         reflected as an artificial increase in I/O latency.
         """
-        cmd = "sudo fio --name=read_latency_test --filename={0} --filesize=2500G " \
-              " --time_based --ramp_time=2s --runtime=1m  --ioengine=libaio --direct=1 " \
-              "--verify=0 --randrepeat=0  --bs=4K --iodepth=4 --rw=randread".format(self.device)
+        cmd = "sudo fio --name=read_latency_test --filename={device} --filesize={size} " \
+              " --time_based --ramp_time=2s --runtime={runtime}  --ioengine=libaio --direct=1 " \
+              "--verify=0 --randrepeat=0  --bs={bs_iops} --iodepth={iodepth_lat} --rw=randread".format(**self.args)
         test = TestProfile(
             name="raw_read_latency",
-            desc=self.read_latency.__doc__,
+            desc=type(self).read_latency.__doc__,
             test_path=self.device,
             command=cmd,
         )
@@ -342,13 +475,13 @@ class GoogleRawBenchmarking(object):
     @property
     def seq_read_bandwidth(self):
         """Test sequential read bandwidth."""
-        cmd = "sudo fio --name=seq_read_bandwidth_test --filename={0} --filesize=2500G " \
-              "--time_based --ramp_time=2s --runtime=1m --ioengine=libaio --direct=1 --verify=0 " \
-              "--randrepeat=0 --numjobs=4 --thread --offset_increment=500G --bs=1M " \
-              "--iodepth=64 --rw=read".format(self.device)
+        cmd = "sudo fio --name=seq_read_bandwidth_test --filename={device} --filesize={size} " \
+              "--time_based --ramp_time=2s --runtime={runtime} --ioengine=libaio --direct=1 --verify=0 " \
+              "--randrepeat=0 --numjobs=4 --thread --offset_increment={offset_increment} --bs={bs_bw} " \
+              "--iodepth={iodepth_bw} --rw=read".format(**self.args)
         test = TestProfile(
             name="raw_seq_read_bandwidth",
-            desc=self.seq_read_bandwidth.__doc__,
+            desc=type(self).seq_read_bandwidth.__doc__,
             test_path=self.device,
             command=cmd,
         )
@@ -357,13 +490,13 @@ class GoogleRawBenchmarking(object):
     @property
     def seq_write_bandwidth(self):
         """Test sequential write bandwidth."""
-        cmd = "sudo fio --name=seq_write_bandwidth_test  --filename={0} --filesize=2500G " \
-              "--time_based --ramp_time=2s --runtime=1m --ioengine=libaio --direct=1 --verify=0 " \
-              "--randrepeat=0 --numjobs=4 --thread --offset_increment=500G --bs=1M " \
-              "--iodepth=64 --rw=write".format(self.device)
+        cmd = "sudo fio --name=seq_write_bandwidth_test  --filename={device} --filesize={size} " \
+              "--time_based --ramp_time=2s --runtime={runtime} --ioengine=libaio --direct=1 --verify=0 " \
+              "--randrepeat=0 --numjobs=4 --thread --offset_increment={offset_increment} --bs={bs_bw} " \
+              "--iodepth={iodepth_bw} --rw=write".format(**self.args)
         test = TestProfile(
             name="raw_seq_write_bandwidth",
-            desc=self.seq_write_bandwidth.__doc__,
+            desc=type(self).seq_write_bandwidth.__doc__,
             test_path=self.device,
             command=cmd,
         )
@@ -0,0 +1,199 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : saturation.py
+@Time  : 2020/12/14 10:30
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import unittest
+from collections import namedtuple
+from prettytable import PrettyTable
+
+from storagetest.libs import log
+from storagetest.pkgs.raw.block_device import BlockDevice
+from storagetest.pkgs.pts.fio.fio_job import JobSpec
+from storagetest.pkgs.pts.fio.fio_result import percentile
+
+"""
+fio saturation search
+======================
+Find the queue depth(iodepth x numjobs) a device saturates at, instead of a
+guessed --iodepth=256 / --iodepth=4, by short fio runs:
+    1. doubling: qd 1, 2, 4 ... until the IOPS gain < gain while the p99 rises
+       > gain(IOPS stops rising, p99 keeps climbing) or max_qd
+    2. bisection: between the last qd below and the first qd within gain of
+       the max IOPS, until the qd step < 1/8 or max_runs
+qd -> iodepth up to max_iodepth per job, then more jobs up to max_numjobs.
+Report:
+    max_iops: the max IOPS point
+    knee:     the best latency at throughput, min p99 within gain of max IOPS
+    latency:  the deepest qd whose p99 still within gain of the min p99
+    curve:    all the points by qd
+"""
+
+logger = log.get_logger()
+
+SatPoint = namedtuple('SatPoint', ['qd', 'iodepth', 'numjobs', 'iops', 'mbps', 'avg', 'p50', 'p99'])  # ms
+SatResult = namedtuple('SatResult', ['max_iops', 'knee', 'latency', 'curve'])
+
+
+class SaturationSearch(object):
+    """iodepth/numjobs saturation search of a rw/bs on a device or dir"""
+
+    def __init__(self, fio, target, rw='randread', bs=4096, size=None, runtime='10s', ramp_time='2s',
+                 max_qd=1024, max_iodepth=256, max_numjobs=8, gain=0.05, max_runs=16):
+        """
+        :param fio: FIO instance, runs the points
+        :param target: device, or dir(data file in it)
+        :param rw: randread / randwrite / read / write ...
+        :param bs: I/O size
+        :param size: data size, None: by the device / dir free space
+        :param runtime: runtime per point
+        :param ramp_time: ramp time per point
+        :param max_qd: max iodepth x numjobs
+        :param max_iodepth: max iodepth per job, more jobs for a deeper qd
+        :param max_numjobs: max jobs
+        :param gain: IOPS gain below it is saturated, also the p99 / IOPS tolerance of the report points
+        :param max_runs: max fio runs
+        """
+        self.fio = fio
+        self.target = target
+        self.rw = rw
+        self.bs = bs
+        self.size = size
+        self.runtime = runtime
+        self.ramp_time = ramp_time
+        self.max_qd = max(max_qd, 1)
+        self.max_iodepth = max(max_iodepth, 1)
+        self.max_numjobs = max(max_numjobs, 1)
+        self.gain = gain
+        self.max_runs = max_runs
+        self.points = {}  # {qd: SatPoint}
+
+    @property
+    def data_size(self):
+        if self.size is None:
+            if os.path.isdir(self.target):
+                self.size = BlockDevice().bench_profile(path=self.target, numjobs=1).size
+            else:
+                self.size = BlockDevice().bench_profile(device=self.target).size
+        return self.size
+
+    def split(self, qd):
+        """qd -> (iodepth, numjobs)"""
+        numjobs = min(max(1, -(-qd // self.max_iodepth)), self.max_numjobs)
+        return -(-qd // numjobs), numjobs
+
+    def run_point(self, iodepth, numjobs):
+        """run fio at iodepth x numjobs, return (iops, MB/s, avg, p50, p99)"""
+        name = 'sat_{0}_{1}_qd{2}_j{3}'.format(self.rw, self.bs, iodepth, numjobs)
+        spec = JobSpec(name=name, rw=self.rw, bs=self.bs, iodepth=iodepth, numjobs=numjobs, size=self.data_size,
+                       ioengine='libaio', direct=1)
+        test = self.fio.matrix_tcs([spec], self.runtime, self.ramp_time, target=self.target, name=name)[0]
+        job = self.fio.run(test, record=False).jobs[0]  # not in the fio report, see self.report
+        ios = [io for io in (job.read, job.write) if io.total_ios or io.io_bytes]
+        iops = sum(io.iops for io in ios)
+        mbps = sum(io.bw_bytes for io in ios) / 1024 / 1024
+        avg = max([io.clat.mean for io in ios] or [0]) / 1e6
+        p50 = max([percentile(io.clat, 50) for io in ios] or [0]) / 1e6
+        p99 = max([percentile(io.clat, 99) for io in ios] or [0]) / 1e6
+        return iops, mbps, avg, p50, p99
+
+    def measure(self, qd):
+        """SatPoint of qd, each qd run once"""
+        iodepth, numjobs = self.split(qd)
+        qd = iodepth * numjobs
+        if qd not in self.points:
+            point = SatPoint(qd, iodepth, numjobs, *self.run_point(iodepth, numjobs))
+            logger.info('{0} {1}: qd {2}(iodepth {3} x numjobs {4}): {5:.1f} IOPS, p99 {6:.3f}ms'.format(
+                self.rw, self.bs, qd, iodepth, numjobs, point.iops, point.p99))
+            self.points[qd] = point
+        return self.points[qd]
+
+    def saturated(self, lower, upper):
+        """from lower to upper qd: the IOPS gain < gain and the p99 rise > gain"""
+        return upper.iops < lower.iops * (1 + self.gain) and upper.p99 > lower.p99 * (1 + self.gain)
+
+    def search(self):
+        """doubling then bisection, return SatResult"""
+        self.points = {}
+        last = self.measure(1)
+        qd = 2
+        while qd <= min(self.max_qd, self.max_iodepth * self.max_numjobs) and len(self.points) < self.max_runs:
+            point = self.measure(qd)
+            if self.saturated(last, point):
+                break
+            last = point
+            qd = point.qd * 2
+
+        # the first qd within gain of the max IOPS, between lo(below) and hi
+        target_iops = max(p.iops for p in self.points.values()) / (1 + self.gain)
+        reached = sorted(q for q, p in self.points.items() if p.iops >= target_iops)
+        hi = reached[0]
+        lo = max([q for q in self.points if q < hi] or [hi])
+        while hi - lo > max(1, lo // 8) and len(self.points) < self.max_runs:
+            mid = (lo + hi) // 2
+            point = self.measure(mid)
+            if point.qd in (lo, hi):  # split() rounded it to a measured qd
+                break
+            if point.iops >= target_iops:
+                hi = point.qd
+            else:
+                lo = point.qd
+        return self.result()
+
+    def result(self):
+        curve = [self.points[qd] for qd in sorted(self.points)]
+        max_iops = max(curve, key=lambda p: p.iops)
+        near_max = [p for p in curve if p.iops * (1 + self.gain) >= max_iops.iops]
+        knee = min(near_max, key=lambda p: (p.p99, p.qd))
+        min_p99 = min(p.p99 for p in curve)
+        latency = max([p for p in curve if p.p99 <= min_p99 * (1 + self.gain)], key=lambda p: p.qd)
+        return SatResult(max_iops, knee, latency, curve)
+
+    def report(self, result):
+        table = PrettyTable(['QD', 'iodepth', 'numjobs', 'IOPS', 'MB/s', 'avg(ms)', 'p50(ms)', 'p99(ms)', 'Point'])
+        for p in result.curve:
+            marks = [name for name, point in zip(('max IOPS', 'knee', 'latency'), result[:3]) if point is p]
+            table.add_row([p.qd, p.iodepth, p.numjobs, round(p.iops, 1), round(p.mbps, 2), round(p.avg, 3),
+                           round(p.p50, 3), round(p.p99, 3), ', '.join(marks)])
+        logger.info('Saturation {0} {1} {2}, {3} runs:\n{4}'.format(
+            self.target, self.rw, self.bs, len(result.curve), table))
+        return table
+
+
+class UnitTestCase(unittest.TestCase):
+    """saturation search test case"""
+
+    class ModelSearch(SaturationSearch):
+        """a device of 0.1ms at qd 1, 50000 IOPS max"""
+        def run_point(self, iodepth, numjobs):
+            qd = iodepth * numjobs
+            iops = min(qd / 0.0001, 50000.0)
+            lat = qd / iops * 1000
+            return iops, iops * 4096 / 1024 / 1024, lat, lat, lat * 1.5
+
+    def test_search(self):
+        search = self.ModelSearch(None, '/dev/null', max_iodepth=32, max_numjobs=4, size=1024 ** 3)
+        result = search.search()
+        search.report(result)
+        self.assertLessEqual(len(result.curve), search.max_runs)
+        self.assertEqual(result.max_iops.iops, 50000.0)
+        self.assertEqual(result.knee.qd, 5)
+        self.assertEqual(result.latency.qd, 5)
+        self.assertEqual([p.qd for p in result.curve][:5], [1, 2, 4, 5, 6])
+        lower = SatPoint(4, 4, 1, 1000.0, 4.0, 1.0, 1.0, 1.0)
+        self.assertFalse(search.saturated(lower, lower._replace(qd=8, iodepth=8)))  # p99 flat: not loaded yet
+        self.assertTrue(search.saturated(lower, lower._replace(qd=8, iodepth=8, iops=1010.0, p99=2.0)))
+        self.assertFalse(search.saturated(lower, lower._replace(qd=8, iodepth=8, iops=1500.0, p99=2.0)))
+        self.assertEqual(search.split(64), (32, 2))
+        self.assertEqual(search.split(1000), (250, 4))
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,201 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : steady_state.py
+@Time  : 2020/12/15 15:20
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import glob
+import time
+import shlex
+import signal
+import subprocess
+import unittest
+from collections import namedtuple
+
+from storagetest.libs import log
+
+"""
+Steady state
+=============
+SNIA PTS style steady state of a time series(fio --write_iops_log /
+--write_bw_log with --log_avg_msec, or the samples of any other tool):
+    - the samples are averaged into rounds of round_samples
+    - the last window rounds are the measurement window, steady if:
+        data excursion:  max - min    <= excursion * the window average
+        slope excursion: |slope| x (window - 1) of the least squares line
+                                      <= slope * the window average
+run_until_steady runs fio, polls its log and stops it(SIGINT, fio still
+writes the results) once steady, or let it run to the end and flag it.
+"""
+
+logger = log.get_logger()
+
+SSCheck = namedtuple('SSCheck', ['steady', 'rounds', 'average', 'excursion', 'slope', 'elapsed'])
+
+
+def least_squares_slope(values):
+    n = len(values)
+    if n < 2:
+        return 0.0
+    x_mean = (n - 1) / 2.0
+    y_mean = sum(values) / float(n)
+    num = sum((x - x_mean) * (y - y_mean) for x, y in enumerate(values))
+    den = sum((x - x_mean) ** 2 for x in range(n))
+    return num / den
+
+
+def read_fio_log(log_prefix, metric='iops', log_avg_msec=1000):
+    """
+    the fio log samples of all the jobs({log_prefix}_{metric}.N.log), summed per interval
+    lines: time(ms), value, direction, bs, offset[, priority]
+    :return: [value per interval], up to the interval every job logged
+    """
+    series = []
+    for log_path in glob.glob('{0}_{1}.*log'.format(log_prefix, metric)):
+        samples = {}
+        with open(log_path) as f:
+            for line in f:
+                fields = line.split(',')
+                if len(fields) < 2:
+                    continue
+                try:
+                    idx = int(round(int(fields[0]) / float(log_avg_msec)))
+                    samples[idx] = samples.get(idx, 0) + int(fields[1])
+                except ValueError:  # a partly written line
+                    continue
+        if samples:
+            series.append(samples)
+    if not series:
+        return []
+    last = min(max(samples) for samples in series)
+    first = min(min(samples) for samples in series)
+    return [sum(samples.get(idx, 0) for samples in series) for idx in range(first, last + 1)]
+
+
+class SteadyState(object):
+    """SNIA PTS style steady state rule"""
+
+    def __init__(self, metric='iops', window=5, round_samples=10, excursion=0.2, slope=0.1, log_avg_msec=1000,
+                 max_runtime='30m'):
+        """
+        :param metric: iops / bw, the fio log
+        :param window: rounds in the measurement window
+        :param round_samples: samples(log intervals) per round
+        :param excursion: max data excursion, ratio of the window average
+        :param slope: max slope excursion over the window, ratio of the window average
+        :param log_avg_msec: fio log interval
+        :param max_runtime: fio runtime cap of a steady state run(time based tests)
+        """
+        self.metric = metric
+        self.window = max(window, 2)
+        self.round_samples = max(round_samples, 1)
+        self.excursion = excursion
+        self.slope = slope
+        self.log_avg_msec = log_avg_msec
+        self.max_runtime = max_runtime
+
+    @property
+    def fio_options(self):
+        return '--write_{0}_log={{0}} --log_avg_msec={1}'.format(self.metric, self.log_avg_msec)
+
+    def rounds(self, values):
+        n = len(values) // self.round_samples
+        return [sum(values[x * self.round_samples:(x + 1) * self.round_samples]) / float(self.round_samples)
+                for x in range(n)]
+
+    def check(self, values):
+        """SSCheck of the samples, the last window rounds"""
+        rounds = self.rounds(values)
+        elapsed = len(values) * self.log_avg_msec / 1000.0
+        window = rounds[-self.window:]
+        if len(window) < self.window:
+            return SSCheck(False, len(rounds), 0.0, 0.0, 0.0, elapsed)
+        average = sum(window) / float(len(window))
+        excursion = (max(window) - min(window)) / average if average else 0.0
+        slope = abs(least_squares_slope(window)) * (len(window) - 1) / average if average else 0.0
+        steady = average > 0 and excursion <= self.excursion and slope <= self.slope
+        return SSCheck(steady, len(rounds), average, excursion, slope, elapsed)
+
+
+def run_until_steady(command, log_prefix, steady_state, stop=True, output=None, poll=1.0, timeout=72000):
+    """
+    run the fio command with the steady_state log, SIGINT it once steady if stop
+    :param command: fio command
+    :param log_prefix: fio log file prefix
+    :param steady_state: SteadyState
+    :param stop: stop at steady state, False: just check(eg: the fill/precondition runs)
+    :param output: the file of the fio stdout/stderr
+    :param poll: seconds between the log checks
+    :param timeout: max seconds
+    :return: (rc, SSCheck)
+    """
+    for log_path in glob.glob('{0}_{1}.*log'.format(log_prefix, steady_state.metric)):
+        os.remove(log_path)
+    command = '{0} {1}'.format(command, steady_state.fio_options.format(log_prefix))
+    logger.info('Execute: {0}'.format(command))
+    start = time.time()
+    with open(output or os.devnull, 'a') as f:
+        f.write('{0}\n'.format(command))
+        f.flush()
+        proc = subprocess.Popen(shlex.split(command), stdout=f, stderr=subprocess.STDOUT)
+        check = SSCheck(False, 0, 0.0, 0.0, 0.0, 0.0)
+        stopped = None  # the SSCheck it stopped at
+        while proc.poll() is None:
+            time.sleep(poll)
+            check = steady_state.check(read_fio_log(log_prefix, steady_state.metric, steady_state.log_avg_msec))
+            if check.steady and stop and not stopped:
+                logger.info('Steady state after {0}s({1} rounds), stop: {2}'.format(check.elapsed, check.rounds,
+                                                                                   check))
+                proc.send_signal(signal.SIGINT)
+                stopped = check
+            if time.time() - start > timeout:
+                proc.kill()
+                raise Exception('Timeout {0}s: {1}'.format(timeout, command))
+        rc = proc.wait()
+    if stopped:
+        rc = 0 if rc in (0, 1, -signal.SIGINT, 128 + signal.SIGINT) else rc  # fio exit status on SIGINT
+        return rc, stopped
+    check = steady_state.check(read_fio_log(log_prefix, steady_state.metric, steady_state.log_avg_msec))
+    if not check.steady:
+        logger.warning('No steady state in {0}s({1} rounds): {2}'.format(check.elapsed, check.rounds, check))
+    return rc, check
+
+
+class UnitTestCase(unittest.TestCase):
+    """steady state test case"""
+
+    def test_check(self):
+        ss = SteadyState(window=5, round_samples=2)
+        warm = [1000 * (x + 1) for x in range(10)]  # still rising
+        self.assertFalse(ss.check(warm).steady)
+        flat = warm + [10000, 10100, 9900, 10050, 9950, 10000, 10020, 9980, 10010, 9990]
+        check = ss.check(flat)
+        self.assertTrue(check.steady)
+        self.assertEqual((check.rounds, check.elapsed), (10, 20.0))
+        self.assertAlmostEqual(check.average, 10000.0)
+        self.assertFalse(ss.check(flat[:-2] + [2000, 2000]).steady)  # excursion
+        self.assertFalse(ss.check(flat[:9]).steady)
+        self.assertAlmostEqual(least_squares_slope([1, 3, 5, 7]), 2.0)
+
+    def test_fio_log(self):
+        import tempfile
+        tmp_dir = tempfile.mkdtemp(dir='/var/tmp')
+        prefix = os.path.join(tmp_dir, 'job')
+        for n, rows in ((1, [(1000, 10), (2000, 12), (3000, 11)]), (2, [(1001, 5), (1999, 6)])):
+            with open('{0}_iops.{1}.log'.format(prefix, n), 'w') as f:
+                f.writelines('{0}, {1}, 1, 4096, 0\n'.format(t, v) for t, v in rows)
+        self.assertEqual(read_fio_log(prefix, 'iops'), [15, 18])
+        self.assertEqual(read_fio_log(prefix, 'bw'), [])
+        rc, check = run_until_steady('true', prefix, SteadyState(), poll=0.05)
+        self.assertEqual(rc, 0)
+        self.assertFalse(check.steady)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
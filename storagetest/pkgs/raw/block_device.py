@@ -0,0 +1,371 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : block_device.py
+@Time  : 2020/10/26 15:43
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import re
+import stat
+import time
+import fnmatch
+import unittest
+from collections import namedtuple
+from prettytable import PrettyTable
+
+from storagetest.libs import utils, log
+
+"""
+Block device inventory
+=======================
+Read /sys/block/*(/sys/class/block/* for the partitions) and
+/proc/self/mountinfo directly, no ls/mount/grep/awk processes:
+    DeviceInfo: size, logical/physical block size, rotational, scheduler,
+                nr_requests, max_sectors_kb, discard, io hints,
+                holders/slaves/partitions, mount points
+The inventory is cached(INVENTORY_TTL seconds, refresh=True or a
+mkfs/mount/umount by BlockDevice drops it).
+bench_profile sizes the benchmarks per device(iodepth by the queue, bs by the
+block size/io hints, the file size by the device/free space) instead of
+hard-coded iodepth/--size/--filesize.
+"""
+
+logger = log.get_logger()
+
+SYS_BLOCK = '/sys/block'
+SYS_CLASS_BLOCK = '/sys/class/block'
+MOUNTINFO = '/proc/self/mountinfo'
+INVENTORY_TTL = 60
+
+DeviceInfo = namedtuple('DeviceInfo', [
+    'name', 'path', 'dev', 'size', 'logical_block_size', 'physical_block_size', 'minimum_io_size',
+    'optimal_io_size', 'rotational', 'scheduler', 'nr_requests', 'max_sectors_kb', 'discard',
+    'discard_granularity', 'read_only', 'removable', 'model', 'parent', 'partitions', 'holders', 'slaves',
+    'mount_points'])
+MountInfo = namedtuple('MountInfo', ['mount_id', 'parent_id', 'dev', 'root', 'mount_point', 'options', 'fs_type',
+                                     'source', 'super_options'])
+BenchProfile = namedtuple('BenchProfile', ['iodepth_iops', 'iodepth_bw', 'iodepth_lat', 'bs_iops', 'bs_bw',
+                                           'size', 'numjobs', 'offset_increment'])
+
+_cache = {}  # {'inventory': (time, {name: DeviceInfo})}
+
+
+def _read_sys(path, default=''):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return default
+
+
+def _read_int(path, default=0):
+    try:
+        return int(_read_sys(path, default))
+    except ValueError:
+        return default
+
+
+def _unescape(field):
+    """mountinfo octal escapes: \\040(space) \\011(tab) \\012(newline) \\134(backslash)"""
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), field)
+
+
+def parse_mountinfo(mountinfo=MOUNTINFO):
+    """return the MountInfo list of /proc/self/mountinfo"""
+    mounts = []
+    with open(mountinfo) as f:
+        for line in f:
+            fields = line.split()
+            if ' - ' not in line or len(fields) < 10:
+                continue
+            sep = fields.index('-')
+            mounts.append(MountInfo(int(fields[0]), int(fields[1]), fields[2], _unescape(fields[3]),
+                                    _unescape(fields[4]), fields[5], fields[sep + 1], _unescape(fields[sep + 2]),
+                                    fields[sep + 3] if len(fields) > sep + 3 else ''))
+    return mounts
+
+
+def _device_info(name, mounts):
+    """DeviceInfo of /sys/class/block/<name>, a partition gets the queue of its disk"""
+    sys_path = os.path.realpath(os.path.join(SYS_CLASS_BLOCK, name))
+    is_partition = os.path.exists(os.path.join(sys_path, 'partition'))
+    disk_path = os.path.dirname(sys_path) if is_partition else sys_path
+    queue = os.path.join(disk_path, 'queue')
+    scheduler = _read_sys(os.path.join(queue, 'scheduler'))
+    selected = re.search(r'\[(.+?)\]', scheduler)
+    dev = _read_sys(os.path.join(sys_path, 'dev'))
+    partitions = [] if is_partition else sorted(
+        p for p in os.listdir(sys_path) if p.startswith(name) and os.path.exists(os.path.join(sys_path, p, 'partition')))
+    return DeviceInfo(
+        name=name,
+        path=os.path.join('/dev', name),
+        dev=dev,
+        size=_read_int(os.path.join(sys_path, 'size')) * 512,  # always in 512 bytes sectors
+        logical_block_size=_read_int(os.path.join(queue, 'logical_block_size'), 512),
+        physical_block_size=_read_int(os.path.join(queue, 'physical_block_size'), 512),
+        minimum_io_size=_read_int(os.path.join(queue, 'minimum_io_size'), 512),
+        optimal_io_size=_read_int(os.path.join(queue, 'optimal_io_size')),
+        rotational=_read_sys(os.path.join(queue, 'rotational')) == '1',
+        scheduler=selected.group(1) if selected else scheduler,
+        nr_requests=_read_int(os.path.join(queue, 'nr_requests'), 128),
+        max_sectors_kb=_read_int(os.path.join(queue, 'max_sectors_kb'), 512),
+        discard=_read_int(os.path.join(queue, 'discard_max_bytes')) > 0,
+        discard_granularity=_read_int(os.path.join(queue, 'discard_granularity')),
+        read_only=_read_sys(os.path.join(sys_path, 'ro')) == '1',
+        removable=_read_sys(os.path.join(disk_path, 'removable')) == '1',
+        model=_read_sys(os.path.join(disk_path, 'device', 'model')),
+        parent=os.path.basename(disk_path) if is_partition else '',
+        partitions=partitions,
+        holders=sorted(os.listdir(os.path.join(sys_path, 'holders'))) if os.path.isdir(
+            os.path.join(sys_path, 'holders')) else [],
+        slaves=sorted(os.listdir(os.path.join(sys_path, 'slaves'))) if os.path.isdir(
+            os.path.join(sys_path, 'slaves')) else [],
+        mount_points=[m.mount_point for m in mounts if m.dev == dev],
+    )
+
+
+def bench_profile(info=None, path=None, numjobs=4):
+    """
+    benchmark sizing of a device(DeviceInfo) or a dir(free space):
+        iodepth: iops min(nr_requests, 256)(rotational 32), bandwidth min(nr_requests, 64), latency 4(rotational 1)
+        bs: iops max(4K, physical/minimum io size), bandwidth the optimal io size in [1M, max_sectors_kb]
+        size: the device size, or 80% of the dir free space(max 10G per job)
+    :param info: DeviceInfo, None: default queue
+    :param path: dir for the file benchmarks
+    :param numjobs: parallel jobs of the bandwidth tests
+    :return: BenchProfile, sizes in bytes
+    """
+    nr_requests = info.nr_requests if info else 128
+    rotational = info.rotational if info else False
+    mib = 1024 * 1024
+    bs_iops = max(4096, info.physical_block_size, info.minimum_io_size) if info else 4096
+    bs_bw = mib
+    if info:
+        bs_bw = min(max(info.optimal_io_size, mib), max(info.max_sectors_kb * 1024, bs_iops))
+        bs_bw -= bs_bw % bs_iops
+    if path is not None:
+        st = os.statvfs(path)
+        size = min(st.f_bavail * st.f_frsize * 8 // 10 // numjobs, 10 * 1024 * mib)
+    else:
+        size = info.size if info else 10 * 1024 * mib
+    size -= size % mib
+    return BenchProfile(
+        iodepth_iops=min(nr_requests, 32 if rotational else 256),
+        iodepth_bw=min(nr_requests, 64),
+        iodepth_lat=1 if rotational else 4,
+        bs_iops=bs_iops,
+        bs_bw=bs_bw,
+        size=size,
+        numjobs=numjobs,
+        offset_increment=size // numjobs // mib * mib,
+    )
+
+
+class BlockDevice(object):
+    """block device related ops"""
+
+    def __init__(self):
+        super(BlockDevice, self).__init__()
+        pass
+
+    @staticmethod
+    def refresh():
+        """drop the cached inventory"""
+        _cache.pop('inventory', None)
+
+    @staticmethod
+    def inventory(refresh=False):
+        """
+        all the block devices(disks and partitions)
+        :param refresh: re-read sysfs even if cached
+        :return: {name: DeviceInfo}
+        """
+        cached = _cache.get('inventory')
+        if not refresh and cached and time.time() - cached[0] < INVENTORY_TTL:
+            return cached[1]
+        devices = {}
+        if os.path.isdir(SYS_CLASS_BLOCK):
+            mounts = parse_mountinfo() if os.path.isfile(MOUNTINFO) else []
+            for name in sorted(os.listdir(SYS_CLASS_BLOCK)):
+                devices[name] = _device_info(name, mounts)
+        _cache['inventory'] = (time.time(), devices)
+        return devices
+
+    def device_info(self, device, refresh=False):
+        """
+        DeviceInfo of a device path(/dev/sdb, /dev/disk/by-id/..., /dev/sdb1) or name(sdb)
+        :return: None if not a block device
+        """
+        path = os.path.realpath(device if device.startswith('/') else os.path.join('/dev', device))
+        inventory = self.inventory(refresh)
+        info = inventory.get(os.path.basename(path))
+        if info is None and os.path.exists(path) and stat.S_ISBLK(os.stat(path).st_mode):
+            rdev = os.stat(path).st_rdev
+            dev = '{0}:{1}'.format(os.major(rdev), os.minor(rdev))
+            info = next((i for i in inventory.values() if i.dev == dev), None)
+        return info
+
+    def bench_profile(self, device=None, path=None, numjobs=4):
+        """BenchProfile of a device, or of a dir(the free space, the queue of the device it on), see bench_profile"""
+        if device:
+            profile = bench_profile(self.device_info(device), None, numjobs)
+        else:
+            exist_path = path
+            while not os.path.exists(exist_path):  # not created yet
+                exist_path = os.path.dirname(exist_path)
+            profile = bench_profile(self.device_info_of_path(exist_path), exist_path, numjobs)
+        logger.info('Benchmark profile of {0}: {1}'.format(device or path, profile))
+        return profile
+
+    def device_info_of_path(self, path):
+        """DeviceInfo of the block device a file/dir on, None if not on a block device(tmpfs, nfs ...)"""
+        st_dev = os.stat(path).st_dev
+        dev = '{0}:{1}'.format(os.major(st_dev), os.minor(st_dev))
+        return next((i for i in self.inventory().values() if i.dev == dev), None)
+
+    def inventory_table(self, devices=None):
+        """return a PrettyTable of the inventory"""
+        table = PrettyTable(['Name', 'Size(GB)', 'LBS', 'PBS', 'Rota', 'Sched', 'NR_Req', 'MaxKB', 'Discard',
+                             'Parent', 'Holders', 'Mount'])
+        table.align['Mount'] = 'l'
+        for info in (devices or self.inventory().values()):
+            table.add_row([info.name, round(info.size / 1024 ** 3, 2), info.logical_block_size,
+                           info.physical_block_size, int(info.rotational), info.scheduler, info.nr_requests,
+                           info.max_sectors_kb, int(info.discard), info.parent, ','.join(info.holders),
+                           ','.join(info.mount_points)])
+        return table
+
+    def _mknod_device(self, device):
+        """
+        mknod /dev/dpl1 b 44 16
+        :param device:
+        :return:
+        """
+
+        minor = int(re.search(r'\d+$', device).group())*16
+        cmd = 'mknod {0} b 44 {1}'.format(device, minor)
+        rc, output = utils.run_cmd(cmd, expected_rc=0)
+        logger.info(output)
+        return rc
+
+    def get_all_devices(self, pattern='/dev/*'):
+        device_list = [info.path for info in self.inventory().values() if fnmatch.fnmatch(info.path, pattern)]
+        logger.info(' '.join(device_list))
+        return device_list
+
+    def _is_path_exist(self, path):
+        if not os.path.exists(path):
+            logger.warning('{0}: No such file or directory'.format(path))
+            return False
+        return True
+
+    def _validate_device(self, device):
+        if not self._is_path_exist(device):
+            self._mknod_device(device)
+
+    def _validate_directory(self, directory):
+        if not self._is_path_exist(directory):
+            logger.info('Create a new one')
+            os.makedirs(directory, exist_ok=True)
+
+    def mkfs_filesystem(self, device, types='ext4',
+                        options='-F -b4096 -E nodiscard'):
+        """
+        Make a Linux filesystem.
+        :param device:explicitly specifies device path, eg: /dev/dpl1
+        :param types:
+        :param options:
+        :return:
+        """
+
+        # mkfs.ext4 -F -b4096 -E nodiscard /dev/dpl1
+        cmd = 'mkfs.{0} {1} {2}'.format(types, options, device)
+        rc, output = utils.run_cmd(cmd, expected_rc=0)
+        logger.info(output)
+        self.refresh()
+        return rc
+
+    def mount_fs(self, source, target, types, options='discard'):
+        """
+        mount a filesystem.
+        :param source:explicitly specifies source (path, label, uuid)
+        :param target:explicitly specifies mountpoint
+        :param types:<-t> limit the set of filesystem types
+        :param options:<-o> comma-separated list of mount options
+        :return:
+        """
+
+        # if the mount point path not exist, will create a new one
+        self._validate_directory(target)
+        cmd = 'mount -t %s -o %s %s %s ' % (types, options, source, target)
+        rc, output = utils.run_cmd(cmd, expected_rc=0, tries=3)
+        logger.info(output)
+        self.refresh()
+        return rc
+
+    def umount_fs(self, path, options=''):
+        """
+        Unmount filesystems.
+        :param path:explicitly <source> | <directory>
+        :param options: eg:-a -l -f, details FYI: umount -h
+        :return:
+        """
+
+        cmd = 'umount {0} {1}'.format(options, path)
+        rc, output = utils.run_cmd(cmd, expected_rc=0, tries=3)
+        logger.info(output)
+        self.refresh()
+        return rc
+
+    def get_mount_point(self, source, target, types='ext4'):
+        """
+        Get the mount point by source and types
+        :param source:
+        :param target:
+        :param types:
+        :return:
+        """
+
+        mount_points = [m.mount_point for m in parse_mountinfo()
+                        if source in m.source and target in m.mount_point and types in m.fs_type]
+        return '\n'.join(mount_points)
+
+
+class UnitTestCase(unittest.TestCase):
+    """block device test case"""
+
+    @unittest.skipUnless(os.path.isdir(SYS_CLASS_BLOCK), "No sysfs!")
+    def test_inventory(self):
+        bd = BlockDevice()
+        inventory = bd.inventory(refresh=True)
+        self.assertIs(bd.inventory(), inventory)
+        logger.info('\n{0}'.format(bd.inventory_table()))
+        root = next(m for m in parse_mountinfo() if m.mount_point == '/')
+        info = bd.device_info_of_path('/')
+        if info is not None:
+            self.assertIn('/', info.mount_points)
+            self.assertEqual(bd.get_mount_point(root.source, '/', root.fs_type).split('\n')[0], '/')
+            self.assertGreater(info.size, 0)
+            self.assertEqual(bd.device_info(info.path), info)
+            self.assertIn(info.path, bd.get_all_devices())
+        self.assertIsNone(bd.device_info('/dev/null'))
+
+    def test_profile(self):
+        info = DeviceInfo('sdx', '/dev/sdx', '8:16', 4 * 1024 ** 4, 512, 4096, 4096, 0, True, 'mq-deadline', 64, 1280,
+                          False, 0, False, False, '', '', [], [], [], [])
+        profile = bench_profile(info)
+        self.assertEqual((profile.iodepth_iops, profile.iodepth_bw, profile.iodepth_lat), (32, 64, 1))
+        self.assertEqual((profile.bs_iops, profile.bs_bw, profile.size), (4096, 1024 * 1024, 4 * 1024 ** 4))
+        self.assertEqual(profile.offset_increment, 1024 ** 4)
+        profile = bench_profile(info._replace(rotational=False, nr_requests=1024, optimal_io_size=4 * 1024 * 1024))
+        self.assertEqual((profile.iodepth_iops, profile.bs_bw), (256, 1280 * 1024))
+        self.assertLessEqual(bench_profile(path='/tmp').size, 10 * 1024 ** 3)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
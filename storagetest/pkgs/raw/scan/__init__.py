@@ -0,0 +1,21 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : __init__.py.py
+@Time  : 2020/12/8 10:05
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+from .lba_scan import *
+from .align_scan import *
+__all__ = ['LBAScan', 'AlignScan']
+
+"""
+Raw device scans
+=================
+Benchmarks across the address space / I/O geometry of a raw device.
+"""
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,380 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : align_scan.py
+@Time  : 2020/12/9 10:15
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import csv
+import mmap
+import stat
+import time
+import errno
+import random
+import unittest
+from collections import namedtuple
+from prettytable import PrettyTable
+
+from storagetest.libs.log import log
+from storagetest.libs.latency import LatencyStats
+from storagetest.libs.heatmap import svg_heatmap
+from storagetest.libs.cache_control import fadvise_dontneed
+from storagetest.libs.exceptions import PlatformError, NoSuchDir
+from storagetest.pkgs.raw.block_device import BlockDevice
+
+"""
+I/O alignment penalty matrix
+=============================
+Sweep the I/O start offset(0, 512, 4K-512, 4K, 64K, 1M past a 4M boundary)
+against the I/O size(512 - 1M), O_DIRECT and buffered, read and write, on a
+raw device or a file(a test file created under a directory):
+    read:  random positions, cold cache(fadvise DONTNEED before the cell,
+           POSIX_FADV_RANDOM), buffered or O_DIRECT
+    write: random positions, O_DIRECT or buffered + fdatasync per I/O
+A cell visits each position(slot) at most once, so a buffered read never
+hits a page an earlier I/O of the cell cached: max_ios is capped at the
+slots of the span.
+Each cell reports ops, p50/p99 latency and MB/s. A cell is flagged(RMW for
+writes, the read-modify-write signature of a partial block, split for reads)
+if it is slower by rmw_factor than:
+    - the aligned(offset 0) cell of the same op/mode/size, or
+    - an aligned cell: the next larger unflagged size at offset 0, a smaller
+      I/O costs no more per I/O unless it is below the device granularity
+The smallest tested alignment(some offset aligned to it but not to twice it)
+with no flagged cell is the device's real alignment/granularity, whatever
+/sys/block/*/queue says. O_DIRECT cells the kernel rejects(EINVAL) are
+reported as unsupported.
+"""
+
+logger = log.get_logger()
+
+OFFSETS = (0, 512, 4096 - 512, 4096, 64 * 1024, 1024 * 1024)
+SIZES = tuple(512 << x for x in range(12))  # 512 - 1M
+MODES = ('direct', 'buffered')
+SLOT = 4 * 1024 * 1024  # I/O at slot * SLOT + offset, > max offset + max size
+
+AlignResult = namedtuple('AlignResult', ['op', 'mode', 'offset', 'size', 'ios', 'avg', 'p50', 'p99', 'mbps',
+                                         'ratio', 'flag'])
+
+
+def size_str(n):
+    for unit, shift in (('M', 20), ('K', 10)):
+        if n >= 1 << shift and n % (1 << shift) == 0:
+            return '{0}{1}'.format(n >> shift, unit)
+    return str(n)
+
+
+class AlignScan(object):
+    """Throughput / latency penalty of misaligned I/O on a raw device or a file"""
+
+    def __init__(self, path, offsets=OFFSETS, sizes=SIZES, modes=MODES, write=False, cell_time=0.2, max_ios=2000,
+                 span=1024*1024*1024, rmw_factor=1.5, output=None):
+        """
+        :param path: raw device / file, or a dir to create the test file(span bytes) in
+        :param offsets: I/O start offsets past the slot boundary
+        :param sizes: I/O sizes
+        :param modes: direct / buffered
+        :param write: also the write cells, destroys the device data
+        :param cell_time: max seconds per cell
+        :param max_ios: max I/Os per cell, capped at the slots(span // 4M - 1)
+        :param span: bytes of the device/file used
+        :param rmw_factor: flag a cell slower than the aligned cell by the factor(p50 latency)
+        :param output: dir for the CSV/SVG, None: no file
+        """
+        self.path = path
+        self.offsets = offsets
+        self.sizes = sizes
+        self.modes = modes
+        self.ops = ('read', 'write') if write else ('read', )
+        self.cell_time = cell_time
+        self.max_ios = max_ios
+        self.span = span
+        self.rmw_factor = rmw_factor
+        self.output = output
+        self.results = []  # AlignResult list
+        self.unsupported = []  # [(op, mode, offset, size, error)]
+
+    def verify(self):
+        if os.name != "posix":
+            raise PlatformError("Just support for linux machine!")
+        if not os.path.exists(self.path):
+            raise NoSuchDir(self.path)
+
+    def _target(self):
+        """return the file/device to test, create/fill the test file if path is a dir"""
+        if not os.path.isdir(self.path):
+            return self.path
+        file_path = os.path.join(self.path, 'align_scan.dat')
+        if not os.path.isfile(file_path) or os.path.getsize(file_path) < self.span:
+            logger.info('Create test file {0}, {1} bytes'.format(file_path, self.span))
+            chunk = os.urandom(SLOT)
+            with open(file_path, 'wb') as f:
+                for _ in range(self.span // SLOT):
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        return file_path
+
+    def _open(self, target, mode):
+        flags = os.O_RDWR if 'write' in self.ops else os.O_RDONLY
+        if mode == 'direct':
+            flags |= os.O_DIRECT
+        fd = os.open(target, flags)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_RANDOM)
+        return fd
+
+    def cell(self, fd, target, op, mode, offset, size, slots, buf):
+        """run one cell, return LatencyStats, raise OSError if the I/O is rejected"""
+        fadvise_dontneed(target)
+        view = memoryview(buf)[:size]
+        rnd = random.Random(offset * 31 + size)
+        stats = LatencyStats('{0} {1}'.format(op, mode)).start()
+        deadline = time.perf_counter() + self.cell_time
+        try:
+            # without replacement: a slot read twice would come from the page cache
+            for slot in rnd.sample(range(slots), min(self.max_ios, slots)):
+                if time.perf_counter() >= deadline:
+                    break
+                pos = slot * SLOT + offset
+                start = time.perf_counter()
+                if op == 'read':
+                    n = os.preadv(fd, [view], pos)
+                else:
+                    n = os.pwrite(fd, view, pos)
+                    if mode == 'buffered':
+                        os.fdatasync(fd)
+                stats.add(time.perf_counter() - start)
+                if n != size:
+                    stats.add_error()
+        finally:
+            view.release()
+        return stats.stop()
+
+    def run(self):
+        """sweep all the cells, return the AlignResult list"""
+        self.verify()
+        target = self._target()
+        self.results, self.unsupported = [], []
+        fd = os.open(target, os.O_RDONLY)
+        try:
+            size = os.lseek(fd, 0, os.SEEK_END)
+            is_blk = stat.S_ISBLK(os.fstat(fd).st_mode)
+        finally:
+            os.close(fd)
+        slots = min(size, self.span) // SLOT - 1
+        if slots < 1:
+            raise Exception("{0}: {1} bytes too small, need > {2} bytes".format(target, size, 2 * SLOT))
+        info = BlockDevice().device_info(target) if is_blk else BlockDevice().device_info_of_path(target)
+        if info:
+            logger.info('{0} queue hints: logical {1}, physical {2}, minimum_io {3}, optimal_io {4}'.format(
+                info.path, info.logical_block_size, info.physical_block_size, info.minimum_io_size,
+                info.optimal_io_size))
+        logger.info('Alignment scan {0}({1}): {2} offsets x {3} sizes x {4} x {5}'.format(
+            target, 'block device' if is_blk else 'file', len(self.offsets), len(self.sizes),
+            '/'.join(self.modes), '/'.join(self.ops)))
+        with mmap.mmap(-1, max(self.sizes)) as buf:
+            buf.write(os.urandom(max(self.sizes)))
+            for mode in self.modes:
+                try:
+                    fd = self._open(target, mode)
+                except OSError as e:
+                    logger.warning('{0}: {1} not supported({2}), skip'.format(target, mode, e))
+                    continue
+                try:
+                    for op in self.ops:
+                        for offset in self.offsets:
+                            for io_size in self.sizes:
+                                try:
+                                    stats = self.cell(fd, target, op, mode, offset, io_size, slots, buf)
+                                except OSError as e:
+                                    if e.errno != errno.EINVAL:
+                                        raise
+                                    self.unsupported.append((op, mode, offset, io_size, errno.errorcode[e.errno]))
+                                    continue
+                                s = stats.summary((50, 99))
+                                self.results.append(AlignResult(
+                                    op, mode, offset, io_size, s['count'], s['avg'], s['p50'], s['p99'],
+                                    s['count'] * io_size / 1024 / 1024 / max(s['elapsed'], 1e-9), 1.0, ''))
+                finally:
+                    os.close(fd)
+        self.flag()
+        return self.results
+
+    def flag(self):
+        """set the penalty ratio(p50 / reference p50) and the RMW/split flags"""
+        flag_name = {'read': 'split', 'write': 'RMW'}
+        aligned = {}  # {(op, mode, size): the offset 0 cell}
+        for r in self.results:
+            if r.offset == 0:
+                aligned[(r.op, r.mode, r.size)] = r
+        # sub granularity sizes: the offset 0 cell slower than the next larger unflagged size
+        for idx, r in sorted(((idx, r) for idx, r in enumerate(self.results) if r.offset == 0),
+                             key=lambda x: -x[1].size):
+            refs = [a for a in aligned.values() if (a.op, a.mode) == (r.op, r.mode) and a.size > r.size and
+                    not a.flag and a.p50]
+            if not refs:
+                continue
+            ref = min(refs, key=lambda a: a.size)
+            ratio = r.p50 / ref.p50
+            if ratio >= self.rmw_factor:
+                self.results[idx] = aligned[(r.op, r.mode, r.size)] = r._replace(ratio=ratio, flag=flag_name[r.op])
+        # misaligned offsets: the cell slower than the offset 0 cell of the size
+        for idx, r in enumerate(self.results):
+            ref = aligned.get((r.op, r.mode, r.size))
+            if ref is None or not ref.p50 or r.offset == 0:
+                continue
+            ratio = r.p50 / ref.p50
+            flag = flag_name[r.op] if ratio >= self.rmw_factor else ''
+            self.results[idx] = r._replace(ratio=ratio, flag=flag)
+        return self.results
+
+    def alignments(self):
+        """the tested power of 2 alignments: some offset aligned to A but not to 2A, 0 -> the min size"""
+        aligns = set(o & -o for o in self.offsets if o)
+        return sorted(aligns | set([min(self.sizes)]))
+
+    def optimal_alignment(self, op, mode):
+        """the smallest tested alignment(see alignments) where no cell is flagged, None if no cell"""
+        results = [r for r in self.results if r.op == op and r.mode == mode]
+        if not results:
+            return None
+        unsupported = [u for u in self.unsupported if u[0] == op and u[1] == mode]
+        for align in self.alignments():
+            if any(r.flag and r.offset % align == 0 and r.size % align == 0 for r in results):
+                continue
+            if any(o % align == 0 and s % align == 0 for _, _, o, s, _ in unsupported):
+                continue
+            return align
+        return None
+
+    def matrix_table(self, op, mode):
+        """PrettyTable: a row per offset, a column per size, cell: MB/s(p50 ms) flag"""
+        cells = {(r.offset, r.size): r for r in self.results if r.op == op and r.mode == mode}
+        rejected = set((o, s) for p, m, o, s, _ in self.unsupported if p == op and m == mode)
+        table = PrettyTable(['Offset'] + [size_str(s) for s in self.sizes])
+        for offset in self.offsets:
+            row = [size_str(offset)]
+            for io_size in self.sizes:
+                r = cells.get((offset, io_size))
+                if r is None:
+                    row.append('EINVAL' if (offset, io_size) in rejected else '-')
+                else:
+                    row.append('{0:.1f}({1:.3f}){2}'.format(r.mbps, r.p50, ' ' + r.flag if r.flag else ''))
+            table.add_row(row)
+        return table
+
+    def to_csv(self, file_path):
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        with open(file_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(AlignResult._fields)
+            for r in self.results:
+                writer.writerow([round(v, 6) if isinstance(v, float) else v for v in r])
+            for op, mode, offset, io_size, error in self.unsupported:
+                writer.writerow([op, mode, offset, io_size, 0, '', '', '', '', '', error])
+        return file_path
+
+    def render(self, file_path):
+        """write the SVG heatmap of the penalty ratios, a row per (op, mode, offset)"""
+        row_names, rows = [], []
+        for op in self.ops:
+            for mode in self.modes:
+                cells = {(r.offset, r.size): r for r in self.results if r.op == op and r.mode == mode}
+                if not cells:
+                    continue
+                for offset in self.offsets:
+                    row_names.append('{0} {1} +{2}'.format(op, mode, size_str(offset)))
+                    rows.append([cells[(offset, s)].ratio if (offset, s) in cells else None for s in self.sizes])
+        title = 'Alignment penalty {0}: p50 latency / aligned p50'.format(self.path)
+        return svg_heatmap(file_path, row_names, [size_str(s) for s in self.sizes], rows, title=title)
+
+    def report(self):
+        """log the matrices / optimal alignments, write the CSV/SVG to output, return the files"""
+        summary = PrettyTable(['Op', 'Mode', 'Flagged', 'Unsupported', 'Alignment'])
+        for op in self.ops:
+            for mode in self.modes:
+                if not any(r.op == op and r.mode == mode for r in self.results):
+                    continue
+                logger.info('{0} {1}, MB/s(p50 ms):\n{2}'.format(op, mode, self.matrix_table(op, mode)))
+                align = self.optimal_alignment(op, mode)
+                summary.add_row([op, mode, sum(1 for r in self.results if r.op == op and r.mode == mode and r.flag),
+                                 sum(1 for u in self.unsupported if u[0] == op and u[1] == mode),
+                                 size_str(align) if align else 'n/a'])
+        logger.info('Alignment summary:\n{0}'.format(summary))
+        files = []
+        if self.output:
+            name = 'align_scan_{0}_{1}'.format(os.path.basename(self.path.rstrip('/')), time.strftime("%Y%m%d%H%M%S"))
+            files.append(self.to_csv(os.path.join(self.output, name + '.csv')))
+            files.append(self.render(os.path.join(self.output, name + '.svg')))
+            logger.info('Alignment scan report: {0}'.format(', '.join(files)))
+        return files
+
+    def benchmark(self):
+        self.run()
+        self.report()
+        return bool(self.results) and not any(r.ios == 0 for r in self.results)
+
+    def cleanup(self):
+        """remove the test file created under the dir path"""
+        file_path = os.path.join(self.path, 'align_scan.dat')
+        if os.path.isdir(self.path) and os.path.isfile(file_path):
+            os.remove(file_path)
+
+
+class UnitTestCase(unittest.TestCase):
+    """alignment scan test case"""
+
+    def test_scan(self):
+        import tempfile
+        tmp_dir = tempfile.mkdtemp(dir='/var/tmp')
+        scan = AlignScan(tmp_dir, sizes=(512, 4096, 65536), write=True, cell_time=0.02, max_ios=50,
+                         span=16 * SLOT, output=tmp_dir)
+        self.assertTrue(scan.benchmark())
+        cells = len(scan.results) + len(scan.unsupported)
+        self.assertEqual(cells, len(OFFSETS) * 3 * 2 * len(scan.ops))
+        self.assertTrue(all(r.ratio == 1.0 for r in scan.results if r.offset == 0 and not r.flag))
+        self.assertEqual(sorted(os.path.splitext(name)[1] for name in os.listdir(tmp_dir)), ['.csv', '.dat', '.svg'])
+        self.assertTrue(all(r.ios <= 15 for r in scan.results))  # each of the 15 slots once
+        scan.cleanup()
+        self.assertEqual(sorted(os.path.splitext(name)[1] for name in os.listdir(tmp_dir)), ['.csv', '.svg'])
+        self.assertEqual(AlignScan('/dev/null').ops, ('read', ))
+
+    def test_flag(self):
+        scan = AlignScan('/dev/null', sizes=(512, 4096))
+        scan.results = [AlignResult('write', 'direct', o, s, 10, 1, 2.0 if o % 4096 or s < 4096 else 1.0,
+                                    1, 1, 1.0, '') for o in OFFSETS for s in (512, 4096)]
+        scan.flag()
+        # 512 byte writes at offset 0 slower than the 4K writes: below the granularity
+        self.assertEqual([(r.offset, r.size) for r in scan.results if r.flag == 'RMW'],
+                         [(0, 512), (512, 4096), (3584, 4096)])
+        self.assertEqual(scan.optimal_alignment('write', 'direct'), 4096)
+        self.assertIsNone(scan.optimal_alignment('read', 'direct'))
+
+    def test_512e(self):
+        """a 512e device(4K physical): partial 4K writes read-modify-write, reads not penalized"""
+        scan = AlignScan('/dev/null')
+        self.assertEqual(scan.alignments(), [512, 4096, 65536, 1024 * 1024])
+        scan.results = []
+        for op in ('read', 'write'):
+            for o in OFFSETS:
+                for s in SIZES:
+                    p50 = 0.1 + s / 1e6
+                    if op == 'write' and (o % 4096 or s < 4096):
+                        p50 *= 3
+                    scan.results.append(AlignResult(op, 'direct', o, s, 10, p50, p50, p50, 1, 1.0, ''))
+        scan.flag()
+        rmw = [r for r in scan.results if r.flag]
+        self.assertEqual(sorted(set(r.size for r in rmw if r.offset == 0)), [512, 1024, 2048])
+        self.assertEqual(sorted(set(r.offset for r in rmw if r.size >= 4096)), [512, 3584])
+        self.assertTrue(all(r.op == 'write' for r in rmw))
+        self.assertEqual(scan.optimal_alignment('write', 'direct'), 4096)
+        self.assertEqual(scan.optimal_alignment('read', 'direct'), 512)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
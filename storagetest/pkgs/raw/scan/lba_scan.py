@@ -0,0 +1,259 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : lba_scan.py
+@Time  : 2020/12/8 10:36
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import csv
+import time
+import random
+import threading
+import unittest
+from collections import namedtuple
+from prettytable import PrettyTable
+
+from storagetest.libs.log import log
+from storagetest.libs.latency import LatencyStats
+from storagetest.libs.heatmap import text_heatmap, svg_heatmap
+from storagetest.libs.exceptions import PlatformError, NoSuchDir
+from storagetest.pkgs.raw.ut.raw_io import AlignedBuffer, RawDevice
+
+"""
+LBA region scan
+================
+The device is divided into N equal regions, each region is sampled by every
+pattern(random / sequential, read / optional write) for a bounded time, and
+the region x metric matrix(p50 / p99 latency, MB/s) is reported:
+    CSV:     one row per (region, pattern)
+    SVG:     heatmap, a row per (pattern, metric), a column per region
+    log:     the text heatmap and the regions far off the median(slow zones:
+             SMR bands, thin provisioned / remapped areas, inner tracks)
+The I/O is O_DIRECT(buffered if not supported), the write patterns destroy
+the data on the device.
+"""
+
+logger = log.get_logger()
+
+READ_PATTERNS = ('randread', 'seqread')
+WRITE_PATTERNS = ('randwrite', 'seqwrite')
+METRICS = ('p50(ms)', 'p99(ms)', 'MB/s')
+
+RegionResult = namedtuple('RegionResult', ['region', 'start', 'end', 'pattern', 'bs', 'ios', 'bytes', 'elapsed',
+                                           'avg', 'p50', 'p99', 'mbps'])
+
+
+class LBAScan(object):
+    """Latency / throughput heatmap across the LBA regions of a raw device"""
+
+    def __init__(self, device, regions=64, region_time=1.0, rand_bs=4096, seq_bs=1024*1024, iodepth=1,
+                 write=False, output=None):
+        """
+        :param device: device path
+        :param regions: number of regions
+        :param region_time: seconds per region per pattern
+        :param rand_bs: random I/O size
+        :param seq_bs: sequential I/O size
+        :param iodepth: I/Os in flight(threads) per pattern
+        :param write: also randwrite/seqwrite, destroys the device data
+        :param output: dir for the CSV/SVG, None: no file
+        """
+        self.device = device
+        self.regions = regions
+        self.region_time = region_time
+        self.rand_bs = rand_bs
+        self.seq_bs = seq_bs
+        self.iodepth = max(iodepth, 1)
+        self.patterns = READ_PATTERNS + WRITE_PATTERNS if write else READ_PATTERNS
+        self.output = output
+        self.results = []  # RegionResult list
+
+    def verify(self):
+        if os.name != "posix":
+            raise PlatformError("Just support for linux machine!")
+        if not os.path.exists(self.device):
+            raise NoSuchDir(self.device)
+        if self.regions < 1:
+            raise Exception("regions must be >= 1")
+
+    def region_bounds(self, size):
+        """return [(start, end)] of the regions, aligned to seq_bs"""
+        region_size = size // self.regions // self.seq_bs * self.seq_bs
+        if region_size < self.seq_bs:
+            raise Exception("{0}: {1} bytes too small for {2} regions of >= {3} bytes".format(
+                self.device, size, self.regions, self.seq_bs))
+        return [(idx * region_size, (idx + 1) * region_size) for idx in range(self.regions)]
+
+    def _worker(self, dev, pattern, start, end, bs, deadline, cursor, stats, seed):
+        buf = AlignedBuffer(bs)
+        rnd = random.Random(seed)
+        if 'write' in pattern:
+            buf.load(os.urandom(bs))
+        view = buf.view[:bs]
+        blocks = (end - start) // bs
+        offset = start
+        latencies = []
+        try:
+            while time.perf_counter() < deadline:
+                if pattern.startswith('rand'):
+                    offset = start + rnd.randrange(blocks) * bs
+                else:
+                    with cursor['lock']:
+                        offset = cursor['offset']
+                        cursor['offset'] = offset + bs if offset + bs < end else start
+                t = time.perf_counter()
+                if 'write' in pattern:
+                    n = dev.pwrite(view, offset)
+                else:
+                    n = dev.pread(view, offset)
+                latencies.append(time.perf_counter() - t)
+                if n != bs:
+                    stats.add_error()
+        except Exception as e:
+            logger.error('{0}: {1} at offset {2}: {3}'.format(self.device, pattern, offset, e))
+            stats.add_error()
+        finally:
+            stats.extend(latencies)
+            view.release()
+            buf.close()
+
+    def sample(self, dev, region, start, end, pattern):
+        """run pattern in [start, end) for region_time seconds, return RegionResult"""
+        bs = self.rand_bs if pattern.startswith('rand') else self.seq_bs
+        stats = LatencyStats(pattern).start()
+        cursor = {'offset': start, 'lock': threading.Lock()}
+        deadline = time.perf_counter() + self.region_time
+        threads = [threading.Thread(target=self._worker, daemon=True,
+                                    args=(dev, pattern, start, end, bs, deadline, cursor, stats, region * 1000 + x))
+                   for x in range(self.iodepth)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats.stop()
+        s = stats.summary((50, 99))
+        return RegionResult(region, start, end, pattern, bs, s['count'], s['count'] * bs, s['elapsed'],
+                            s['avg'], s['p50'], s['p99'], s['count'] * bs / 1024 / 1024 / max(s['elapsed'], 1e-9))
+
+    def run(self):
+        """scan all the regions, return the RegionResult list"""
+        self.verify()
+        self.results = []
+        with RawDevice(self.device) as dev:
+            bounds = self.region_bounds(dev.size)
+            logger.info('LBA scan {0}: {1} regions of {2} bytes, {3}, {4}s per region per pattern'.format(
+                self.device, len(bounds), bounds[0][1], '/'.join(self.patterns), self.region_time))
+            for region, (start, end) in enumerate(bounds):
+                for pattern in self.patterns:
+                    result = self.sample(dev, region, start, end, pattern)
+                    logger.debug('region {0}: {1} {2} ios, p99 {3:.3f}ms, {4:.2f}MB/s'.format(
+                        region, pattern, result.ios, result.p99, result.mbps))
+                    self.results.append(result)
+        return self.results
+
+    def matrix(self):
+        """return (row_names, [[value per region] per (pattern, metric)], bad_high per row)"""
+        row_names, rows, bad_high = [], [], []
+        for pattern in self.patterns:
+            by_region = {r.region: r for r in self.results if r.pattern == pattern}
+            for metric, field in zip(METRICS, ('p50', 'p99', 'mbps')):
+                row_names.append('{0} {1}'.format(pattern, metric))
+                rows.append([getattr(by_region[idx], field) if idx in by_region and by_region[idx].ios else None
+                             for idx in range(self.regions)])
+                bad_high.append(field != 'mbps')
+        return row_names, rows, bad_high
+
+    def anomalies(self, factor=2.0):
+        """
+        the regions off the pattern median: p99 > factor * median p99 or MB/s < median MB/s / factor
+        :return: [(RegionResult, reason)]
+        """
+        found = []
+        for pattern in self.patterns:
+            results = [r for r in self.results if r.pattern == pattern and r.ios]
+            if not results:
+                continue
+            p99s = sorted(r.p99 for r in results)
+            mbps = sorted(r.mbps for r in results)
+            median_p99, median_mbps = p99s[len(p99s) // 2], mbps[len(mbps) // 2]
+            for r in results:
+                if r.p99 > median_p99 * factor:
+                    found.append((r, 'p99 {0:.3f}ms > {1}x median {2:.3f}ms'.format(r.p99, factor, median_p99)))
+                elif r.mbps < median_mbps / factor:
+                    found.append((r, '{0:.2f}MB/s < median {1:.2f}MB/s / {2}'.format(r.mbps, median_mbps, factor)))
+        return found
+
+    def to_csv(self, file_path):
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        with open(file_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(RegionResult._fields)
+            for r in self.results:
+                writer.writerow([round(v, 6) if isinstance(v, float) else v for v in r])
+        return file_path
+
+    def render(self, file_path):
+        """write the SVG heatmap"""
+        row_names, rows, bad_high = self.matrix()
+        col_names = ['{0}G'.format(round(start / 1024 ** 3, 1)) for start in sorted(set(r.start for r in self.results))]
+        title = 'LBA scan {0}: {1} regions, {2}s per region per pattern'.format(
+            self.device, self.regions, self.region_time)
+        return svg_heatmap(file_path, row_names, col_names, rows, bad_high, title)
+
+    def report(self):
+        """log the heatmap / anomalies, write the CSV/SVG to output, return the files"""
+        row_names, rows, bad_high = self.matrix()
+        logger.info('LBA heatmap, region 0 - {0}(left to right):\n{1}'.format(
+            self.regions - 1, text_heatmap(row_names, rows, bad_high)))
+        anomalies = self.anomalies()
+        if anomalies:
+            table = PrettyTable(['Region', 'Start', 'End', 'Pattern', 'Reason'])
+            table.align['Reason'] = 'l'
+            for r, reason in anomalies:
+                table.add_row([r.region, r.start, r.end, r.pattern, reason])
+            logger.warning('Slow regions:\n{0}'.format(table))
+        files = []
+        if self.output:
+            name = 'lba_scan_{0}_{1}'.format(os.path.basename(self.device), time.strftime("%Y%m%d%H%M%S"))
+            files.append(self.to_csv(os.path.join(self.output, name + '.csv')))
+            files.append(self.render(os.path.join(self.output, name + '.svg')))
+            logger.info('LBA scan report: {0}'.format(', '.join(files)))
+        return files
+
+    def benchmark(self):
+        self.run()
+        self.report()
+        return not any(r.ios == 0 for r in self.results)
+
+
+class UnitTestCase(unittest.TestCase):
+    """lba scan test case"""
+
+    def test_scan(self):
+        import tempfile
+        tmp_dir = tempfile.mkdtemp(dir='/var/tmp')
+        dev_path = os.path.join(tmp_dir, 'dev.img')
+        with open(dev_path, 'wb') as f:
+            f.truncate(64 * 1024 * 1024)
+        scan = LBAScan(dev_path, regions=8, region_time=0.05, seq_bs=256 * 1024, iodepth=2, write=True,
+                       output=tmp_dir)
+        self.assertTrue(scan.benchmark())
+        self.assertEqual(len(scan.results), 8 * 4)
+        self.assertEqual(scan.results[-1].end, 64 * 1024 * 1024)
+        row_names, rows, _ = scan.matrix()
+        self.assertEqual((len(row_names), len(rows[0])), (4 * 3, 8))
+        files = sorted(os.listdir(tmp_dir), key=lambda name: os.path.splitext(name)[1])
+        self.assertEqual([os.path.splitext(name)[1] for name in files], ['.csv', '.img', '.svg'])
+        with open(os.path.join(tmp_dir, files[0])) as f:
+            self.assertEqual(len(f.readlines()), 1 + 8 * 4)
+        self.assertRaises(Exception, LBAScan(dev_path, regions=1024, seq_bs=1024 * 1024).region_bounds,
+                          64 * 1024 * 1024)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,284 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : raw_io.py
+@Time  : 2020/12/3 10:26
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import mmap
+import stat
+import time
+import fcntl
+import queue
+import threading
+import unittest
+
+from storagetest.libs.log import log
+from storagetest.libs.latency import LatencyStats, stats_table, histogram_table
+
+"""
+In-process raw block I/O
+=========================
+The device is opened once(O_DIRECT + buffered), the I/O is issued by
+os.pwrite/os.preadv at the computed offsets with page aligned, reusable
+mmap buffers, and verified in memory, no dd process and no temp files.
+An I/O not aligned to the logical block size can not go O_DIRECT, it goes
+the buffered fd and is synced, same as dd does for a partial block.
+QueueDepthEngine keeps exactly iodepth I/Os in flight: iodepth workers, each
+owns its buffers and takes the next (offset, data) task from a bounded queue.
+"""
+
+logger = log.get_logger()
+
+BLKSSZGET = 0x1268  # ioctl: logical block size
+DEFAULT_ALIGN = 4096
+
+
+def round_up(n, align):
+    return (n + align - 1) // align * align
+
+
+def logical_block_size(fd):
+    """logical block size of a block device, DEFAULT_ALIGN for other files"""
+    if stat.S_ISBLK(os.fstat(fd).st_mode):
+        try:
+            return int.from_bytes(fcntl.ioctl(fd, BLKSSZGET, b'\0' * 4), 'little')
+        except OSError:
+            pass
+    return DEFAULT_ALIGN
+
+
+class AlignedBuffer(object):
+    """page aligned(mmap anonymous) reusable buffer"""
+
+    def __init__(self, size, align=DEFAULT_ALIGN):
+        self.size = size
+        self.mm = mmap.mmap(-1, max(round_up(size, align), align))
+        self.view = memoryview(self.mm)
+
+    def load(self, data):
+        """copy data into the buffer head, return the length"""
+        self.view[:len(data)] = data
+        return len(data)
+
+    def read(self, n):
+        """return a bytes copy of the buffer head"""
+        return self.mm[:n]
+
+    def close(self):
+        self.view.release()
+        self.mm.close()
+
+
+class RawDevice(object):
+    """A raw device(or file) opened once for pwrite/pread"""
+
+    def __init__(self, path, direct=True):
+        """
+        :param path: device path
+        :param direct: open an O_DIRECT fd too
+        """
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR)
+        self.align = logical_block_size(self.fd)
+        self.fd_direct = None
+        if direct and hasattr(os, 'O_DIRECT'):
+            try:
+                self.fd_direct = os.open(path, os.O_RDWR | os.O_DIRECT)
+            except OSError as e:  # eg: tmpfs
+                logger.warning("{0}: O_DIRECT not supported({1}), use buffered I/O".format(path, e))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _fd(self, offset, length, direct):
+        """the O_DIRECT fd if asked and aligned, else the buffered one"""
+        if direct and self.fd_direct is not None and offset % self.align == 0 and length % self.align == 0:
+            return self.fd_direct, True
+        return self.fd, False
+
+    def pwrite(self, view, offset, direct=True):
+        """
+        write the whole view at offset
+        :param view: memoryview of an AlignedBuffer
+        :param offset: bytes
+        :param direct: O_DIRECT if aligned
+        :return: bytes written
+        """
+        fd, is_direct = self._fd(offset, len(view), direct)
+        done = 0
+        while done < len(view):
+            n = os.pwrite(fd, view[done:], offset + done)
+            if n <= 0:
+                break
+            done += n
+        if not is_direct:
+            os.fdatasync(fd)
+        return done
+
+    def pread(self, view, offset, direct=True):
+        """
+        read len(view) bytes at offset into view
+        :return: bytes read, less than len(view) at the end of device
+        """
+        fd, _ = self._fd(offset, len(view), direct)
+        done = 0
+        while done < len(view):
+            n = os.preadv(fd, [view[done:]], offset + done)
+            if n <= 0:
+                break
+            done += n
+        return done
+
+    @property
+    def size(self):
+        return os.lseek(self.fd, 0, os.SEEK_END)
+
+    def close(self):
+        for fd in (self.fd, self.fd_direct):
+            if fd is not None:
+                os.close(fd)
+        self.fd = self.fd_direct = None
+
+
+class QueueDepthEngine(object):
+    """write/read-back/verify tasks on a RawDevice at a fixed queue depth, per-I/O latency recorded"""
+
+    def __init__(self, device, iodepth=32, direct=True):
+        """
+        :param device: RawDevice
+        :param iodepth: I/Os in flight(worker threads)
+        :param direct: O_DIRECT if aligned
+        """
+        self.device = device
+        self.iodepth = max(iodepth, 1)
+        self.direct = direct
+        self.write_stats = LatencyStats('write')
+        self.read_stats = LatencyStats('read')
+        self.mismatches = []  # [offset]
+        self.errors = []  # [(offset, exception)]
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def _worker(self, tasks, buf_size):
+        w_buf, r_buf = AlignedBuffer(buf_size), AlignedBuffer(buf_size)
+        w_latencies, r_latencies = [], []
+        try:
+            while True:
+                task = tasks.get()
+                if task is None:
+                    return
+                offset, data = task
+                try:
+                    length = w_buf.load(data)
+                    start = time.perf_counter()
+                    n = self.device.pwrite(w_buf.view[:length], offset, self.direct)
+                    w_latencies.append(time.perf_counter() - start)
+                    if n != length:
+                        raise Exception('write {0}/{1} bytes'.format(n, length))
+                    start = time.perf_counter()
+                    n = self.device.pread(r_buf.view[:length], offset, self.direct)
+                    r_latencies.append(time.perf_counter() - start)
+                    if r_buf.view[:n] != w_buf.view[:length]:
+                        logger.error('{0}: read back {1} bytes at offset {2} not match'.format(
+                            self.device.path, length, offset))
+                        with self._lock:
+                            self.mismatches.append(offset)
+                    with self._lock:
+                        self.bytes += length
+                except Exception as e:
+                    logger.error('{0}: offset {1}: {2}'.format(self.device.path, offset, e))
+                    with self._lock:
+                        self.errors.append((offset, e))
+        finally:
+            self.write_stats.extend(w_latencies)
+            self.read_stats.extend(r_latencies)
+            w_buf.close()
+            r_buf.close()
+
+    def run(self, tasks, buf_size):
+        """
+        write data at offset, read it back and compare, for each task
+        :param tasks: iterable of (offset, data), consumed lazily
+        :param buf_size: max len(data)
+        :return: True if all the tasks passed, see mismatches/errors/stats
+        """
+        self.write_stats = LatencyStats('write').start()
+        self.read_stats = LatencyStats('read').start()
+        self.mismatches, self.errors, self.bytes = [], [], 0
+        task_queue = queue.Queue(maxsize=self.iodepth * 2)
+        threads = [threading.Thread(target=self._worker, args=(task_queue, buf_size), daemon=True)
+                   for _ in range(self.iodepth)]
+        for t in threads:
+            t.start()
+        for task in tasks:
+            task_queue.put(task)
+        for _ in threads:
+            task_queue.put(None)
+        for t in threads:
+            t.join()
+        self.write_stats.stop()
+        self.read_stats.stop()
+        return not self.mismatches and not self.errors
+
+    def report(self):
+        """log throughput, latency percentiles and histograms"""
+        elapsed = max(self.write_stats.elapsed, 1e-9)
+        logger.info("{0}: iodepth {1}, {2} bytes, {3:.3f}(seconds), {4:.2f}MB/s, {5} mismatches, {6} errors".format(
+            self.device.path, self.iodepth, self.bytes, elapsed, self.bytes / 1024 / 1024 / elapsed,
+            len(self.mismatches), len(self.errors)))
+        stats_list = [self.write_stats, self.read_stats]
+        logger.info("Latency:\n{0}\nHistogram:\n{1}".format(stats_table(stats_list), histogram_table(stats_list)))
+        return self
+
+
+class UnitTestCase(unittest.TestCase):
+    """raw io test case"""
+
+    def test_pwrite_pread(self):
+        import tempfile
+        dev_path = os.path.join(tempfile.mkdtemp(dir='/var/tmp'), 'dev.img')
+        with open(dev_path, 'wb') as f:
+            f.truncate(1024 * 1024)
+        data = os.urandom(11264)
+        w_buf, r_buf = AlignedBuffer(len(data)), AlignedBuffer(len(data))
+        w_buf.load(data)
+        with RawDevice(dev_path) as dev:
+            self.assertEqual(dev.pwrite(w_buf.view[:len(data)], 4096 * 3), len(data))
+            self.assertEqual(dev.pread(r_buf.view[:len(data)], 4096 * 3), len(data))
+            self.assertEqual(r_buf.read(len(data)), data)
+            self.assertEqual(dev.pwrite(w_buf.view[:1000], 777), 1000)  # unaligned
+            self.assertEqual(dev.pread(r_buf.view[:1000], 777), 1000)
+            self.assertEqual(r_buf.read(1000), data[:1000])
+            self.assertEqual(dev.pread(r_buf.view[:4096], 1024 * 1024 - 100), 100)  # end of device
+        w_buf.close()
+        r_buf.close()
+
+    def test_queue_depth(self):
+        import tempfile
+        dev_path = os.path.join(tempfile.mkdtemp(dir='/var/tmp'), 'dev.img')
+        with open(dev_path, 'wb') as f:
+            f.truncate(64 * 1024 * 1024)
+        data = os.urandom(4096 * 64)
+        tasks = ((x * 1024 * 1024 + 4096, data[x * 4096:(x + 1) * 4096]) for x in range(64))
+        with RawDevice(dev_path) as dev:
+            engine = QueueDepthEngine(dev, iodepth=8)
+            self.assertTrue(engine.run(tasks, 4096))
+            engine.report()
+            self.assertEqual((engine.write_stats.count, engine.read_stats.count, engine.bytes), (64, 64, 4096 * 64))
+            buf = AlignedBuffer(4096)
+            dev.pread(buf.view, 5 * 1024 * 1024 + 4096)
+            self.assertEqual(buf.read(4096), data[5 * 4096:6 * 4096])
+            buf.close()
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
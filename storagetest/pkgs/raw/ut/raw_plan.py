@@ -0,0 +1,368 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : raw_plan.py
+@Time  : 2020/12/7 9:52
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import json
+import stat
+import hashlib
+import tempfile
+import unittest
+from array import array
+import xlrd
+
+from storagetest.libs.log import log
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+"""
+Raw test plan
+==============
+The raw case book(tc/raw_sanity.xlsx, or the same cases in YAML/JSON) is
+compiled once into a plan: every step keeps its seek sweep as an array('q')
+of block seeks plus the decimal scale of each seek, the per-loop seeks
+(str(loop) + str(seek) in the case book semantics) are loop * scale + seek.
+The parsed cases are cached as JSON(a private dir: owned by the user, not
+group/other writable) and reused until the source file changes(mtime/size),
+so a run does not re-parse the xlsx, the ranges are expanded by array/range
+not step by step, and a sweep can be sharded or resumed by index.
+
+YAML/JSON case book:
+    suite: raw_sanity
+    cases:
+      - case_id: '001'
+        case_name: ...
+        case_priority: P1
+        case_loop: 1
+        case_original_file: 4k.txt
+        steps:
+          - {step_id: 1, skip: 'no', describe: ..., wr: w, bs: 4096, count: 1,
+             seek_start: 100, seek_end: 200, seek_step: 1, oflag: direct, expectation: '', comment: ''}
+"""
+
+logger = log.get_logger()
+
+PLAN_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'storagetest', 'plan')
+STEP_KEYS = ('skip', 'describe', 'wr', 'bs', 'count', 'seek_start', 'seek_end', 'seek_step',
+             'oflag', 'expectation', 'comment')
+
+
+def load_xls(xls_path, wb_name):
+    """
+    get config from excel file
+    :param xls_path:
+    :param wb_name:
+    :return: row list
+    """
+    logger.info('Read config from {0}, wb_name:{1} ...'.format(xls_path, wb_name))
+    try:
+        data = xlrd.open_workbook(xls_path)
+    except Exception as e:
+        raise Exception(e)
+
+    table = data.sheet_by_name(wb_name)
+    row_list = []
+    for rownum in range(0, table.nrows):
+        row = table.row_values(rownum)
+        if not row:
+            break
+        row_list.append(row)
+    return row_list
+
+
+def load_xls_cases(xls_path, wb_name='raw_sanity'):
+    """return the case list(case_info dicts, all the steps) of the xlsx case book"""
+    case_list = []
+    case_info = None
+    for row in load_xls(xls_path, wb_name)[1:]:
+        step_id = int(row[5]) if row[5] else ''
+        step_info = {
+            'skip': row[6],
+            'describe': row[7],
+            'wr': row[8],
+            'bs': int(row[9]) if row[9] else '',
+            'count': int(row[10]) if row[10] else '',
+            'seek_start': int(row[11]) if row[11] else '',
+            'seek_end': int(row[12]) if row[12] else '',
+            'seek_step': int(row[13]) if row[13] else '',
+            'oflag': row[14],
+            'expectation': row[15],
+            'comment': row[16],
+        }
+        if row[0]:
+            case_info = {
+                'suite': wb_name,
+                'case_id': row[0],
+                'case_name': row[1],
+                'case_priority': row[2],
+                'case_loop': int(row[3]) if row[3] else '',
+                'case_original_file': row[4],
+                'steps': {},
+                'case_type': wb_name,
+            }
+            case_list.append(case_info)
+        case_info['steps'][step_id] = step_info
+    return case_list
+
+
+def load_book_cases(book_path):
+    """return the case list of a YAML/JSON case book"""
+    with open(book_path, 'r') as f:
+        if book_path.endswith('.json'):
+            book = json.load(f)
+        elif yaml is None:
+            raise Exception("pyyaml not installed.(pip install pyyaml)")
+        else:
+            book = yaml.safe_load(f)
+    suite = book.get('suite', os.path.splitext(os.path.basename(book_path))[0])
+    case_list = []
+    for case in book['cases']:
+        steps = {}
+        for step in case['steps']:
+            steps[step.get('step_id', len(steps) + 1)] = {key: step.get(key, '') for key in STEP_KEYS}
+        case_list.append({
+            'suite': suite,
+            'case_id': str(case['case_id']),
+            'case_name': case['case_name'],
+            'case_priority': case.get('case_priority', ''),
+            'case_loop': int(case.get('case_loop') or 1),
+            'case_original_file': case.get('case_original_file', ''),
+            'steps': steps,
+            'case_type': suite,
+        })
+    return case_list
+
+
+class StepPlan(object):
+    """A compiled case step, the seek sweep kept as arrays"""
+
+    def __init__(self, step_id, step_info):
+        self.step_id = step_id
+        self.wr = str(step_info['wr']).lower()
+        self.bs = int(step_info['bs'] or 0)
+        self.count = int(step_info['count'] or 0)
+        self.direct = 'direct' in step_info['oflag']
+        self.skew = step_info['comment'] == 'seek * 11 / 4 + 2'  # read at seek * 11 / 4 + 2
+        seek_start, seek_end, seek_step = step_info['seek_start'], step_info['seek_end'], step_info['seek_step']
+        self.seeks = array('q')
+        if seek_start != '' and seek_end != '' and seek_step:
+            if seek_start > seek_end:
+                seek_step = -seek_step
+                seek_start -= 1
+                seek_end -= 1
+            self.seeks = array('q', range(seek_start, seek_end, seek_step))
+        # str(loop) + str(seek) == loop * scale + seek
+        self.scales = array('q', [10 ** len(str(seek)) for seek in self.seeks])
+
+    def __len__(self):
+        return len(self.seeks)
+
+    @property
+    def length(self):
+        """bytes per I/O"""
+        return self.bs * self.count
+
+    def block_seeks(self, loop, loops, start=0, shard=0, shards=1):
+        """
+        the seeks(in bs blocks) of the loop
+        :param loop: loop number
+        :param loops: loops of the case, the loop number is prefixed to the seeks if > 1
+        :param start: resume from the index start
+        :param shard: shard index, take the seeks [start+shard::shards]
+        :param shards: shard number
+        :return: array('q')
+        """
+        idx = slice(start + shard, None, shards)
+        seeks = self.seeks[idx]
+        if loops > 1:
+            seeks = array('q', [loop * scale + seek for scale, seek in zip(self.scales[idx], seeks)])
+        if self.skew and self.wr == 'r':
+            seeks = array('q', [seek * 11 // 4 + 2 for seek in seeks])
+        return seeks
+
+    def offsets(self, loop, loops, start=0, shard=0, shards=1):
+        """the byte offsets of the loop, see block_seeks"""
+        bs = self.bs
+        return array('q', [seek * bs for seek in self.block_seeks(loop, loops, start, shard, shards)])
+
+
+class RawPlan(object):
+    """The compiled raw case book, cached by the source mtime"""
+
+    def __init__(self, source, cases):
+        """
+        :param source: case book path
+        :param cases: case_info list
+        """
+        self.source = source
+        self.cases = cases
+        self.steps = {}  # {case_id: [StepPlan]}
+        for case_info in cases:
+            self.steps[case_info['case_id']] = self.compile_case(case_info)
+
+    @staticmethod
+    def compile_case(case_info):
+        """return the StepPlan list of a case_info"""
+        return [StepPlan(step_id, step_info) for step_id, step_info in case_info['steps'].items()]
+
+    def get_steps(self, case_info):
+        """the compiled steps of case_info, compiled now if the plan has no such case"""
+        steps = self.steps.get(case_info['case_id'])
+        if steps is None or case_info not in self.cases:
+            return self.compile_case(case_info)
+        return steps
+
+    def case_list(self):
+        """the cases to run: without any skipped step"""
+        return [case_info for case_info in self.cases
+                if not any(str(step['skip']).lower() == 'yes' for step in case_info['steps'].values())]
+
+    @property
+    def total_ios(self):
+        return sum(len(step) * max(int(case_info['case_loop'] or 1), 1)
+                   for case_info in self.cases for step in self.steps[case_info['case_id']])
+
+    @staticmethod
+    def _cache_path(source, cache_dir):
+        key = hashlib.sha1(os.path.realpath(source).encode()).hexdigest()[:16]
+        return os.path.join(cache_dir, '{0}.{1}.json'.format(os.path.basename(source), key))
+
+    @staticmethod
+    def _private_dir(cache_dir):
+        """create cache_dir(0o700), False if it is not owned by the user or group/other writable"""
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            st = os.lstat(cache_dir)
+        except OSError as e:
+            logger.warning('{0}: {1}, no plan cache'.format(cache_dir, e))
+            return False
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o022:
+            logger.warning('{0}: not a private dir(uid={1}, mode={2:o}), no plan cache'.format(
+                cache_dir, st.st_uid, stat.S_IMODE(st.st_mode)))
+            return False
+        return True
+
+    @classmethod
+    def load(cls, source, wb_name='raw_sanity', cache_dir=DEFAULT_CACHE_DIR):
+        """
+        load the plan of the case book, from the cached cases if the source not changed
+        :param source: .xlsx / .yaml / .yml / .json
+        :param wb_name: sheet name of the xlsx
+        :param cache_dir: None: no cache
+        :return: RawPlan
+        """
+        st = os.stat(source)
+        key = [PLAN_VERSION, os.path.realpath(source), wb_name, st.st_mtime_ns, st.st_size]
+        cache_path = cls._cache_path(source, cache_dir) if cache_dir and cls._private_dir(cache_dir) else None
+        if cache_path and os.path.isfile(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    cached = json.load(f)
+                if cached['key'] == key:
+                    logger.debug('Load the cached plan {0}'.format(cache_path))
+                    cases = [dict(case_info, steps={step_id: step_info for step_id, step_info in case_info['steps']})
+                             for case_info in cached['cases']]
+                    return cls(source, cases)
+            except Exception as e:
+                logger.warning('Load {0} failed: {1}, recompile'.format(cache_path, e))
+
+        if source.endswith(('.xlsx', '.xls')):
+            cases = load_xls_cases(source, wb_name)
+        else:
+            cases = load_book_cases(source)
+        plan = cls(source, cases)
+        logger.info('Compiled {0}: {1} cases, {2} I/Os'.format(source, len(cases), plan.total_ios))
+        if cache_path:
+            # steps as [step_id, step_info] pairs, the step_id keys are int
+            cached = {'key': key, 'cases': [dict(case_info, steps=list(case_info['steps'].items()))
+                                            for case_info in cases]}
+            tmp_path = '{0}.{1}'.format(cache_path, os.getpid())
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(cached, f)
+                os.replace(tmp_path, cache_path)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning('Cache {0} failed: {1}'.format(cache_path, e))
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return plan
+
+    def dump(self, book_path):
+        """write the case book as YAML/JSON(by the file extension), eg: convert the xlsx"""
+        book = {'suite': self.cases[0]['suite'] if self.cases else '', 'cases': []}
+        for case_info in self.cases:
+            case = {k: v for k, v in case_info.items() if k not in ('suite', 'case_type', 'steps')}
+            case['steps'] = [dict(step_id=step_id, **step_info) for step_id, step_info in case_info['steps'].items()]
+            book['cases'].append(case)
+        with open(book_path, 'w') as f:
+            if book_path.endswith('.json'):
+                json.dump(book, f, indent=2)
+            elif yaml is None:
+                raise Exception("pyyaml not installed.(pip install pyyaml)")
+            else:
+                yaml.safe_dump(book, f, sort_keys=False)
+        return book_path
+
+
+class UnitTestCase(unittest.TestCase):
+    """raw plan test case"""
+
+    xls_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'tc', 'raw_sanity.xlsx')
+
+    def test_compile(self):
+        cache_dir = tempfile.mkdtemp()
+        plan = RawPlan.load(self.xls_path, cache_dir=cache_dir)
+        cached_plan = RawPlan.load(self.xls_path, cache_dir=cache_dir)
+        self.assertEqual(cached_plan.cases, plan.cases)
+        self.assertEqual(cached_plan.total_ios, plan.total_ios)
+        self.assertEqual([os.path.splitext(name)[1] for name in os.listdir(cache_dir)], ['.json'])
+        shared_dir = tempfile.mkdtemp()
+        os.chmod(shared_dir, 0o777)
+        RawPlan.load(self.xls_path, cache_dir=shared_dir)
+        self.assertEqual(os.listdir(shared_dir), [])
+        # cache_dir can not be created(eg: unwritable/missing HOME): compile without the cache
+        no_dir = os.path.join(cache_dir, os.listdir(cache_dir)[0], 'plan')
+        self.assertEqual(RawPlan.load(self.xls_path, cache_dir=no_dir).cases, plan.cases)
+        for case_info in plan.case_list():
+            loops = case_info['case_loop']
+            for step in plan.steps[case_info['case_id']]:
+                step_info = case_info['steps'][step.step_id]
+                if not len(step):
+                    continue
+                # the raw_write_read semantics
+                seek_start, seek_end, seek_step = step_info['seek_start'], step_info['seek_end'], step_info['seek_step']
+                if seek_start > seek_end:
+                    seek_step, seek_start, seek_end = -seek_step, seek_start - 1, seek_end - 1
+                for loop in (7, 42):
+                    expected = []
+                    for seek in range(seek_start, seek_end, seek_step):
+                        total_seek = int(str(loop) + str(seek) if loops > 1 else str(seek))
+                        if step.wr == 'r' and step_info['comment'] == 'seek * 11 / 4 + 2':
+                            total_seek = total_seek * 11 // 4 + 2
+                        expected.append(total_seek)
+                    self.assertEqual(list(step.block_seeks(loop, loops)), expected)
+                    self.assertEqual(list(step.block_seeks(loop, loops, start=1, shard=1, shards=3)), expected[2::3])
+                    self.assertEqual(step.offsets(loop, loops)[-1], expected[-1] * step.bs)
+
+    def test_book(self):
+        tmp_dir = tempfile.mkdtemp()
+        plan = RawPlan.load(self.xls_path, cache_dir=None)
+        book_path = plan.dump(os.path.join(tmp_dir, 'raw_sanity.json'))
+        book_plan = RawPlan.load(book_path, cache_dir=tmp_dir)
+        self.assertEqual(book_plan.cases, plan.cases)
+        self.assertEqual(book_plan.total_ios, plan.total_ios)
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(UnitTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -10,30 +10,66 @@
 import os
 import random
 import json
-import xlrd
+import time
+import bisect
 from prettytable import PrettyTable
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from storagetest.pkgs.fileops import FileOps
+from storagetest.pkgs.fileops.checksum import Checksum
+from storagetest.pkgs.fileops.tree_delete import TreeDeleter
+from storagetest.pkgs.fileops.block_stamp import BlockStamper, StampVerifier, align_range, bad_blocks_table
 from storagetest.pkgs.dd import DD
-from storagetest.libs import utils, log
+from storagetest.pkgs.raw.ut.raw_io import AlignedBuffer, RawDevice, QueueDepthEngine
+from storagetest.pkgs.raw.ut.raw_plan import RawPlan
+from storagetest.pkgs.raw.block_device import BlockDevice
+from storagetest.libs import log
+from storagetest.libs.latency import LatencyStats, stats_table
+from storagetest.libs.cache_control import CacheControl
 from storagetest.libs.exceptions import PlatformError, NoSuchDir
 
 logger = log.get_logger()
 
+STAMP_BLOCK_SIZE = 512  # stamp every sector, the xlsx cases seek in 512 bytes multiples
+
 
 class RawUT(object):
     """RAW unit test"""
 
-    def __init__(self, raw_device):
+    def __init__(self, raw_device, engine='inproc', iodepth=None, stamp=False, cache='fadvise', case_book=None):
+        """
+        :param raw_device:
+        :param engine: inproc: pwrite/pread in process(see raw_io), dd: a dd command per I/O
+        :param iodepth: I/Os in flight of the inproc inode write/read case, None: by the device queue
+        :param stamp: write self-describing stamped sectors and verify them in place(inproc engine only),
+                      instead of comparing with the original file
+        :param cache: cache control between steps, see cache_control.CACHE_MODES,
+                      direct: all the aligned I/O O_DIRECT whatever the oflag(inproc engine only)
+        :param case_book: the cases .xlsx/.yaml/.json, None: tc/raw_sanity.xlsx
+        """
         self.raw_device = raw_device
+        self.engine = engine
+        self.iodepth = iodepth or BlockDevice().bench_profile(device=raw_device).iodepth_iops
+        self.stamp = stamp
+        self.cache = CacheControl(cache)
+        self._seq = 0  # stamp write sequence number
         self.phase_list = []
+        self.checksum = Checksum('md5')
+        self._buffers = {}  # {name: AlignedBuffer}, reused across the steps
+        self.case_book = case_book
+        self.plan = None  # RawPlan, compiled case book
 
     def verify(self):
         if os.name != "posix":
             raise PlatformError("Just support for linux machine!")
-        if not os.path.isdir(self.raw_device):
+        if not os.path.exists(self.raw_device):
             raise NoSuchDir(self.raw_device)
+        if self.engine not in ('inproc', 'dd'):
+            raise Exception('Not support engine: {0}'.format(self.engine))
+        if self.stamp and self.engine != 'inproc':
+            raise Exception('Stamp verify requires the inproc engine')
+        if self.cache.direct and self.engine != 'inproc':
+            raise Exception('Cache mode direct requires the inproc engine')
 
     def print_phase(self):
         if len(self.phase_list) == 0:
@@ -47,107 +83,31 @@ class RawUT(object):
         logger.info("\n{0}".format(step_table))
         return True
 
-    @staticmethod
-    def load_xls(xls_path, wb_name):
-        """
-        get config from excel file
-        :param xls_path:
-        :param wb_name:
-        :return: row list
-        """
-        logger.info('Read config from {0}, wb_name:{1} ...'.format(xls_path, wb_name))
-        try:
-            data = xlrd.open_workbook(xls_path)
-        except Exception as e:
-            raise Exception(e)
-
-        table = data.sheet_by_name(wb_name)
-        nrows = table.nrows
-        # colnames = table.row_values(0)
-        row_list = []
-        for rownum in range(0, nrows):
-            row = table.row_values(rownum)
-            if not row:
-                break
-            row_list.append(row)
-        return row_list
-
     def load_tcs(self):
         """
-        get test case from xlsx file
+        get test case from the case book(default: tc/raw_sanity.xlsx), see raw_plan
         :return:
         """
         cur_dir = os.path.dirname(os.path.realpath(__file__))
-        xls_path = os.path.join(cur_dir, 'tc', 'raw_sanity.xlsx')
-        wb_name = "raw_sanity"
-
-        skip = False
-        case_list = []
-        xls_row_list = self.load_xls(xls_path, wb_name)
-        for row in xls_row_list[1:]:
-            case_id = row[0]
-            case_name = row[1]
-            case_priority = row[2]
-            case_loop = int(row[3]) if row[3] else ''
-            case_original_file = row[4]
-
-            # case steps:
-            step_info = {}
-            step_id = int(row[5]) if row[5] else ''
-            step_info['skip'] = row[6]
-            step_info['describe'] = row[7]
-            step_info['wr'] = row[8]
-            step_info['bs'] = int(row[9]) if row[9] else ''
-            step_info['count'] = int(row[10]) if row[10] else ''
-            step_info['seek_start'] = int(row[11]) if row[11] else ''
-            step_info['seek_end'] = int(row[12]) if row[12] else ''
-            step_info['seek_step'] = int(row[13]) if row[13] else ''
-            step_info['oflag'] = row[14]
-            step_info['expectation'] = row[15]
-            step_info['comment'] = row[16]
-
-            if case_id:
-                case_info = {}
-                case_info['suite'] = wb_name
-                case_info['case_id'] = case_id
-                case_info['case_name'] = case_name
-                case_info['case_priority'] = case_priority
-                case_info['case_loop'] = case_loop
-                case_info['case_original_file'] = case_original_file
-                case_info['steps'] = {}
-                case_info['case_type'] = wb_name
-            case_info['steps'][step_id] = step_info
-            if step_info['skip'].lower() == 'yes':
-                skip = True
-
-            if case_id:
-                if not skip:
-                    case_list.append(case_info)
-                skip = False
-
-        return case_list
+        case_book = self.case_book or os.path.join(cur_dir, 'tc', 'raw_sanity.xlsx')
+        self.plan = RawPlan.load(case_book, wb_name="raw_sanity")
+        return self.plan.case_list()
 
     @staticmethod
     def clean_up(rm_path, rm_file):
         """
         rm path_name/dd_r_*
-        :return:
+        :return: errors list, raise if any file failed to delete
         """
         logger.info('>> Clean up files ...')
-        rm_dd = "rm -f {0}/{1}*".format(rm_path, rm_file)
-        rc, output = utils.run_cmd(rm_dd, 0)
-        return rc, output
+        return TreeDeleter().unlink_prefix(rm_path, rm_file)
 
-    @staticmethod
-    def sync_dropcache():
+    def drop_cache(self):
         """
-        sync; echo 3 > /proc/sys/vm/drop_caches
-        :return:
+        drop the raw device caches between steps by the cache mode, see CacheControl
+        :return: elapsed seconds
         """
-        logger.info('>> sync and clean drop_caches')
-        sync_cmd = "sync; echo 3 > /proc/sys/vm/drop_caches"
-        rc, output = utils.run_cmd(sync_cmd, 0)
-        return rc, output
+        return self.cache.drop(self.raw_device)
 
     def raw_write_read(self, case_info):
         """
@@ -175,7 +135,8 @@ class RawUT(object):
         loop_end = loop_start + case_loop
         for loop in range(loop_start, loop_end):
             logger.info('>> Start Loop: {0}'.format(loop - loop_start))
-            for step_id in steps_info.keys():
+            for step in self._step_plans(case_info):
+                step_id = step.step_id
                 step_info = steps_info[step_id]
                 step_skip = step_info['skip']
                 step_describe = step_info['describe']
@@ -184,51 +145,237 @@ class RawUT(object):
                         case_info['case_id'], case_info['case_name'], step_id, step_describe))
                     raise Exception()
 
-                step_wr = step_info['wr']
                 step_bs = step_info['bs']
                 step_count = step_info['count']
-                step_seek_start = step_info['seek_start']
-                step_seek_end = step_info['seek_end']
-                step_seek_step = step_info['seek_step']
                 step_oflag = step_info['oflag']
-                step_comment = step_info['comment']
-                if step_seek_start > step_seek_end:
-                    step_seek_step = step_info['seek_step'] * (-1)
-                    step_seek_start -= 1
-                    step_seek_end -= 1
                 step_expectation = step_info['expectation']
-                timeout = 900 if int(step_bs) * int(step_count) > 8388600 else 120
+                timeout = 900 if step.length > 8388600 else 120
 
                 self.clean_up(original_file_path, r_of_name)
                 logger.info('>> Start Step: {0}, args:\n{1}'.format(step_id, json.dumps(step_info, indent=4)))
-                for seek in range(step_seek_start, step_seek_end, step_seek_step):
-                    total_seek = str(loop) + str(seek) if (loop_end - loop_start) > 1 else str(seek)
-                    if step_wr.lower() == 'w':
+                r_of_fullpath_list = []
+                # the same seeks as the inproc engine: loop prefix, the read skew(seek * 11 // 4 + 2)
+                for total_seek in step.block_seeks(loop, loop_end - loop_start):
+                    if step.wr == 'w':
                         DD().dd_exec(original_file_fullpath, self.raw_device, step_bs, step_count, seek=total_seek,
                                      oflag=step_oflag, timeout=timeout)
-                    elif step_wr.lower() == 'r':
-                        if step_comment == 'seek * 11 / 4 + 2':
-                            total_seek = str(int(total_seek) * 11 / 4 + 2)
+                    elif step.wr == 'r':
                         r_of_fullpath = r_of_path + '.' + str(total_seek)
                         DD().dd_exec(self.raw_device, r_of_fullpath, step_bs, step_count, skip=total_seek,
                                      oflag=step_oflag, timeout=timeout)
-                        r_md5 = FileOps().hash_md5(r_of_fullpath)
-                        logger.debug('{0} {1}'.format(original_md5, original_file_fullpath))
-                        logger.debug('{0} {1}'.format(r_md5, r_of_fullpath))
-                        if step_expectation == 'md5 match':
-                            assert r_md5 == original_md5, '\n{0} {1}\n{2} {3}'.format(original_md5,
-                                                                                      original_file_fullpath,
-                                                                                      r_md5, r_of_fullpath)
-                        else:
-                            assert r_md5 != original_md5, '\n{0} {1}\n{2} {3}'.format(original_md5,
-                                                                                      original_file_fullpath,
-                                                                                      r_md5, r_of_fullpath)
+                        r_of_fullpath_list.append(r_of_fullpath)
                     else:
                         logger.error('Only support w / r mode!')
-                        raise Exception('Not support: {0}'.format(step_wr))
+                        raise Exception('Not support: {0}'.format(step_info['wr']))
+
+                # verify all the read back files of this step in a batch
+                r_md5_dict = self.checksum.hash_files(r_of_fullpath_list)
+                for r_of_fullpath in r_of_fullpath_list:
+                    r_md5 = r_md5_dict[r_of_fullpath]
+                    logger.debug('{0} {1}'.format(original_md5, original_file_fullpath))
+                    logger.debug('{0} {1}'.format(r_md5, r_of_fullpath))
+                    if step_expectation == 'md5 match':
+                        assert r_md5 == original_md5, '\n{0} {1}\n{2} {3}'.format(original_md5,
+                                                                                  original_file_fullpath,
+                                                                                  r_md5, r_of_fullpath)
+                    else:
+                        assert r_md5 != original_md5, '\n{0} {1}\n{2} {3}'.format(original_md5,
+                                                                                  original_file_fullpath,
+                                                                                  r_md5, r_of_fullpath)
 
                 self.clean_up(original_file_path, r_of_name)
-                self.sync_dropcache()
+                self.drop_cache()
+
+        return True
+
+    def _buffer(self, name, size):
+        """return a reusable AlignedBuffer of at least size bytes"""
+        buf = self._buffers.get(name)
+        if buf is None or buf.size < size:
+            if buf is not None:
+                buf.close()
+            buf = self._buffers[name] = AlignedBuffer(size)
+        return buf
+
+    def _step_plans(self, case_info):
+        """the compiled steps of the case, compiled now if not in the loaded plan"""
+        if self.plan is not None:
+            return self.plan.get_steps(case_info)
+        return RawPlan.compile_case(case_info)
+
+    def _step_direct(self, direct):
+        """the step O_DIRECT flag, forced by the cache mode direct"""
+        return direct or self.cache.direct
+
+    @staticmethod
+    def _log_step_stats(stats, length):
+        stats.stop()
+        logger.info('{0} {1:.2f}MB/s\n{2}'.format(
+            stats.name, stats.count * length / 1024 / 1024 / max(stats.elapsed, 1e-9), stats_table([stats])))
+
+    def raw_write_read_inproc(self, case_info):
+        """
+        bd basic write read unit test work flow, in process:
+        the device opened once, pwrite/pread at seek * bs with aligned buffers, verify in memory.
+        same case semantics as raw_write_read: write min(bs * count, file size) bytes of the original file,
+        read back bs * count bytes, "md5 match" <=> the read back data == the original file data
+        :param case_info:
+        :return:
+        """
+
+        case_id = case_info['case_id']
+        case_suite = case_info['suite']
+        case_original_file = case_info['case_original_file']
+        original_file_fullpath = os.path.join('/bdut', case_suite, case_id, case_original_file)
+        original_file_size = os.path.splitext(os.path.split(original_file_fullpath)[1])[0]
+        original_md5 = FileOps().create_file(original_file_fullpath, original_file_size, line_size=128, mode='w+')
+        logger.info('{0} {1}'.format(original_md5, original_file_fullpath))
+        with open(original_file_fullpath, 'rb') as f:
+            original_data = f.read()
+
+        case_loop = case_info['case_loop']
+        steps_info = case_info['steps']
+
+        loop_start = random.randint(1, 100)
+        with RawDevice(self.raw_device) as device:
+            for loop in range(loop_start, loop_start + case_loop):
+                logger.info('>> Start Loop: {0}'.format(loop - loop_start))
+                for step in self._step_plans(case_info):
+                    step_info = steps_info[step.step_id]
+                    if step.wr not in ('w', 'r'):
+                        logger.error('Only support w / r mode!')
+                        raise Exception('Not support: {0}'.format(step_info['wr']))
+                    step_wr, step_bs, length = step.wr, step.bs, step.length
+                    direct = self._step_direct(step.direct)
+                    logger.info('>> Start Step: {0}, args:\n{1}'.format(step.step_id, json.dumps(step_info, indent=4)))
+                    if step_wr == 'w':
+                        buf = self._buffer('w', length)
+                        length = buf.load(original_data[:length])
+                    else:
+                        buf = self._buffer('r', length)
+                    view = buf.view[:length]
+                    stats = LatencyStats('write' if step_wr == 'w' else 'read').start()
+                    for offset in step.offsets(loop, case_loop):
+                        total_seek = offset // step_bs
+                        start = time.perf_counter()
+                        if step_wr == 'w':
+                            n = device.pwrite(view, offset, direct)
+                            stats.add(time.perf_counter() - start)
+                            if n != length:
+                                raise Exception('Write {0}: {1}/{2} bytes at seek {3}'.format(
+                                    self.raw_device, n, length, total_seek))
+                            continue
+
+                        n = device.pread(view, offset, direct)
+                        stats.add(time.perf_counter() - start)
+                        matched = view[:n] == original_data
+                        logger.debug('seek {0}: read {1} bytes, match: {2}'.format(total_seek, n, matched))
+                        if step_info['expectation'] == 'md5 match':
+                            assert matched, '{0} read back at seek {1} not match {2}'.format(
+                                self.raw_device, total_seek, original_file_fullpath)
+                        else:
+                            assert not matched, '{0} read back at seek {1} match {2}'.format(
+                                self.raw_device, total_seek, original_file_fullpath)
+                    self._log_step_stats(stats, length)
+                    view.release()
+                    self.drop_cache()
+
+        return True
+
+    @staticmethod
+    def _uncovered_blocks(extents, offset, length, block_size=STAMP_BLOCK_SIZE):
+        """
+        return the offsets of the blocks in [offset, offset+length) not fully covered by the extents
+        :param extents: [(start, end)] written ranges
+        """
+        merged = []
+        for start, end in sorted(extents):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        starts = [start for start, _ in merged]
+        uncovered = []
+        for blk_offset in range(offset, offset + length, block_size):
+            idx = bisect.bisect_right(starts, blk_offset) - 1
+            if idx < 0 or merged[idx][1] < blk_offset + block_size:
+                uncovered.append(blk_offset)
+        return uncovered
+
+    def _verify_stamp(self, device, verifier, total_seek, bs, length, direct, extents, writer_id, expectation):
+        """verify the sectors covering [seek * bs, seek * bs + length) in place, see raw_write_read_stamp"""
+        offset, r_length = align_range(total_seek * bs, length, STAMP_BLOCK_SIZE)
+        view = self._buffer('r', r_length).view[:r_length]
+        start = time.perf_counter()
+        n = device.pread(view, offset, direct)
+        latency = time.perf_counter() - start
+        bad_blocks = verifier.check(view[:n], offset, self._seq, writer_id)
+        view.release()
+        expected_bad = set(self._uncovered_blocks(extents, offset, n))
+        unexpected = [b for b in bad_blocks if b.offset not in expected_bad]
+        unexpected_good = sorted(expected_bad - set(b.offset for b in bad_blocks))
+        logger.debug('seek {0}: {1} sectors, {2} bad, {3} not written by the last write step, expectation: {4}'.format(
+            total_seek, n // STAMP_BLOCK_SIZE, len(bad_blocks), len(expected_bad), expectation))
+        if unexpected or unexpected_good:
+            logger.error('{0} read back at seek {1}, bad sectors:\n{2}'.format(
+                self.raw_device, total_seek, bad_blocks_table(unexpected)))
+            raise Exception('{0}: seek {1}: {2} bad sectors in the written range, {3} not written sectors '
+                            'verified good: {4}'.format(self.raw_device, total_seek, len(unexpected),
+                                                        len(unexpected_good), unexpected_good[:10]))
+        return latency
+
+    def raw_write_read_stamp(self, case_info):
+        """
+        bd basic write read unit test work flow, stamp verify:
+        a write step stamps every sector it writes(offset, seq, timestamp, writer_id, crc, one seq per step),
+        a read step verifies the sectors covering the read range in place, no original/read back files.
+        expect: a sector is good <=> fully covered by the writes of the last write step, so a mismatch
+        reports the exact torn / misdirected / stale sectors
+        :param case_info:
+        :return:
+        """
+
+        case_loop = case_info['case_loop']
+        steps_info = case_info['steps']
+        stamper = BlockStamper(STAMP_BLOCK_SIZE)
+        verifier = StampVerifier(STAMP_BLOCK_SIZE)
+        extents = []  # written ranges of the last write step
+
+        loop_start = random.randint(1, 100)
+        with RawDevice(self.raw_device) as device:
+            for loop in range(loop_start, loop_start + case_loop):
+                logger.info('>> Start Loop: {0}'.format(loop - loop_start))
+                for step in self._step_plans(case_info):
+                    step_info = steps_info[step.step_id]
+                    if step.wr not in ('w', 'r'):
+                        logger.error('Only support w / r mode!')
+                        raise Exception('Not support: {0}'.format(step_info['wr']))
+                    step_wr, step_bs, length = step.wr, step.bs, step.length
+                    direct = self._step_direct(step.direct)
+                    logger.info('>> Start Step: {0}, args:\n{1}'.format(step.step_id, json.dumps(step_info, indent=4)))
+                    stats = LatencyStats('write' if step_wr == 'w' else 'read').start()
+                    if step_wr == 'w':
+                        self._seq += 1
+                        timestamp = time.time_ns()
+                        extents = []
+                        view = self._buffer('w', length).view[:length]
+                        for offset in step.offsets(loop, case_loop):
+                            total_seek = offset // step_bs
+                            stamper.fill(view, offset, self._seq, timestamp)
+                            start = time.perf_counter()
+                            n = device.pwrite(view, offset, direct)
+                            stats.add(time.perf_counter() - start)
+                            if n != length:
+                                raise Exception('Write {0}: {1}/{2} bytes at seek {3}'.format(
+                                    self.raw_device, n, length, total_seek))
+                            extents.append((offset, offset + length))
+                        view.release()
+                    else:
+                        for total_seek in step.block_seeks(loop, case_loop):
+                            stats.add(self._verify_stamp(device, verifier, total_seek, step_bs, length, direct,
+                                                         extents, stamper.writer_id, step_info['expectation']))
+                    self._log_step_stats(stats, length)
+                    self.drop_cache()
 
         return True
 
@@ -257,14 +404,14 @@ class RawUT(object):
                                                          'inode_wr.{0}.{1}'.format(thread_n, loop))
                 original_thread_loop_file_r = original_thread_loop_file + '.r'
 
-                DD.dd_exec(original_file, original_thread_loop_file, bs, count=1, skip=i_offset, oflag='direct',
-                                   timeout=60)
-                DD.dd_exec(original_thread_loop_file, self.raw_device, bs, count=1, seek=o_offset, oflag='direct',
-                                   timeout=60)
-                DD.dd_exec(self.raw_device, original_thread_loop_file_r, bs, count=1, skip=o_offset, oflag='direct',
-                                   timeout=60)
-                w_md5 = FileOps().hash_md5(original_thread_loop_file)
-                r_md5 = FileOps().hash_md5(original_thread_loop_file_r)
+                DD().dd_exec(original_file, original_thread_loop_file, bs, count=1, skip=i_offset, oflag='direct',
+                             timeout=60)
+                DD().dd_exec(original_thread_loop_file, self.raw_device, bs, count=1, seek=o_offset, oflag='direct',
+                             timeout=60)
+                DD().dd_exec(self.raw_device, original_thread_loop_file_r, bs, count=1, skip=o_offset, oflag='direct',
+                             timeout=60)
+                w_md5 = self.checksum.hash_file(original_thread_loop_file)
+                r_md5 = self.checksum.hash_file(original_thread_loop_file_r)
                 if r_md5 != w_md5:
                     logger.error('{0} {1}'.format(w_md5, original_thread_loop_file))
                     logger.error('{0} {1}'.format(r_md5, original_thread_loop_file_r))
@@ -282,10 +429,13 @@ class RawUT(object):
 
         case_loop = case_info['case_loop']
         bs = 4096
+        if self.engine == 'inproc':
+            return self.raw_write_read_inode_inproc(original_file_fullpath, bs, case_loop)
+
         pool = ThreadPoolExecutor(max_workers=1000)
         futures = []
         for thread in range(1, 1000):
-            offset = thread * 4194304 / bs
+            offset = thread * 4194304 // bs
             futures.append(pool.submit(inode_wr, thread, bs, offset, original_file_fullpath, case_loop))
 
         future_result = [future.result() for future in as_completed(futures)]
@@ -293,8 +443,42 @@ class RawUT(object):
         result = False if False in future_result else True
 
         self.clean_up(os.path.split(original_file_fullpath)[0], 'inode_wr')
-        self.sync_dropcache()
+        self.drop_cache()
+
+        return result
+
+    def raw_write_read_inode_inproc(self, original_file, bs=4096, loops=10, threads=1000):
+        """
+        the inode write/read layout of raw_write_read_inode at a fixed queue depth(self.iodepth):
+        for thread in 1..threads-1, loop in 1..loops-1:
+        block(thread * loops + loop) of original_file -> device block(thread * 4M / bs + loop), read back and compare
+        :param original_file:
+        :param bs:
+        :param loops:
+        :param threads: job number of the layout
+        :return:
+        """
 
+        with open(original_file, 'rb') as f:
+            original_data = memoryview(f.read())
+
+        def tasks():
+            for thread_n in range(1, threads):
+                offset = thread_n * 4194304 // bs
+                for loop in range(1, loops):  # require: loops <= 1024
+                    i_offset = thread_n * loops + loop
+                    o_offset = offset + loop
+                    yield o_offset * bs, original_data[i_offset * bs:(i_offset + 1) * bs]
+
+        with RawDevice(self.raw_device) as device:
+            engine = QueueDepthEngine(device, self.iodepth)
+            result = engine.run(tasks(), bs)
+            engine.report()
+        original_data.release()
+        self.drop_cache()
+        if not result:
+            raise Exception('{0}: inode write/read {1} mismatches, {2} errors'.format(
+                self.raw_device, len(engine.mismatches), len(engine.errors)))
         return result
 
     def run(self, test):
@@ -303,6 +487,10 @@ class RawUT(object):
 
         if 'inode_write_read' in test['case_name']:
             self.raw_write_read_inode(test)
+        elif self.stamp:
+            self.raw_write_read_stamp(test)
+        elif self.engine == 'inproc':
+            self.raw_write_read_inproc(test)
         else:
             self.raw_write_read(test)
         return True
@@ -97,6 +97,22 @@ def smb_parser():
     return arg_parser
 
 
+def steady_parser():
+    """fio steady state related parser"""
+    arg_parser = argparse.ArgumentParser(add_help=False)
+    ss_group = arg_parser.add_argument_group('fio steady state arguments')
+    ss_group.add_argument("--steady", action="store_true", dest="steady", default=False,
+                          help="fio: run each test up to --ss_max_runtime, stop once steady state(SNIA PTS), "
+                               "default:False(fixed runtime)")
+    ss_group.add_argument("--ss_metric", action="store", dest="ss_metric", default='iops', choices=['iops', 'bw'],
+                          help="steady state metric, default:iops")
+    ss_group.add_argument("--ss_window", action="store", dest="ss_window", type=int, default=5,
+                          help="steady state measurement window, rounds, default:5")
+    ss_group.add_argument("--ss_max_runtime", action="store", dest="ss_max_runtime", default='30m',
+                          help="max runtime of a steady state test, default:30m")
+    return arg_parser
+
+
 class MntParser(object):
     """mnt related parser"""
 
@@ -146,6 +162,28 @@ class MntParser(object):
         )
         return arg_parser
 
+    @property
+    def workers(self):
+        arg_parser = argparse.ArgumentParser(add_help=False)
+        arg_parser.add_argument(
+            "--io_workers", action="store", dest="io_workers", type=int,
+            default=16, help="Threads for the I/O bound file ops(create/stat),default:16"
+        )
+        arg_parser.add_argument(
+            "--hash_workers", action="store", dest="hash_workers", type=int,
+            default=None, help="Processes for hashing files,default:cpu count"
+        )
+        arg_parser.add_argument(
+            "--csum_index", action="store", dest="csum_index", nargs='?', const='auto',
+            default=None, help="Checksum index db, the md5 check skips the files not changed since last checked "
+                               "and resumes from there, no value: next to the test path, default:None"
+        )
+        arg_parser.add_argument(
+            "--force_rehash", action="store_true", dest="force_rehash",
+            default=False, help="Rehash all the files, still record them in the checksum index, default:False"
+        )
+        return arg_parser
+
 
 class RawParser(object):
     """raw related parser"""
@@ -176,6 +214,75 @@ class RawParser(object):
             default=[], nargs='+', help="Filter: case_priority list, default:[]")
         return arg_parser
 
+    @property
+    def engine(self):
+        arg_parser = argparse.ArgumentParser(add_help=False)
+        arg_parser.add_argument(
+            "--engine", action="store", dest="engine",
+            default='inproc', choices=['inproc', 'dd'],
+            help="Raw I/O engine, inproc: pwrite/pread in process, dd: dd command per I/O, default:inproc")
+        arg_parser.add_argument(
+            "--iodepth", action="store", dest="iodepth", type=int,
+            default=None, help="I/Os in flight of the inproc engine concurrent cases, default:by the device queue")
+        arg_parser.add_argument(
+            "--stamp", action="store_true", dest="stamp", default=False,
+            help="Stamp every written sector(offset, seq, timestamp, writer, crc) and verify in place, "
+                 "inproc engine only, default:False")
+        arg_parser.add_argument(
+            "--cache", action="store", dest="cache", default='fadvise',
+            choices=['fadvise', 'flushbuf', 'direct', 'global', 'none'],
+            help="Cache control between steps, fadvise: fadvise(DONTNEED) the device, flushbuf: ioctl(BLKFLSBUF), "
+                 "direct: O_DIRECT only(inproc engine), global: echo 3 > drop_caches, default:fadvise")
+        arg_parser.add_argument(
+            "--case_book", action="store", dest="case_book", default=None,
+            help="Raw test cases, .xlsx(sheet raw_sanity) / .yaml / .json, compiled once and cached, "
+                 "default:tc/raw_sanity.xlsx")
+        return arg_parser
+
+    @property
+    def scan(self):
+        arg_parser = argparse.ArgumentParser(add_help=False)
+        arg_parser.add_argument(
+            "--regions", action="store", dest="regions", type=int,
+            default=64, help="LBA scan: number of device regions, default:64")
+        arg_parser.add_argument(
+            "--region_time", action="store", dest="region_time", type=float,
+            default=1.0, help="LBA scan: seconds per region per pattern, default:1.0")
+        arg_parser.add_argument(
+            "--scan_iodepth", action="store", dest="scan_iodepth", type=int,
+            default=1, help="LBA scan: I/Os in flight per pattern, default:1")
+        arg_parser.add_argument(
+            "--scan_write", action="store_true", dest="scan_write", default=False,
+            help="LBA/alignment scan: also the write I/O, fio: run the raw benchmark(skipped without it), "
+                 "DESTROYS the device data, default:False")
+        arg_parser.add_argument(
+            "--report_dir", action="store", dest="report_dir", default=None,
+            help="Dir for the CSV/SVG reports, default:log/raw/benchmark")
+        return arg_parser
+
+    @property
+    def fio(self):
+        arg_parser = argparse.ArgumentParser(add_help=False)
+        arg_parser.add_argument(
+            "--fio_search", action="store_true", dest="fio_search", default=False,
+            help="fio: iodepth of the IOPS/latency tests by a saturation search(max IOPS/latency point), "
+                 "instead of the device queue profile, default:False")
+        return arg_parser
+
+    @property
+    def benchmark(self):
+        """RAW benchmark test args"""
+
+        arg_parser = argparse.ArgumentParser(
+            parents=[
+                self.device_path,
+                self.scan,
+                self.fio,
+            ],
+            add_help=False
+        )
+        return arg_parser
+
     @property
     def sanity(self):
         """RAW sanity test base info args"""
@@ -185,6 +292,7 @@ class RawParser(object):
                 self.device_path,
                 self.case_ids,
                 self.case_priority,
+                self.engine,
             ],
             add_help=False
         )
@@ -10,7 +10,7 @@
 import os
 import argparse
 
-from storagetest.tests.argument import case_dict_2_string, exclude_case, MntParser, \
+from storagetest.tests.argument import case_dict_2_string, exclude_case, MntParser, steady_parser, \
     load_tests_from_testcase
 
 
@@ -25,7 +25,7 @@ def tc_benchmark(action):
         help='storage->mnt benchmark test',
         epilog='Test Case List:\n{0}'.format(case_desc),
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        parents=[MntParser().test_path, exclude_case()]
+        parents=[MntParser().test_path, steady_parser(), exclude_case()]
     )
     parser.add_argument("--case", action="store", dest="case_list",
                         default=['all'], nargs='+',
@@ -45,7 +45,7 @@ def tc_sanity(action):
         help='storage->mnt sanity test',
         epilog='Test Case List:\n{0}'.format(case_desc),
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        parents=[MntParser().test_path, exclude_case()]
+        parents=[MntParser().test_path, MntParser().workers, exclude_case()]
     )
     parser.add_argument("--case", action="store", dest="case_list",
                         default=['all'], nargs='+',
@@ -65,7 +65,7 @@ def tc_stress(action):
         help='storage->mnt stress test',
         epilog='Test Case List:\n{0}'.format(case_desc),
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        parents=[MntParser().test_path, exclude_case()]
+        parents=[MntParser().test_path, MntParser().workers, exclude_case()]
     )
     parser.add_argument("--case", action="store", dest="case_list",
                         default=['all'], nargs='+',
@@ -91,6 +91,7 @@ def tc_load(action):
             mnt_p.dir_number,
             mnt_p.file_number,
             mnt_p.file_size_range,
+            mnt_p.workers,
             exclude_case()
         ]
     )
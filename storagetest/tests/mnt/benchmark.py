@@ -33,6 +33,14 @@ class BenchMarkTC(CustomTestCase):
         self.test_path = os.path.join(fs_path, "benchmark_{0}_{1}".format(self.str_time, self.tc_loop[self.id()]))
         utils.mkdir_path(self.test_path)
 
+    def steady_state(self):
+        """the SteadyState of the --steady options, None: the fixed runtime"""
+        if not getattr(self.args[0], 'steady', False):
+            return None
+        from storagetest.pkgs.pts.fio import SteadyState
+        return SteadyState(metric=self.args[0].ss_metric, window=self.args[0].ss_window,
+                           max_runtime=self.args[0].ss_max_runtime)
+
     # ==== PTS ====
     @unittest.skipUnless(posix_ready(), "Not supported platform!")
     def test_aio(self):
@@ -65,7 +73,7 @@ class BenchMarkTC(CustomTestCase):
         from storagetest.pkgs.pts.fio import FIO
         fio = FIO(self.test_path)
         logger.info(fio.__doc__)
-        self.assertTrue(fio.google_benchmark())
+        self.assertTrue(fio.google_benchmark(steady=self.steady_state()))
 
     @unittest.skipUnless(posix_ready(), "Not supported platform!")
     def test_fs_mark(self):
@@ -91,11 +99,24 @@ class BenchMarkTC(CustomTestCase):
         logger.info(pm.__doc__)
         self.assertTrue(pm.benchmark())
 
+    @unittest.skipUnless(posix_ready(), "Not supported platform!")
+    def test_alignment(self):
+        """I/O alignment penalty matrix: start offset x I/O size, O_DIRECT and buffered"""
+        from storagetest.pkgs.raw.scan import AlignScan
+        # the writes go to its own test file under test_path
+        scan = AlignScan(self.test_path, write=True, output=os.path.join(os.getcwd(), 'log', 'mnt', 'benchmark'))
+        logger.info(scan.__doc__)
+        try:
+            self.assertTrue(scan.benchmark())
+        finally:
+            scan.cleanup()
+
     # ==== Private ====
     def test_consistency(self):
         """File consistency test"""
         from storagetest.pkgs.fileops import Consistency
-        cst = Consistency(self.test_path)
+        cst = Consistency(self.test_path, io_workers=getattr(self.args[0], 'io_workers', 16),
+                          hash_workers=getattr(self.args[0], 'hash_workers', None))
         logger.info(cst.__doc__)
         self.assertTrue(cst.sanity())
 
@@ -15,6 +15,7 @@ from datetime import datetime
 from storagetest.libs import utils, log
 from storagetest.libs.exceptions import NoSuchDir
 from storagetest.libs.customtestcase import CustomTestCase
+from storagetest.pkgs.fileops.csum_index import ChecksumIndex
 from storagetest.pkgs.base import posix_ready, fio_ready
 
 logger = log.get_logger()
@@ -31,40 +32,42 @@ class LoadGenTC(CustomTestCase):
         self.dir_n = self.args[0].dir_number
         self.file_n = self.args[0].file_number
         self.file_size_range = self.args[0].file_size_range
+        self.io_workers = self.args[0].io_workers
         if not os.path.isdir(fs_path):
             raise NoSuchDir(fs_path)
         self.test_path = os.path.join(fs_path, "load_{0}_{1}".format(self.str_time, self.tc_loop[self.id()]))
         utils.mkdir_path(self.test_path)
+        self.csum_index = ChecksumIndex.from_option(self.args[0].csum_index, fs_path, self.args[0].force_rehash)
 
     def test_empty_files(self):
         """Generate empty files by Consistency"""
         logger.info(self.test_empty_files.__doc__)
         from storagetest.pkgs.fileops import Consistency
-        cst = Consistency(self.test_path)
+        cst = Consistency(self.test_path, csum_index=self.csum_index)
         cst.verify()
         test_top_path = os.path.join(self.test_path, 'empty_files')
         for x in range(0, self.dir_n):
             test_path = os.path.join(test_top_path, 'dir_{0}'.format(x))
-            self.assertTrue(cst.create(test_path, self.file_n, 0))
+            self.assertTrue(cst.create(test_path, self.file_n, 0, workers=self.io_workers))
 
     def test_small_files(self):
         """Generate small files by Consistency"""
         logger.info(self.test_small_files.__doc__)
         from storagetest.pkgs.fileops import Consistency
-        cst = Consistency(self.test_path)
+        cst = Consistency(self.test_path, csum_index=self.csum_index)
         cst.verify()
         test_top_path = os.path.join(self.test_path, 'small_files')
         for x in range(0, self.dir_n):
             test_path = os.path.join(test_top_path, 'dir_{0}'.format(x))
             f_size_min, f_size_max = utils.to_int_list(self.file_size_range)
             f_size = random.randint(f_size_min, f_size_max)
-            self.assertTrue(cst.create(test_path, self.file_n, f_size))
+            self.assertTrue(cst.create(test_path, self.file_n, f_size, workers=self.io_workers))
 
     def test_large_files(self):
         """Generate large files by LocalFileOps"""
         logger.info(self.test_large_files.__doc__)
         from storagetest.pkgs.fileops import LocalFileOps
-        fops = LocalFileOps(self.test_path)
+        fops = LocalFileOps(self.test_path, csum_index=self.csum_index)
         test_top_path = os.path.join(self.test_path, 'large_files')
         for x in range(0, self.dir_n):
             dir_path = os.path.join(test_top_path, 'dir_{0}'.format(x))
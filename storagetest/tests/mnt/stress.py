@@ -14,6 +14,7 @@ from datetime import datetime
 from storagetest.libs import utils, log
 from storagetest.libs.exceptions import NoSuchDir
 from storagetest.libs.customtestcase import CustomTestCase
+from storagetest.pkgs.fileops.csum_index import ChecksumIndex
 from storagetest.pkgs.base import posix_ready, fio_ready, attr_ready, filebench_ready, prove_ready
 
 logger = log.get_logger()
@@ -31,6 +32,8 @@ class StressTC(CustomTestCase):
             raise NoSuchDir(self.fs_path)
         self.test_path = os.path.join(self.fs_path, "stress_{0}_{1}".format(self.str_time, self.tc_loop[self.id()]))
         utils.mkdir_path(self.test_path)
+        self.csum_index = ChecksumIndex.from_option(getattr(self.args[0], 'csum_index', None), self.fs_path,
+                                                    getattr(self.args[0], 'force_rehash', False))
 
     # ==== LTP ====
     @unittest.skipUnless(posix_ready(), "Not supported platform")
@@ -178,14 +181,16 @@ class StressTC(CustomTestCase):
     def test_consistency(self):
         """Test the file consistency"""
         from storagetest.pkgs.fileops import Consistency
-        cst = Consistency(self.test_path)
+        cst = Consistency(self.test_path, csum_index=self.csum_index,
+                          io_workers=getattr(self.args[0], 'io_workers', 16),
+                          hash_workers=getattr(self.args[0], 'hash_workers', None))
         logger.info(cst.__doc__)
         self.assertTrue(cst.stress())
 
     def test_fileops(self):
         """Test the various of file operations"""
         from storagetest.pkgs.fileops import LocalFileOps
-        fops = LocalFileOps(self.test_path)
+        fops = LocalFileOps(self.test_path, csum_index=self.csum_index)
         logger.info(fops.__doc__)
         self.assertTrue(fops.stress())
 
@@ -10,7 +10,7 @@
 import os
 import argparse
 
-from storagetest.tests.argument import case_dict_2_string, RawParser, exclude_case, \
+from storagetest.tests.argument import case_dict_2_string, RawParser, exclude_case, steady_parser, \
     load_tests_from_testcase
 
 
@@ -35,12 +35,34 @@ def tc_sanity(action):
     parser.set_defaults(func=test_suite_generator, suite='sanity')
 
 
+def tc_benchmark(action):
+    """Benchmark test arguments"""
+    from storagetest.tests.raw.benchmark import BenchMarkTC
+    case_info_dict = BenchMarkTC().get_case_name_desc()
+    case_desc = case_dict_2_string(case_info_dict, 25)
+    parser = action.add_parser(
+        'benchmark',
+        help='storage->raw benchmark test',
+        epilog='Test Case List:\n{0}'.format(case_desc),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        parents=[RawParser().benchmark, steady_parser(), exclude_case()]
+    )
+    parser.add_argument("--case", action="store", dest="case_list",
+                        default=['all'], nargs='+',
+                        choices=case_info_dict.keys(),
+                        help="default:['all]")
+    parser.set_defaults(func=test_suite_generator, suite='benchmark')
+
+
 # --- Test suite
 def test_suite_generator(args):
     cur_dir = os.path.dirname(os.path.abspath(__file__))
     if args.suite == 'sanity':
         test_py = os.path.join(cur_dir, 'sanity.py.py')
         from storagetest.tests.raw.sanity import SanityTC as RawTestCase
+    elif args.suite == 'benchmark':
+        test_py = os.path.join(cur_dir, 'benchmark.py')
+        from storagetest.tests.raw.benchmark import BenchMarkTC as RawTestCase
     else:
         raise Exception("Unknown sub parser suite")
 
@@ -60,6 +82,7 @@ def add_raw_subparsers(action):
     raw_parser.set_defaults(project='raw')
     raw_action = raw_parser.add_subparsers(help='Test on a raw device')
 
+    tc_benchmark(raw_action)
     tc_sanity(raw_action)
 
 
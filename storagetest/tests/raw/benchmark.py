@@ -0,0 +1,74 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+@file  : benchmark.py
+@Time  : 2020/12/8 14:20
+@Author: Tao.Xu
+@Email : tao.xu2008@outlook.com
+"""
+
+import os
+import unittest
+from datetime import datetime
+
+from storagetest.libs import log, utils
+from storagetest.libs.customtestcase import CustomTestCase
+from storagetest.pkgs.base import posix_ready, fio_ready
+
+logger = log.get_logger()
+
+
+class BenchMarkTC(CustomTestCase):
+    """BenchMark test on a raw device"""
+
+    def setUp(self):
+        self.phase_list.append([self.id().split('.')[-1], "Start", '', self.shortDescription()])
+        self.start_time = datetime.now()
+        self.print_phase()
+        self.device = self.args[0].device
+        self.report_dir = getattr(self.args[0], 'report_dir', None) or \
+            os.path.join(os.getcwd(), 'log', 'raw', 'benchmark')
+
+    def steady_state(self):
+        """the SteadyState of the --steady options, None: the fixed runtime"""
+        if not getattr(self.args[0], 'steady', False):
+            return None
+        from storagetest.pkgs.pts.fio import SteadyState
+        return SteadyState(metric=self.args[0].ss_metric, window=self.args[0].ss_window,
+                           max_runtime=self.args[0].ss_max_runtime)
+
+    @unittest.skipUnless(posix_ready(), "Not supported platform!")
+    def test_lba_scan(self):
+        """Latency/throughput heatmap across the device LBA regions"""
+        from storagetest.pkgs.raw.scan import LBAScan
+        scan = LBAScan(self.device, regions=self.args[0].regions, region_time=self.args[0].region_time,
+                       iodepth=self.args[0].scan_iodepth, write=self.args[0].scan_write, output=self.report_dir)
+        logger.info(scan.__doc__)
+        self.assertTrue(scan.benchmark())
+
+    @unittest.skipUnless(posix_ready(), "Not supported platform!")
+    def test_alignment(self):
+        """I/O alignment penalty matrix: start offset x I/O size, O_DIRECT and buffered"""
+        from storagetest.pkgs.raw.scan import AlignScan
+        scan = AlignScan(self.device, write=self.args[0].scan_write, output=self.report_dir)
+        logger.info(scan.__doc__)
+        self.assertTrue(scan.benchmark())
+
+    @unittest.skipUnless(posix_ready(), "Not supported platform!")
+    @unittest.skipUnless(fio_ready(), "fio not installed!")
+    def test_fio(self):
+        """Google raw disk benchmark by fio, the IOPS/latency iodepth by a saturation search with --fio_search"""
+        if not self.args[0].scan_write:
+            self.skipTest("fills the whole device, run with --scan_write")
+        from storagetest.pkgs.pts.fio import FIO
+        utils.mkdir_path(self.report_dir)
+        fio = FIO(self.report_dir)  # the fio job/json/log files
+        logger.info(fio.__doc__)
+        self.assertTrue(fio.google_raw_benchmark(search=self.args[0].fio_search, steady=self.steady_state(),
+                                                 device=self.device))
+
+
+if __name__ == '__main__':
+    # unittest.main()
+    suite = unittest.TestLoader().loadTestsFromTestCase(BenchMarkTC)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -27,10 +27,15 @@ class SanityTC(CustomTestCase):
         self.device = self.args[0].device
         self.case_id_list = self.args[0].case_id_list
         self.case_priority_list = self.args[0].case_priority_list
+        self.engine = getattr(self.args[0], 'engine', 'inproc')
+        self.iodepth = getattr(self.args[0], 'iodepth', None)
+        self.stamp = getattr(self.args[0], 'stamp', False)
+        self.cache = getattr(self.args[0], 'cache', 'fadvise')
+        self.case_book = getattr(self.args[0], 'case_book', None)
 
     def test_ut(self):
         """Raw write/read unit test"""
-        raw = RawUT(self.device)
+        raw = RawUT(self.device, self.engine, self.iodepth, self.stamp, self.cache, self.case_book)
         logger.info(raw.__doc__)
         self.assertTrue(raw.sanity())
 